@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from threading import Lock
+import time
+from weakref import WeakKeyDictionary
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.models.student import Student
+from app.repositories.student_repository import StudentRepository
+from app.state_backends import MemoryStateBackend, StateBackend, state_backend
+
+
+@dataclass(frozen=True, slots=True)
+class CardIndexEntry:
+    id: int
+    student_code: str
+    name: str
+    card_id: str
+    is_admin: bool
+    is_active: bool
+
+    @classmethod
+    def from_student(cls, student: Student) -> CardIndexEntry:
+        return cls(
+            id=student.id,
+            student_code=student.student_code,
+            name=student.name,
+            card_id=student.card_id,
+            is_admin=student.is_admin,
+            is_active=student.is_active,
+        )
+
+
+@dataclass
+class _EngineIndex:
+    entries: dict[str, CardIndexEntry]
+    unknown_until: dict[str, float]
+    version: int = 0
+    checked_at: float = 0.0
+
+
+class CardIndex:
+    UNKNOWN_TTL_SECONDS = 30.0
+    MAX_UNKNOWN_ENTRIES = 1024
+    VERSION_KEY = "students.version"
+    VERSION_CHECK_INTERVAL_SECONDS = 1.0
+
+    def __init__(self, backend: StateBackend | None = None) -> None:
+        self._lock = Lock()
+        self._indexes: WeakKeyDictionary[Engine, _EngineIndex] = WeakKeyDictionary()
+        self._backend = backend or MemoryStateBackend()
+
+    def _get_index(self, db: Session) -> _EngineIndex:
+        bind = db.get_bind()
+        with self._lock:
+            index = self._indexes.get(bind)
+        if index is None:
+            return self.warm(db)
+        if self._backend.shared:
+            # 他ワーカーでの学生更新は共有バージョンで検知して読み直す
+            now = time.monotonic()
+            if now - index.checked_at >= self.VERSION_CHECK_INTERVAL_SECONDS:
+                index.checked_at = now
+                if self._backend.get_version(self.VERSION_KEY) != index.version:
+                    return self.warm(db)
+        return index
+
+    def warm(self, db: Session) -> _EngineIndex:
+        version = self._backend.get_version(self.VERSION_KEY) if self._backend.shared else 0
+        students = StudentRepository(db).list_all(include_inactive=True)
+        index = _EngineIndex(
+            entries={student.card_id: CardIndexEntry.from_student(student) for student in students},
+            unknown_until={},
+            version=version,
+            checked_at=time.monotonic(),
+        )
+        with self._lock:
+            self._indexes[db.get_bind()] = index
+        return index
+
+    def lookup(self, db: Session, card_id: str) -> CardIndexEntry | None:
+        index = self._get_index(db)
+        now = time.monotonic()
+        with self._lock:
+            entry = index.entries.get(card_id)
+            if entry is not None:
+                return entry
+            if index.unknown_until.get(card_id, 0.0) > now:
+                return None
+
+        # 他プロセスで登録された可能性があるので、未知カードは一度だけDBを確認して短時間覚える
+        student = StudentRepository(db).get_by_card_id(card_id)
+        with self._lock:
+            if student is not None:
+                entry = CardIndexEntry.from_student(student)
+                index.entries[card_id] = entry
+                index.unknown_until.pop(card_id, None)
+                return entry
+            if len(index.unknown_until) >= self.MAX_UNKNOWN_ENTRIES:
+                index.unknown_until = {key: until for key, until in index.unknown_until.items() if until > now}
+                if len(index.unknown_until) >= self.MAX_UNKNOWN_ENTRIES:
+                    index.unknown_until.pop(next(iter(index.unknown_until)))
+            index.unknown_until[card_id] = now + self.UNKNOWN_TTL_SECONDS
+        return None
+
+    def store(self, db: Session, student: Student, previous_card_id: str | None = None) -> None:
+        index = self._get_index(db)
+        entry = CardIndexEntry.from_student(student)
+        with self._lock:
+            if previous_card_id is not None and previous_card_id != entry.card_id:
+                index.entries.pop(previous_card_id, None)
+            index.entries[entry.card_id] = entry
+            index.unknown_until.pop(entry.card_id, None)
+        if self._backend.shared:
+            version = self._backend.bump_version(self.VERSION_KEY)
+            if version == index.version + 1:
+                index.version = version
+            else:
+                # 間に他ワーカーの更新が挟まっているので、次回参照時に読み直させる
+                index.checked_at = 0.0
+
+    def invalidate(self, db: Session, card_id: str) -> None:
+        with self._lock:
+            index = self._indexes.get(db.get_bind())
+            if index is None:
+                return
+            index.entries.pop(card_id, None)
+            index.unknown_until.pop(card_id, None)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._indexes.clear()
+
+
+card_index = CardIndex(state_backend)
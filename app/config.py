@@ -15,6 +15,21 @@ class Settings:
     session_max_age_seconds: int = int(os.getenv("SESSION_MAX_AGE_SECONDS", "300"))
     admin_username: str = os.getenv("ADMIN_USERNAME", "admin")
     admin_password: str = os.getenv("ADMIN_PASSWORD", "admin")
+    state_backend: str = os.getenv("STATE_BACKEND", "memory")
+    read_pool_workers: int = int(os.getenv("READ_POOL_WORKERS", "4"))
+    reader_pool_workers: int = int(os.getenv("READER_POOL_WORKERS", "4"))
+    heavy_request_slots: int = int(os.getenv("HEAVY_REQUEST_SLOTS", "2"))
+    heavy_request_queue: int = int(os.getenv("HEAVY_REQUEST_QUEUE", "8"))
+    heavy_request_queue_timeout_seconds: float = float(os.getenv("HEAVY_REQUEST_QUEUE_TIMEOUT_SECONDS", "10"))
+    sqlite_tuning: bool = os.getenv("SQLITE_TUNING", "1").lower() not in {"0", "false", "no", "off"}
+    sqlite_journal_mode: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    sqlite_synchronous: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    sqlite_busy_timeout_ms: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    sqlite_cache_size_kib: int = int(os.getenv("SQLITE_CACHE_SIZE_KIB", "16384"))
+    sqlite_mmap_size_bytes: int = int(os.getenv("SQLITE_MMAP_SIZE_BYTES", str(256 * 1024 * 1024)))
+    request_metrics: bool = os.getenv("REQUEST_METRICS", "1").lower() not in {"0", "false", "no", "off"}
+    metrics_endpoint: bool = os.getenv("METRICS_ENDPOINT", "0").lower() not in {"0", "false", "no", "off"}
+    profiler_enabled: bool = os.getenv("PROFILER_ENABLED", "0").lower() not in {"0", "false", "no", "off"}
 
 
 def get_settings() -> Settings:
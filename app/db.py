@@ -1,18 +1,103 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Callable, Iterator
+from contextlib import contextmanager
+import time
 
-from sqlalchemy import create_engine, inspect, text
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 
-from app.config import get_settings
+from app.config import Settings, get_settings
+from app.metrics import db_commit_seconds
 
 settings = get_settings()
 
+SQLITE_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SQLITE_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+def sqlite_pragmas(config: Settings) -> list[tuple[str, str | int]]:
+    journal_mode = config.sqlite_journal_mode.upper()
+    synchronous = config.sqlite_synchronous.upper()
+    if journal_mode not in SQLITE_JOURNAL_MODES:
+        raise ValueError(f"未対応のSQLITE_JOURNAL_MODEです: {config.sqlite_journal_mode}")
+    if synchronous not in SQLITE_SYNCHRONOUS_MODES:
+        raise ValueError(f"未対応のSQLITE_SYNCHRONOUSです: {config.sqlite_synchronous}")
+    return [
+        ("journal_mode", journal_mode),
+        ("synchronous", synchronous),
+        ("busy_timeout", int(config.sqlite_busy_timeout_ms)),
+        # 負の値はページ数ではなく KiB 単位の指定になる
+        ("cache_size", -int(config.sqlite_cache_size_kib)),
+        ("mmap_size", int(config.sqlite_mmap_size_bytes)),
+        ("temp_store", "MEMORY"),
+    ]
+
+
+def apply_sqlite_tuning(target: Engine, config: Settings) -> None:
+    """接続ごとに PRAGMA を設定する。WAL にすると CSV 出力などの読み取り中も打刻の書き込みが待たされない。"""
+    if target.dialect.name != "sqlite" or not config.sqlite_tuning:
+        return
+    pragmas = sqlite_pragmas(config)
+
+    @event.listens_for(target, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
 Base = declarative_base()
 engine = create_engine(settings.database_url, future=True)
+apply_sqlite_tuning(engine, settings)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
 
 
-def get_db() -> Generator[Session, None, None]:
+@event.listens_for(Session, "before_commit")
+def _start_commit_timer(session: Session) -> None:
+    session.info["commit_started_at"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _observe_commit(session: Session) -> None:
+    started_at = session.info.pop("commit_started_at", None)
+    if started_at is not None:
+        db_commit_seconds.observe(time.perf_counter() - started_at)
+
+
+def after_commit(db: Session, callback: Callable[[], None]) -> None:
+    """次に commit() でコミットできたときに実行する処理を登録する。ロールバックされたら捨てる。"""
+    db.info.setdefault("after_commit_callbacks", []).append(callback)
+
+
+def commit(db: Session) -> None:
+    """コミットし、after_commit() で登録した処理を実行する。defer_commit() の中ではフラッシュだけする。"""
+    if db.info.get("defer_commit"):
+        db.flush()
+        return
+    callbacks = db.info.pop("after_commit_callbacks", [])
+    db.commit()
+    for callback in callbacks:
+        callback()
+
+
+@contextmanager
+def defer_commit(db: Session) -> Iterator[None]:
+    """中で呼ばれた commit() を呼び出し側のコミットまで持ち越し、同じトランザクションに書き足せるようにする。"""
+    db.info["defer_commit"] = True
+    try:
+        yield
+    except BaseException:
+        db.info.pop("after_commit_callbacks", None)
+        raise
+    finally:
+        db.info.pop("defer_commit", None)
+
+
+async def get_db() -> AsyncGenerator[Session, None]:
+    # セッション生成は接続を取らないので、既定のスレッドプールを経由せずイベントループ上で行う
     db = SessionLocal()
     try:
         yield db
@@ -20,12 +105,23 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
-def ensure_schema_compatibility() -> None:
-    inspector = inspect(engine)
-    if "students" not in inspector.get_table_names():
+def ensure_schema_compatibility(bind: Engine | None = None) -> None:
+    bind = bind or engine
+    inspector = inspect(bind)
+    table_names = set(inspector.get_table_names())
+    if "students" not in table_names:
         return
 
     columns = {column["name"] for column in inspector.get_columns("students")}
     if "is_admin" not in columns:
-        with engine.begin() as conn:
+        with bind.begin() as conn:
             conn.execute(text("ALTER TABLE students ADD COLUMN is_admin BOOLEAN NOT NULL DEFAULT 0"))
+
+    # create_all は既存テーブルに後から追加したインデックスを作らないため個別に作成する
+    for table in Base.metadata.sorted_tables:
+        if table.name not in table_names:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=bind)
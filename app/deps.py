@@ -7,13 +7,13 @@ from app.services.correction_service import CorrectionService
 from app.services.student_service import StudentService
 
 
-def get_student_service(db: Session = Depends(get_db)) -> StudentService:
+async def get_student_service(db: Session = Depends(get_db)) -> StudentService:
     return StudentService(db)
 
 
-def get_attendance_service(db: Session = Depends(get_db)) -> AttendanceService:
+async def get_attendance_service(db: Session = Depends(get_db)) -> AttendanceService:
     return AttendanceService(db)
 
 
-def get_correction_service(db: Session = Depends(get_db)) -> CorrectionService:
+async def get_correction_service(db: Session = Depends(get_db)) -> CorrectionService:
     return CorrectionService(db)
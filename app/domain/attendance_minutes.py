@@ -0,0 +1,54 @@
+from collections.abc import Iterable
+from datetime import datetime
+
+from app.domain.time_utils import ensure_jst, from_unix_seconds, minutes_between
+
+BreakSpan = tuple[int, int | None]
+
+
+def net_minutes_in_window(window_start: datetime, window_end: datetime, breaks: Iterable[BreakSpan]) -> int:
+    start = ensure_jst(window_start)
+    end = ensure_jst(window_end)
+    if end <= start:
+        return 0
+
+    gross = minutes_between(start, end)
+    break_minutes = 0
+    for started_at, ended_at in breaks:
+        # 終了していない休憩は集計区間の終わりまで続いているものとして扱う
+        bp_start = max(from_unix_seconds(started_at), start)
+        bp_end = min(from_unix_seconds(ended_at), end) if ended_at is not None else end
+        if bp_end > bp_start:
+            break_minutes += minutes_between(bp_start, bp_end)
+    return max(0, gross - break_minutes)
+
+
+def business_minutes(entered_at: datetime, left_at: datetime, breaks: Iterable[BreakSpan]) -> int:
+    entered = ensure_jst(entered_at)
+    left = ensure_jst(left_at)
+    if left <= entered:
+        return 0
+
+    start = max(entered, entered.replace(hour=9, minute=0, second=0, microsecond=0))
+    end = min(left, entered.replace(hour=17, minute=0, second=0, microsecond=0))
+    return net_minutes_in_window(start, end, breaks)
+
+
+def session_period_minutes(
+    entered_at: int,
+    left_at: int | None,
+    breaks: list[BreakSpan],
+    period_start: datetime,
+    period_end: datetime,
+    now: datetime,
+) -> tuple[int, int]:
+    session_start = from_unix_seconds(entered_at)
+    session_end = from_unix_seconds(left_at) if left_at is not None else ensure_jst(now)
+    overlap_start = max(session_start, ensure_jst(period_start))
+    overlap_end = min(session_end, ensure_jst(period_end), ensure_jst(now))
+    if overlap_end <= overlap_start:
+        return 0, 0
+
+    raw = net_minutes_in_window(overlap_start, min(session_end, ensure_jst(period_end)), breaks)
+    business = business_minutes(overlap_start, overlap_end, breaks)
+    return raw, business
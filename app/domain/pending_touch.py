@@ -1,19 +1,46 @@
-from datetime import datetime
+from __future__ import annotations
 
-from pydantic import BaseModel
+from dataclasses import dataclass
+from datetime import datetime
 
 from app.domain.enums import AttendanceAction, AttendanceStatus
 
 
-class PendingTouch(BaseModel):
+@dataclass(frozen=True, slots=True)
+class PendingTouch:
     touch_token: str
     student_id: int
     card_id: str
     reader_name: str | None
     detected_at: datetime
     current_status: AttendanceStatus
-    allowed_actions: list[AttendanceAction]
+    allowed_actions: tuple[AttendanceAction, ...]
     expires_at: datetime
 
     def is_expired(self, now: datetime) -> bool:
         return now >= self.expires_at
+
+    def to_payload(self) -> dict:
+        return {
+            "touch_token": self.touch_token,
+            "student_id": self.student_id,
+            "card_id": self.card_id,
+            "reader_name": self.reader_name,
+            "detected_at": self.detected_at.isoformat(),
+            "current_status": self.current_status.value,
+            "allowed_actions": [action.value for action in self.allowed_actions],
+            "expires_at": self.expires_at.isoformat(),
+        }
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> PendingTouch:
+        return cls(
+            touch_token=payload["touch_token"],
+            student_id=payload["student_id"],
+            card_id=payload["card_id"],
+            reader_name=payload["reader_name"],
+            detected_at=datetime.fromisoformat(payload["detected_at"]),
+            current_status=AttendanceStatus(payload["current_status"]),
+            allowed_actions=tuple(AttendanceAction(action) for action in payload["allowed_actions"]),
+            expires_at=datetime.fromisoformat(payload["expires_at"]),
+        )
@@ -2,6 +2,8 @@ from datetime import datetime
 from zoneinfo import ZoneInfo
 
 JST = ZoneInfo("Asia/Tokyo")
+JST_UTC_OFFSET_SECONDS = 9 * 60 * 60
+SECONDS_PER_DAY = 24 * 60 * 60
 
 
 def ensure_jst(dt: datetime) -> datetime:
@@ -2,11 +2,15 @@ from fastapi import Request
 from fastapi.responses import JSONResponse
 from fastapi.templating import Jinja2Templates
 
+from sqlalchemy.exc import OperationalError
+
 from app.services.exceptions import (
     DuplicateCardIdError,
     DuplicateStudentCodeError,
+    IdempotencyConflictError,
     InactiveStudentError,
     InvalidActionError,
+    ServerBusyError,
     ServiceError,
     StudentNotFoundError,
     TouchTokenExpiredError,
@@ -16,7 +20,7 @@ from app.services.exceptions import (
 
 
 def map_service_error(err: ServiceError) -> tuple[int, str]:
-    if isinstance(err, (DuplicateStudentCodeError, DuplicateCardIdError)):
+    if isinstance(err, (DuplicateStudentCodeError, DuplicateCardIdError, IdempotencyConflictError)):
         return 409, str(err)
     if isinstance(err, StudentNotFoundError):
         return 404, str(err)
@@ -30,6 +34,8 @@ def map_service_error(err: ServiceError) -> tuple[int, str]:
         return 410, str(err)
     if isinstance(err, InvalidActionError):
         return 400, str(err)
+    if isinstance(err, ServerBusyError):
+        return 503, str(err)
     return 500, "内部サービスエラー"
 
 
@@ -49,6 +55,18 @@ def install_exception_handlers(app):
             status_code=status_code,
         )
 
+    @app.exception_handler(OperationalError)
+    async def operational_error_handler(request: Request, exc: OperationalError):
+        # DB のロック待ち切れなどは一時的な障害として 503 を返し、リーダーに再送させる
+        if request.url.path.startswith("/api/"):
+            return JSONResponse(status_code=503, content={"detail": "データベースが一時的に利用できません"})
+        return templates.TemplateResponse(
+            request,
+            "error.html",
+            {"title": "エラー", "message": "データベースが一時的に利用できません"},
+            status_code=503,
+        )
+
     @app.exception_handler(Exception)
     async def fallback_error_handler(request: Request, exc: Exception):
         if request.url.path.startswith("/api/"):
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import Callable
+import json
+from threading import Lock
+from typing import TypeVar
+from weakref import WeakKeyDictionary
+
+from pydantic import BaseModel
+from sqlalchemy import delete, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db import commit, defer_commit
+from app.domain.time_utils import now_ts
+from app.models.idempotency_record import IdempotencyRecord
+from app.services.exceptions import IdempotencyConflictError
+
+ResponseT = TypeVar("ResponseT", bound=BaseModel)
+
+
+class IdempotencyStore:
+    """冪等キーごとに最初の応答を保存し、同じキーの再送には保存済みの応答を返す。
+
+    応答の記録は処理による変更と同じトランザクションでコミットするので、記録が残っていれば処理も確定している。
+    リーダーの送信ジャーナルは数日分の打刻を再送しうるので、記録は RETENTION_SECONDS の間残し、
+    深夜の掃除（prune）で期限切れと MAX_ENTRIES を超えた古いものを消す。直近 MAX_CACHED_RESPONSES 件の応答は
+    プロセス内にも持ち、タイムアウト直後の再送には DB に触れずに答える。
+    """
+
+    RETENTION_SECONDS = 7 * 24 * 60 * 60
+    MAX_ENTRIES = 20000
+    MAX_CACHED_RESPONSES = 1024
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._cached: WeakKeyDictionary[Engine, OrderedDict[tuple[str, str], dict]] = WeakKeyDictionary()
+
+    def cached(self, db: Session, scope: str, key: str) -> dict | None:
+        with self._lock:
+            responses = self._cached.get(db.get_bind())
+            if responses is None:
+                return None
+            response = responses.get((scope, key))
+            if response is not None:
+                responses.move_to_end((scope, key))
+            return response
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cached.clear()
+
+    def run(
+        self,
+        db: Session,
+        scope: str,
+        key: str,
+        process: Callable[[], ResponseT],
+        response_model: type[ResponseT],
+    ) -> ResponseT:
+        stored = self.cached(db, scope, key) or self._load(db, scope, key)
+        if stored is not None:
+            self._remember(db, scope, key, stored)
+            return response_model.model_validate(stored)
+        try:
+            # 処理の変更と応答の記録をフラッシュまでにとどめ、まとめて1回でコミットする
+            with defer_commit(db):
+                response = process()
+                stored = response.model_dump(mode="json")
+                db.add(
+                    IdempotencyRecord(
+                        scope=scope, key=key, response=json.dumps(stored, ensure_ascii=False), created_at=now_ts()
+                    )
+                )
+                db.flush()
+            commit(db)
+        except IntegrityError:
+            # 同じキーの要求が先にコミットしていた。こちらの変更はすべて取り消し、先の応答を返す
+            db.rollback()
+            stored = self._load(db, scope, key)
+            if stored is None:
+                raise
+            response = response_model.model_validate(stored)
+        except Exception:
+            # 失敗した要求は記録を残さず、同じキーでの再送を受け付ける
+            db.rollback()
+            raise
+        self._remember(db, scope, key, stored)
+        return response
+
+    def prune(self, db: Session, now: int | None = None) -> int:
+        now = now_ts() if now is None else now
+        removed = db.execute(
+            delete(IdempotencyRecord).where(IdempotencyRecord.created_at < now - self.RETENTION_SECONDS)
+        ).rowcount
+        overflow = db.scalar(select(func.count()).select_from(IdempotencyRecord)) - self.MAX_ENTRIES
+        if overflow > 0:
+            oldest = (
+                select(IdempotencyRecord.created_at)
+                .order_by(IdempotencyRecord.created_at)
+                .offset(overflow - 1)
+                .limit(1)
+                .scalar_subquery()
+            )
+            removed += db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.created_at <= oldest)).rowcount
+        db.commit()
+        return removed
+
+    def _remember(self, db: Session, scope: str, key: str, response: dict) -> None:
+        with self._lock:
+            responses = self._cached.setdefault(db.get_bind(), OrderedDict())
+            responses[(scope, key)] = response
+            responses.move_to_end((scope, key))
+            while len(responses) > self.MAX_CACHED_RESPONSES:
+                responses.popitem(last=False)
+
+    def _load(self, db: Session, scope: str, key: str) -> dict | None:
+        record = db.get(IdempotencyRecord, (scope, key), populate_existing=True)
+        if record is None:
+            return None
+        if record.response is None:
+            # 応答を別トランザクションで書いていた旧版が、処理中のまま残した記録
+            raise IdempotencyConflictError("同じ冪等キーの要求を処理中です")
+        return json.loads(record.response)
+
+
+def prune_idempotency_records(session_factory: Callable[[], Session]) -> int:
+    db = session_factory()
+    try:
+        return idempotency_store.prune(db)
+    finally:
+        db.close()
+
+
+idempotency_store = IdempotencyStore()
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+from collections.abc import Callable
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from threading import Lock
 
 from app.domain.time_utils import ensure_jst, now_jst
+from app.realtime import KIOSK_MODE_CHANGED, attendance_event_broker
+from app.state_backends import MemoryStateBackend, StateBackend, state_backend
 
 
 class KioskMode(str, Enum):
@@ -20,50 +22,71 @@ class CardCapture:
     reader_name: str | None
     detected_at: datetime
 
+    def to_payload(self) -> dict:
+        return {"card_id": self.card_id, "reader_name": self.reader_name, "detected_at": self.detected_at.isoformat()}
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> CardCapture:
+        return cls(payload["card_id"], payload["reader_name"], ensure_jst(datetime.fromisoformat(payload["detected_at"])))
+
 
 class KioskState:
-    def __init__(self) -> None:
-        self._lock = Lock()
-        self._mode = KioskMode.ATTENDANCE
-        self._latest_admin_login_capture: CardCapture | None = None
-        self._latest_student_card_capture: CardCapture | None = None
+    MODE_KEY = "kiosk.mode"
+    ADMIN_LOGIN_CAPTURE_KEY = "kiosk.admin_login_capture"
+    STUDENT_CARD_CAPTURE_KEY = "kiosk.student_card_capture"
+
+    def __init__(
+        self,
+        backend: StateBackend | None = None,
+        on_mode_changed: Callable[[KioskMode], None] | None = None,
+    ) -> None:
+        self._backend = backend or MemoryStateBackend()
+        self._on_mode_changed = on_mode_changed
 
     def get_mode(self) -> KioskMode:
-        with self._lock:
-            return self._mode
+        mode = self._backend.get(self.MODE_KEY)
+        return KioskMode(mode) if mode is not None else KioskMode.ATTENDANCE
 
     def set_mode(self, mode: KioskMode) -> KioskMode:
-        with self._lock:
-            self._mode = mode
-            return self._mode
+        # 画面表示のたびに ATTENDANCE へ戻す呼び出しが多いので、変わったときだけ書き込んで通知する
+        if self.get_mode() == mode:
+            return mode
+        self._backend.put(self.MODE_KEY, mode.value)
+        if self._on_mode_changed is not None:
+            self._on_mode_changed(mode)
+        return mode
 
     def store_admin_login_capture(self, card_id: str, reader_name: str | None, detected_at: datetime) -> None:
-        with self._lock:
-            self._latest_admin_login_capture = CardCapture(card_id, reader_name, ensure_jst(detected_at))
+        self._store_capture(self.ADMIN_LOGIN_CAPTURE_KEY, CardCapture(card_id, reader_name, ensure_jst(detected_at)))
 
     def clear_admin_login_capture(self) -> None:
-        with self._lock:
-            self._latest_admin_login_capture = None
+        self._backend.delete(self.ADMIN_LOGIN_CAPTURE_KEY)
 
     def store_student_card_capture(self, card_id: str, reader_name: str | None, detected_at: datetime) -> None:
-        with self._lock:
-            self._latest_student_card_capture = CardCapture(card_id, reader_name, ensure_jst(detected_at))
+        self._store_capture(self.STUDENT_CARD_CAPTURE_KEY, CardCapture(card_id, reader_name, ensure_jst(detected_at)))
 
     def get_latest_admin_login_capture(self, now: datetime | None = None, ttl_seconds: int = 30) -> CardCapture | None:
-        current = ensure_jst(now or now_jst())
-        with self._lock:
-            capture = self._latest_admin_login_capture
-        if capture is None or (current - capture.detected_at).total_seconds() > ttl_seconds:
-            return None
-        return capture
+        return self._get_capture(self.ADMIN_LOGIN_CAPTURE_KEY, now, ttl_seconds)
 
     def get_latest_student_card_capture(self, now: datetime | None = None, ttl_seconds: int = 30) -> CardCapture | None:
+        return self._get_capture(self.STUDENT_CARD_CAPTURE_KEY, now, ttl_seconds)
+
+    def _store_capture(self, key: str, capture: CardCapture) -> None:
+        self._backend.put(key, capture.to_payload())
+
+    def _get_capture(self, key: str, now: datetime | None, ttl_seconds: int) -> CardCapture | None:
         current = ensure_jst(now or now_jst())
-        with self._lock:
-            capture = self._latest_student_card_capture
-        if capture is None or (current - capture.detected_at).total_seconds() > ttl_seconds:
+        payload = self._backend.get(key)
+        if payload is None:
+            return None
+        capture = CardCapture.from_payload(payload)
+        if (current - capture.detected_at).total_seconds() > ttl_seconds:
             return None
         return capture
 
 
-kiosk_state = KioskState()
+def _publish_mode_changed(mode: KioskMode) -> None:
+    attendance_event_broker.publish(KIOSK_MODE_CHANGED, {"mode": mode.value})
+
+
+kiosk_state = KioskState(state_backend, on_mode_changed=_publish_mode_changed)
@@ -1,15 +1,24 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from starlette.middleware.sessions import SessionMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
+from app.card_index import card_index
 from app.config import get_settings
-from app.db import Base, engine, ensure_schema_compatibility
+from app.db import Base, SessionLocal, engine, ensure_schema_compatibility
 from app.exceptions import install_exception_handlers
+from app.idempotency import prune_idempotency_records
+from app.metrics import CONTENT_TYPE, metrics_registry
+from app.realtime import attendance_event_broker
+from app.request_metrics import RequestMetricsMiddleware
 import app.models  # noqa: F401
+from app.repositories.attendance_repository import AttendanceRepository
 from app.routers import (
     admin_router,
     attendance_router,
@@ -19,14 +28,54 @@ from app.routers import (
     reader_router,
     students_router,
 )
+from app.sweeper import run_midnight_sweeps, sweep_stale_sessions
 
-app = FastAPI(title="NFC出欠管理 API")
+
+def rebuild_daily_rollups_if_empty() -> None:
+    db = SessionLocal()
+    try:
+        AttendanceRepository(db).rebuild_daily_rollups_if_empty()
+    finally:
+        db.close()
+
+
+def warm_card_index() -> None:
+    db = SessionLocal()
+    try:
+        card_index.warm(db)
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    await asyncio.to_thread(rebuild_daily_rollups_if_empty)
+    await asyncio.to_thread(sweep_stale_sessions, SessionLocal)
+    await asyncio.to_thread(prune_idempotency_records, SessionLocal)
+    await asyncio.to_thread(warm_card_index)
+    background_tasks = [
+        asyncio.create_task(run_midnight_sweeps(SessionLocal)),
+        asyncio.create_task(attendance_event_broker.relay_remote_events()),
+    ]
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        for task in background_tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+
+
+app = FastAPI(title="NFC出欠管理 API", lifespan=lifespan)
 settings = get_settings()
 app.add_middleware(
     SessionMiddleware,
     secret_key=settings.session_secret_key,
     max_age=settings.session_max_age_seconds,
 )
+if settings.request_metrics:
+    app.add_middleware(RequestMetricsMiddleware)
 
 Base.metadata.create_all(bind=engine)
 ensure_schema_compatibility()
@@ -47,3 +96,11 @@ install_exception_handlers(app)
 @app.get("/health")
 def health() -> JSONResponse:
     return JSONResponse({"status": "ok"})
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    # 内部状態が見えるので、METRICS_ENDPOINT で有効にしたときだけ返す
+    if not settings.metrics_endpoint:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(metrics_registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from threading import Lock, local
+
+# Prometheus のテキスト形式（0.0.4）で返す
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = tuple[str, ...]
+
+
+class _PerThreadCells:
+    """スレッドごとに専用のセルを持ち、加算は自分のセルだけを書き換える（ロックを取らない）。
+
+    読み出し側だけがロックを取って全スレッドのセルを合計する。終了したスレッドのセルも累計として残す。
+    """
+
+    def __init__(self, factory: Callable[[], object]) -> None:
+        self._factory = factory
+        self._local = local()
+        self._cells: list[object] = []
+        self._lock = Lock()
+
+    def mine(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._factory()
+            self._local.cell = cell
+            with self._lock:
+                self._cells.append(cell)
+            return cell
+
+    def all(self) -> list:
+        with self._lock:
+            return list(self._cells)
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_number(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._cells = _PerThreadCells(dict)
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        cell: dict[LabelValues, float] = self._cells.mine()
+        cell[labelvalues] = cell.get(labelvalues, 0) + amount
+
+    def values(self) -> dict[LabelValues, float]:
+        totals: dict[LabelValues, float] = {}
+        for cell in self._cells.all():
+            # 書き込み中の他スレッドの dict も、items() の複製は GIL の下で一度に取れる
+            for labelvalues, value in list(cell.items()):
+                totals[labelvalues] = totals.get(labelvalues, 0) + value
+        return totals
+
+    def reset(self) -> None:
+        for cell in self._cells.all():
+            cell.clear()
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_number(value)}")
+        return lines
+
+
+class _HistogramCell:
+    __slots__ = ("counts", "total")
+
+    def __init__(self, size: int) -> None:
+        self.counts = [0] * size
+        self.total = 0.0
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: tuple[float, ...],
+        labelnames: Iterable[str] = (),
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.labelnames = tuple(labelnames)
+        self._cells = _PerThreadCells(dict)
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        cells: dict[LabelValues, _HistogramCell] = self._cells.mine()
+        cell = cells.get(labelvalues)
+        if cell is None:
+            cell = cells[labelvalues] = _HistogramCell(len(self.buckets) + 1)
+        cell.counts[bisect_left(self.buckets, value)] += 1
+        cell.total += value
+
+    def series(self) -> dict[LabelValues, tuple[list[int], float]]:
+        """ラベルごとの区間別件数（累積でない）と合計。"""
+        merged: dict[LabelValues, tuple[list[int], float]] = {}
+        for cells in self._cells.all():
+            for labelvalues, cell in list(cells.items()):
+                counts, total = merged.get(labelvalues, ([0] * (len(self.buckets) + 1), 0.0))
+                merged[labelvalues] = ([left + right for left, right in zip(counts, cell.counts)], total + cell.total)
+        if not self.labelnames:
+            merged.setdefault((), ([0] * (len(self.buckets) + 1), 0.0))
+        return merged
+
+    def reset(self) -> None:
+        for cells in self._cells.all():
+            cells.clear()
+
+    def render(self) -> list[str]:
+        series = [(labelvalues, self.buckets, counts, total) for labelvalues, (counts, total) in sorted(self.series().items())]
+        return render_histogram(self.name, self.documentation, self.labelnames, series)
+
+
+def render_histogram(
+    name: str,
+    documentation: str,
+    labelnames: tuple[str, ...],
+    series: list[tuple[LabelValues, tuple[float, ...], list[int], float]],
+) -> list[str]:
+    """区間ごとの件数を、Prometheus の累積バケット形式に直して出力する。"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} histogram"]
+    for labelvalues, buckets, counts, total in series:
+        cumulative = 0
+        for bound, count in zip([*buckets, float("inf")], counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _format_number(bound)
+            le_label = f'le="{le}"'
+            lines.append(f"{name}_bucket{_format_labels(labelnames, labelvalues, le_label)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, labelvalues)} {_format_number(round(total, 6))}")
+        lines.append(f"{name}_count{_format_labels(labelnames, labelvalues)} {cumulative}")
+    return lines
+
+
+class Gauge:
+    """収集のたびに read() を呼んで現在値を読む。"""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_format_number(self.read())}",
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._collectors: list = []
+
+    def register(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, buckets: tuple[float, ...], labelnames: Iterable[str] = ()
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, buckets, labelnames))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, documentation, read))
+
+    def render(self) -> str:
+        with self._lock:
+            collectors = list(self._collectors)
+        lines: list[str] = []
+        for collector in collectors:
+            lines += collector.render()
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+taps_prepared = metrics_registry.counter(
+    "attendance_taps_prepared_total", "Card touches prepared, by outcome.", ("outcome",)
+)
+taps_confirmed = metrics_registry.counter(
+    "attendance_taps_confirmed_total", "Touch confirmations, by requested action and outcome.", ("action", "outcome")
+)
+stale_sessions_closed = metrics_registry.counter(
+    "attendance_stale_sessions_closed_total", "Sessions left open past midnight and closed by the sweeper."
+)
+unknown_card_logs = metrics_registry.counter("attendance_unknown_card_logs_total", "Unknown card touches logged.")
+export_bytes = metrics_registry.counter("attendance_export_bytes_total", "CSV export bytes streamed.")
+db_commit_seconds = metrics_registry.histogram(
+    "attendance_db_commit_seconds",
+    "Session commit latency including the final flush.",
+    (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
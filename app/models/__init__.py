@@ -1,17 +1,24 @@
 from app.models.audit_log import AuditLog
+from app.models.attendance_daily_rollup import AttendanceDailyRollup
 from app.models.attendance_event import AttendanceEvent
 from app.models.attendance_session import AttendanceSession
 from app.models.attendance_status import AttendanceStatusModel
 from app.models.break_period import BreakPeriod
+from app.models.idempotency_record import IdempotencyRecord
+from app.models.shared_state import PendingTouchToken, SharedStateEntry
 from app.models.student import Student
 from app.models.unknown_card_log import UnknownCardLog
 
 __all__ = [
     "AuditLog",
+    "AttendanceDailyRollup",
     "AttendanceEvent",
     "AttendanceSession",
     "AttendanceStatusModel",
     "BreakPeriod",
+    "IdempotencyRecord",
+    "PendingTouchToken",
+    "SharedStateEntry",
     "Student",
     "UnknownCardLog",
 ]
@@ -0,0 +1,15 @@
+from sqlalchemy import BigInteger, ForeignKey, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+from app.domain.time_utils import now_ts
+
+
+class AttendanceDailyRollup(Base):
+    __tablename__ = "attendance_daily_rollups"
+
+    student_id: Mapped[int] = mapped_column(ForeignKey("students.id"), primary_key=True)
+    day_start_at: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    net_minutes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    business_minutes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[int] = mapped_column(BigInteger, default=now_ts, onupdate=now_ts, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, ForeignKey, Integer, String, Text
+from sqlalchemy import BigInteger, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db import Base
@@ -7,6 +7,7 @@ from app.domain.time_utils import now_ts
 
 class AttendanceEvent(Base):
     __tablename__ = "attendance_events"
+    __table_args__ = (Index("ix_attendance_events_occurred_at_id", "occurred_at", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     student_id: Mapped[int] = mapped_column(ForeignKey("students.id"), nullable=False, index=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, ForeignKey, Integer, String
+from sqlalchemy import BigInteger, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db import Base
@@ -7,6 +7,7 @@ from app.domain.time_utils import now_ts
 
 class AttendanceStatusModel(Base):
     __tablename__ = "attendance_status"
+    __table_args__ = (Index("ix_attendance_status_current_status", "current_status", "student_id"),)
 
     student_id: Mapped[int] = mapped_column(ForeignKey("students.id"), primary_key=True)
     current_status: Mapped[str] = mapped_column(String(32), nullable=False)
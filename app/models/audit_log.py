@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, Integer, String, Text
+from sqlalchemy import BigInteger, Index, Integer, String, Text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db import Base
@@ -7,6 +7,7 @@ from app.domain.time_utils import now_ts
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (Index("ix_audit_logs_action_id", "action", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     actor_type: Mapped[str] = mapped_column(String(64), nullable=False)
@@ -0,0 +1,21 @@
+from sqlalchemy import BigInteger, Float, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+from app.domain.time_utils import now_ts
+
+
+class SharedStateEntry(Base):
+    __tablename__ = "shared_state"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    value: Mapped[str] = mapped_column(Text, nullable=False)
+    updated_at: Mapped[int] = mapped_column(BigInteger, default=now_ts, onupdate=now_ts, nullable=False)
+
+
+class PendingTouchToken(Base):
+    __tablename__ = "pending_touch_tokens"
+
+    touch_token: Mapped[str] = mapped_column(String(64), primary_key=True)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)
+    discard_at: Mapped[float] = mapped_column(Float, nullable=False, index=True)
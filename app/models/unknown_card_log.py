@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, Integer, String
+from sqlalchemy import BigInteger, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db import Base
@@ -7,6 +7,7 @@ from app.domain.time_utils import now_ts
 
 class UnknownCardLog(Base):
     __tablename__ = "unknown_card_logs"
+    __table_args__ = (Index("ix_unknown_card_logs_detected_at_id", "detected_at", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     card_id: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
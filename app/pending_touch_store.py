@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+import heapq
+import json
+from threading import Lock
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.engine import Connection, Engine
+
+from app.domain.pending_touch import PendingTouch
+from app.metrics import metrics_registry
+from app.models.shared_state import PendingTouchToken
+from app.state_backends import SqlStateBackend, StateBackend, state_backend
+
+
+@dataclass(frozen=True)
+class PendingTouchStoreStats:
+    size: int
+    capacity: int
+    expired: int
+    evicted: int
+
+
+class PendingTouchStore(ABC):
+    MAX_ENTRIES = 4096
+    EXPIRED_GRACE_SECONDS = 300
+
+    def __init__(self, max_entries: int | None = None, expired_grace_seconds: int | None = None) -> None:
+        self.max_entries = max_entries or self.MAX_ENTRIES
+        self.expired_grace_seconds = self.EXPIRED_GRACE_SECONDS if expired_grace_seconds is None else expired_grace_seconds
+        # 期限切れ・追い出し件数はこのプロセスで処理した分だけを数える
+        self._expired = 0
+        self._evicted = 0
+
+    @abstractmethod
+    def put(self, pending: PendingTouch) -> None: ...
+
+    @abstractmethod
+    def get(self, touch_token: str, now: datetime) -> PendingTouch | None: ...
+
+    @abstractmethod
+    def pop(self, touch_token: str) -> PendingTouch | None: ...
+
+    @abstractmethod
+    def size(self) -> int: ...
+
+    @abstractmethod
+    def clear(self) -> None: ...
+
+    def stats(self) -> PendingTouchStoreStats:
+        return PendingTouchStoreStats(
+            size=self.size(),
+            capacity=self.max_entries,
+            expired=self._expired,
+            evicted=self._evicted,
+        )
+
+    def _discard_at(self, pending: PendingTouch) -> float:
+        # 期限切れ直後の確定には「期限切れ」を返したいので、猶予を置いてから捨てる
+        return pending.expires_at.timestamp() + self.expired_grace_seconds
+
+
+class MemoryPendingTouchStore(PendingTouchStore):
+    def __init__(self, max_entries: int | None = None, expired_grace_seconds: int | None = None) -> None:
+        super().__init__(max_entries, expired_grace_seconds)
+        self._lock = Lock()
+        self._touches: dict[str, PendingTouch] = {}
+        # (破棄時刻, トークン) の最小ヒープ。確定済みトークンの要素は取り出し時に読み飛ばす
+        self._expiry_heap: list[tuple[float, str]] = []
+
+    def put(self, pending: PendingTouch) -> None:
+        with self._lock:
+            self._purge_locked(pending.detected_at.timestamp())
+            while len(self._touches) >= self.max_entries:
+                self._pop_soonest_locked()
+                self._evicted += 1
+            self._touches[pending.touch_token] = pending
+            heapq.heappush(self._expiry_heap, (self._discard_at(pending), pending.touch_token))
+
+    def get(self, touch_token: str, now: datetime) -> PendingTouch | None:
+        with self._lock:
+            self._purge_locked(now.timestamp())
+            return self._touches.get(touch_token)
+
+    def pop(self, touch_token: str) -> PendingTouch | None:
+        with self._lock:
+            pending = self._touches.pop(touch_token, None)
+            if len(self._expiry_heap) > 2 * len(self._touches) + 64:
+                self._compact_locked()
+            return pending
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._touches)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._touches.clear()
+            self._expiry_heap.clear()
+            self._expired = 0
+            self._evicted = 0
+
+    def _purge_locked(self, now_ts: float) -> None:
+        while self._expiry_heap and self._expiry_heap[0][0] <= now_ts:
+            if self._discard_head_locked():
+                self._expired += 1
+
+    def _pop_soonest_locked(self) -> None:
+        while self._expiry_heap:
+            if self._discard_head_locked():
+                return
+
+    def _discard_head_locked(self) -> bool:
+        discard_at, token = heapq.heappop(self._expiry_heap)
+        pending = self._touches.get(token)
+        if pending is None or self._discard_at(pending) != discard_at:
+            return False
+        del self._touches[token]
+        return True
+
+    def _compact_locked(self) -> None:
+        self._expiry_heap = [(self._discard_at(pending), token) for token, pending in self._touches.items()]
+        heapq.heapify(self._expiry_heap)
+
+
+class SqlPendingTouchStore(PendingTouchStore):
+    def __init__(self, engine: Engine, max_entries: int | None = None, expired_grace_seconds: int | None = None) -> None:
+        super().__init__(max_entries, expired_grace_seconds)
+        self.engine = engine
+        self._table = PendingTouchToken.__table__
+        # 件数の更新は複数の処理スレッドから来るので、MemoryPendingTouchStore と同じくロックを取る
+        self._lock = Lock()
+
+    def put(self, pending: PendingTouch) -> None:
+        table = self._table
+        with self.engine.begin() as conn:
+            self._purge(conn, pending.detected_at.timestamp())
+            overflow = conn.execute(select(func.count()).select_from(table)).scalar_one() - self.max_entries + 1
+            if overflow > 0:
+                soonest = select(table.c.touch_token).order_by(table.c.discard_at).limit(overflow).scalar_subquery()
+                evicted = conn.execute(delete(table).where(table.c.touch_token.in_(soonest))).rowcount
+                with self._lock:
+                    self._evicted += evicted
+            conn.execute(
+                table.insert().values(
+                    touch_token=pending.touch_token,
+                    payload=json.dumps(pending.to_payload(), ensure_ascii=False),
+                    discard_at=self._discard_at(pending),
+                )
+            )
+
+    def get(self, touch_token: str, now: datetime) -> PendingTouch | None:
+        with self.engine.begin() as conn:
+            self._purge(conn, now.timestamp())
+            raw = conn.execute(select(self._table.c.payload).where(self._table.c.touch_token == touch_token)).scalar_one_or_none()
+        return PendingTouch.from_payload(json.loads(raw)) if raw is not None else None
+
+    def pop(self, touch_token: str) -> PendingTouch | None:
+        table = self._table
+        with self.engine.begin() as conn:
+            raw = conn.execute(select(table.c.payload).where(table.c.touch_token == touch_token)).scalar_one_or_none()
+            if raw is None:
+                return None
+            conn.execute(delete(table).where(table.c.touch_token == touch_token))
+        return PendingTouch.from_payload(json.loads(raw))
+
+    def size(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(self._table)).scalar_one()
+
+    def clear(self) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(delete(self._table))
+        with self._lock:
+            self._expired = 0
+            self._evicted = 0
+
+    def _purge(self, conn: Connection, now_ts: float) -> None:
+        expired = conn.execute(delete(self._table).where(self._table.c.discard_at <= now_ts)).rowcount
+        with self._lock:
+            self._expired += expired
+
+
+def build_pending_touch_store(backend: StateBackend) -> PendingTouchStore:
+    if isinstance(backend, SqlStateBackend):
+        return SqlPendingTouchStore(backend.engine)
+    return MemoryPendingTouchStore()
+
+
+pending_touch_store = build_pending_touch_store(state_backend)
+
+metrics_registry.gauge("attendance_pending_touches", "Touch tokens waiting for confirmation.", pending_touch_store.size)
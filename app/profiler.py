@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from collections import Counter
+import sys
+import threading
+import time
+from types import FrameType
+
+
+class ProfilerBusyError(RuntimeError):
+    pass
+
+
+def _frame_label(frame: FrameType) -> str:
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{frame.f_code.co_qualname}"
+
+
+def _collapse(thread_name: str, frame: FrameType | None) -> str:
+    labels: list[str] = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    # collapsed 形式は「;」区切りで根から葉へ並べ、空白の後ろに回数を置くので、名前の空白と「;」は潰す
+    root = thread_name.replace(" ", "_").replace(";", "_")
+    return ";".join([root, *reversed(labels)])
+
+
+class SamplingProfiler:
+    """呼び出したスレッドで一定間隔ごとに全スレッドのスタックを取り、collapsed 形式で返す。
+
+    計測中以外はスレッドもフックも持たないので、止まっている間の負荷はない。
+    同時に動かせるのは1回だけ。
+    """
+
+    def __init__(self) -> None:
+        self._running = threading.Lock()
+
+    def sample(self, duration_seconds: float, interval_seconds: float) -> tuple[str, int]:
+        if not self._running.acquire(blocking=False):
+            raise ProfilerBusyError("プロファイラは実行中です")
+        try:
+            return self._sample(duration_seconds, interval_seconds)
+        finally:
+            self._running.release()
+
+    def _sample(self, duration_seconds: float, interval_seconds: float) -> tuple[str, int]:
+        own_ident = threading.get_ident()
+        stacks: Counter[str] = Counter()
+        rounds = 0
+        deadline = time.monotonic() + duration_seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own_ident:
+                    stacks[_collapse(names.get(ident, f"thread-{ident}"), frame)] += 1
+            rounds += 1
+            time.sleep(interval_seconds)
+        lines = [f"{stack} {count}" for stack, count in sorted(stacks.items())]
+        return "\n".join(lines) + ("\n" if lines else ""), rounds
+
+
+sampling_profiler = SamplingProfiler()
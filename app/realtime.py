@@ -3,35 +3,187 @@ from __future__ import annotations
 import asyncio
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import json
+import logging
+from threading import Lock
+from typing import Any
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.metrics import metrics_registry
+from app.state_backends import MemoryStateBackend, StateBackend, state_backend
+
+logger = logging.getLogger(__name__)
+
+REFRESH = "refresh"
+EVENT_APPENDED = "event_appended"
+STATUS_CHANGED = "status_changed"
+ALERT_RAISED = "alert_raised"
+CARD_CAPTURED = "card_captured"
+TOUCH_PANEL_CHANGED = "touch_panel_changed"
+KIOSK_MODE_CHANGED = "kiosk_mode_changed"
+
+
+@dataclass(frozen=True, slots=True)
+class BrokerEvent:
+    name: str
+    data: dict[str, Any] | None = None
+
+    @property
+    def coalesce_key(self) -> tuple[str, Any] | None:
+        # 同じキーのイベントは窓内で最後の1件だけ送る。打刻ログの追加は全件送る
+        if self.name == STATUS_CHANGED:
+            return (self.name, self.data["student_id"])
+        if self.name in {ALERT_RAISED, CARD_CAPTURED}:
+            return (self.name, self.data["kind"])
+        if self.name in {TOUCH_PANEL_CHANGED, KIOSK_MODE_CHANGED}:
+            return (self.name, None)
+        return None
+
+    def to_sse(self) -> str:
+        # refresh は従来どおり名前なしの message として送り、古いクライアントでも再取得できるようにする
+        if self.name == REFRESH:
+            return f"data: {REFRESH}\n\n"
+        return f"event: {self.name}\ndata: {json.dumps(self.data, ensure_ascii=False)}\n\n"
+
+
+def coalesce_events(events: list[BrokerEvent]) -> list[BrokerEvent]:
+    if any(event.name == REFRESH for event in events):
+        return [BrokerEvent(REFRESH)]
+    latest_index: dict[tuple[str, Any], int] = {}
+    for index, event in enumerate(events):
+        key = event.coalesce_key
+        if key is not None:
+            latest_index[key] = index
+    return [
+        event
+        for index, event in enumerate(events)
+        if event.coalesce_key is None or latest_index[event.coalesce_key] == index
+    ]
 
 
 @dataclass
 class _Subscriber:
-    queue: asyncio.Queue[str]
     loop: asyncio.AbstractEventLoop
+    max_pending: int
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    pending: list[BrokerEvent] = field(default_factory=list)
+    overflowed: bool = False
+    lock: Lock = field(default_factory=Lock)
+
+    def offer(self, event: BrokerEvent) -> None:
+        with self.lock:
+            if self.overflowed:
+                return
+            if len(self.pending) >= self.max_pending:
+                # 遅いタブのために溜め込まず、差分を捨てて全体の再取得を促す
+                self.pending.clear()
+                self.overflowed = True
+            else:
+                self.pending.append(event)
+        self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def pending_count(self) -> int:
+        with self.lock:
+            return len(self.pending)
+
+    def drain(self) -> list[BrokerEvent]:
+        with self.lock:
+            events, self.pending = self.pending, []
+            overflowed, self.overflowed = self.overflowed, False
+        if overflowed:
+            return [BrokerEvent(REFRESH)]
+        return coalesce_events(events)
+
+
+class AttendanceSubscription:
+    def __init__(self, subscriber: _Subscriber, coalesce_window_seconds: float) -> None:
+        self._subscriber = subscriber
+        self._coalesce_window_seconds = coalesce_window_seconds
+
+    async def next_batch(self) -> list[BrokerEvent]:
+        while True:
+            await self._subscriber.wakeup.wait()
+            # 連続した打刻をまとめて送るため、最初のイベントから少し待ってから取り出す
+            await asyncio.sleep(self._coalesce_window_seconds)
+            self._subscriber.wakeup.clear()
+            batch = self._subscriber.drain()
+            if batch:
+                return batch
 
 
 class AttendanceEventBroker:
-    def __init__(self) -> None:
+    VERSION_KEY = "attendance_events.version"
+    RELAY_INTERVAL_SECONDS = 1.0
+    COALESCE_WINDOW_SECONDS = 0.1
+    MAX_PENDING_PER_SUBSCRIBER = 256
+
+    def __init__(self, backend: StateBackend | None = None) -> None:
         self._subscribers: list[_Subscriber] = []
         self._lock = asyncio.Lock()
+        self._backend = backend or MemoryStateBackend()
+        self._seen_version = 0
 
     @asynccontextmanager
-    async def subscribe(self) -> AsyncIterator[asyncio.Queue[str]]:
-        queue: asyncio.Queue[str] = asyncio.Queue()
-        subscriber = _Subscriber(queue=queue, loop=asyncio.get_running_loop())
+    async def subscribe(self) -> AsyncIterator[AttendanceSubscription]:
+        subscriber = _Subscriber(loop=asyncio.get_running_loop(), max_pending=self.MAX_PENDING_PER_SUBSCRIBER)
         async with self._lock:
             self._subscribers.append(subscriber)
         try:
-            yield queue
+            yield AttendanceSubscription(subscriber, self.COALESCE_WINDOW_SECONDS)
         finally:
             async with self._lock:
                 self._subscribers = [item for item in self._subscribers if item is not subscriber]
 
-    def publish(self, event: str = "refresh") -> None:
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def pending_event_count(self) -> int:
+        """購読者ごとに送信待ちのイベント数の合計。"""
+        return sum(subscriber.pending_count() for subscriber in list(self._subscribers))
+
+    def publish(self, event: str = REFRESH, data: dict[str, Any] | None = None) -> None:
+        self._fan_out(BrokerEvent(event, data))
+        if not self._backend.shared:
+            return
+        try:
+            self._seen_version = self._backend.bump_version(self.VERSION_KEY)
+        except SQLAlchemyError:
+            logger.exception("failed to share attendance event version")
+
+    def publish_alert(self, kind: str, alert: dict[str, Any]) -> None:
+        # kind は /api/attendance/today の項目名（unknown_card_alert など）に合わせる
+        self.publish(ALERT_RAISED, {"kind": kind, "alert": alert})
+
+    def publish_card_captured(self, kind: str) -> None:
+        self.publish(CARD_CAPTURED, {"kind": kind})
+
+    async def relay_remote_events(self) -> None:
+        """他ワーカーで発生した更新を共有バージョンの変化で検知し、このワーカーの購読者に流す。"""
+        if not self._backend.shared:
+            return
+        self._seen_version = await asyncio.to_thread(self._backend.get_version, self.VERSION_KEY)
+        while True:
+            await asyncio.sleep(self.RELAY_INTERVAL_SECONDS)
+            try:
+                version = await asyncio.to_thread(self._backend.get_version, self.VERSION_KEY)
+            except SQLAlchemyError:
+                logger.exception("failed to read attendance event version")
+                continue
+            if version != self._seen_version:
+                self._seen_version = version
+                # 他ワーカーの差分内容は共有していないので、全体の再取得を促す
+                self._fan_out(BrokerEvent(REFRESH))
+
+    def _fan_out(self, event: BrokerEvent) -> None:
         for subscriber in list(self._subscribers):
-            subscriber.loop.call_soon_threadsafe(subscriber.queue.put_nowait, event)
+            subscriber.offer(event)
+
 
+attendance_event_broker = AttendanceEventBroker(state_backend)
 
-attendance_event_broker = AttendanceEventBroker()
+metrics_registry.gauge("attendance_sse_subscribers", "Open SSE subscriptions in this worker.", attendance_event_broker.subscriber_count)
+metrics_registry.gauge(
+    "attendance_sse_queue_depth", "Events waiting to be sent to SSE subscribers.", attendance_event_broker.pending_event_count
+)
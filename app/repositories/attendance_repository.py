@@ -1,25 +1,29 @@
-from datetime import date, datetime
+from collections import defaultdict
+from datetime import date, datetime, timedelta
 
-from sqlalchemy import and_, func, select
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, select, update
 
+from app.domain.attendance_minutes import BreakSpan, session_period_minutes
 from app.domain.enums import AttendanceStatus
 from app.domain.time_utils import (
+    JST,
+    JST_UTC_OFFSET_SECONDS,
+    SECONDS_PER_DAY,
+    ensure_jst,
     from_unix_seconds,
     minutes_between,
     to_unix_seconds,
 )
+from app.models.attendance_daily_rollup import AttendanceDailyRollup
 from app.models.attendance_event import AttendanceEvent
 from app.models.attendance_session import AttendanceSession
 from app.models.attendance_status import AttendanceStatusModel
 from app.models.break_period import BreakPeriod
 from app.models.student import Student
+from app.repositories.base import SessionRepository
 
 
-class AttendanceRepository:
-    def __init__(self, db: Session):
-        self.db = db
-
+class AttendanceRepository(SessionRepository):
     def add_event(
         self,
         student_id: int,
@@ -29,6 +33,7 @@ class AttendanceRepository:
         reader_name: str | None = None,
         operator_name: str | None = None,
         memo: str | None = None,
+        commit: bool = True,
     ) -> AttendanceEvent:
         event = AttendanceEvent(
             student_id=student_id,
@@ -40,14 +45,19 @@ class AttendanceRepository:
             memo=memo,
         )
         self.db.add(event)
-        self.db.commit()
-        self.db.refresh(event)
+        self._persist(event, commit)
         return event
 
     def get_status(self, student_id: int) -> AttendanceStatusModel | None:
         return self.db.get(AttendanceStatusModel, student_id)
 
-    def upsert_status(self, student_id: int, current_status: str, last_event_id: int | None) -> AttendanceStatusModel:
+    def upsert_status(
+        self,
+        student_id: int,
+        current_status: str,
+        last_event_id: int | None,
+        commit: bool = True,
+    ) -> AttendanceStatusModel:
         status = self.get_status(student_id)
         if status is None:
             status = AttendanceStatusModel(student_id=student_id, current_status=current_status, last_event_id=last_event_id)
@@ -55,8 +65,7 @@ class AttendanceRepository:
         else:
             status.current_status = current_status
             status.last_event_id = last_event_id
-        self.db.commit()
-        self.db.refresh(status)
+        self._persist(status, commit)
         return status
 
     def get_open_session(self, student_id: int) -> AttendanceSession | None:
@@ -67,33 +76,38 @@ class AttendanceRepository:
         )
         return self.db.scalar(stmt)
 
-    def create_session(self, student_id: int, entered_at: datetime) -> AttendanceSession:
+    def create_session(self, student_id: int, entered_at: datetime, commit: bool = True) -> AttendanceSession:
         session = AttendanceSession(
             student_id=student_id,
             entered_at=to_unix_seconds(entered_at),
             status="OPEN",
         )
         self.db.add(session)
-        self.db.commit()
-        self.db.refresh(session)
+        self._persist(session, commit)
         return session
 
-    def close_session(self, session: AttendanceSession, left_at: datetime, total_minutes: int) -> AttendanceSession:
+    def close_session(
+        self,
+        session: AttendanceSession,
+        left_at: datetime,
+        total_minutes: int,
+        commit: bool = True,
+    ) -> AttendanceSession:
         session.left_at = to_unix_seconds(left_at)
         session.total_minutes = total_minutes
         session.status = "CLOSED"
-        self.db.commit()
-        self.db.refresh(session)
+        self.db.flush()
+        self.refresh_daily_rollups_for_session(session)
+        self._persist(session, commit)
         return session
 
-    def start_break(self, session_id: int, started_at: datetime) -> BreakPeriod:
+    def start_break(self, session_id: int, started_at: datetime, commit: bool = True) -> BreakPeriod:
         bp = BreakPeriod(session_id=session_id, started_at=to_unix_seconds(started_at))
         self.db.add(bp)
-        self.db.commit()
-        self.db.refresh(bp)
+        self._persist(bp, commit)
         return bp
 
-    def end_latest_open_break(self, session_id: int, ended_at: datetime) -> BreakPeriod | None:
+    def end_latest_open_break(self, session_id: int, ended_at: datetime, commit: bool = True) -> BreakPeriod | None:
         stmt = (
             select(BreakPeriod)
             .where(and_(BreakPeriod.session_id == session_id, BreakPeriod.ended_at.is_(None)))
@@ -103,8 +117,11 @@ class AttendanceRepository:
         if bp is None:
             return None
         bp.ended_at = to_unix_seconds(ended_at)
-        self.db.commit()
-        self.db.refresh(bp)
+        self.db.flush()
+        session = self.db.get(AttendanceSession, session_id)
+        if session is not None and session.left_at is not None:
+            self.refresh_daily_rollups_for_session(session)
+        self._persist(bp, commit)
         return bp
 
     def list_breaks(self, session_id: int) -> list[BreakPeriod]:
@@ -189,3 +206,212 @@ class AttendanceRepository:
             .order_by(AttendanceSession.entered_at)
         )
         return list(self.db.scalars(stmt).all())
+
+    def list_all_sessions_overlapping_period(
+        self,
+        start: datetime,
+        end: datetime,
+        open_sessions: bool | None = None,
+    ) -> list[AttendanceSession]:
+        stmt = (
+            select(AttendanceSession)
+            .where(self._overlaps_period(start, end, open_sessions))
+            .order_by(AttendanceSession.student_id, AttendanceSession.entered_at)
+        )
+        return list(self.db.scalars(stmt).all())
+
+    def list_breaks_for_sessions_overlapping_period(
+        self,
+        start: datetime,
+        end: datetime,
+        open_sessions: bool | None = None,
+    ) -> list[tuple[int, int, int | None]]:
+        stmt = (
+            select(BreakPeriod.session_id, BreakPeriod.started_at, BreakPeriod.ended_at)
+            .join(AttendanceSession, AttendanceSession.id == BreakPeriod.session_id)
+            .where(self._overlaps_period(start, end, open_sessions))
+            .order_by(BreakPeriod.session_id, BreakPeriod.id)
+        )
+        return [(row.session_id, row.started_at, row.ended_at) for row in self.db.execute(stmt)]
+
+    def list_break_spans_for_sessions(self, session_ids: list[int]) -> dict[int, list[BreakSpan]]:
+        spans: dict[int, list[BreakSpan]] = defaultdict(list)
+        if not session_ids:
+            return spans
+        stmt = (
+            select(BreakPeriod.session_id, BreakPeriod.started_at, BreakPeriod.ended_at)
+            .where(BreakPeriod.session_id.in_(session_ids))
+            .order_by(BreakPeriod.session_id, BreakPeriod.id)
+        )
+        for row in self.db.execute(stmt):
+            spans[row.session_id].append((row.started_at, row.ended_at))
+        return spans
+
+    @staticmethod
+    def _overlaps_period(start: datetime, end: datetime, open_sessions: bool | None = None):
+        start_ts = to_unix_seconds(start)
+        end_ts = to_unix_seconds(end)
+        condition = and_(
+            AttendanceSession.entered_at < end_ts,
+            (AttendanceSession.left_at.is_(None) | (AttendanceSession.left_at > start_ts)),
+        )
+        if open_sessions is True:
+            return and_(condition, AttendanceSession.left_at.is_(None))
+        if open_sessions is False:
+            return and_(condition, AttendanceSession.left_at.is_not(None))
+        return condition
+
+    def list_statuses(self) -> dict[int, str]:
+        stmt = select(AttendanceStatusModel.student_id, AttendanceStatusModel.current_status)
+        return {row.student_id: row.current_status for row in self.db.execute(stmt)}
+
+    def close_open_sessions_started_before(self, cutoff: datetime) -> int:
+        cutoff_ts = to_unix_seconds(cutoff)
+        stale = and_(AttendanceSession.left_at.is_(None), AttendanceSession.entered_at < cutoff_ts)
+        # 入室日のJST翌日0時で締め、休憩分を差し引いた分数をまとめて計算する
+        day_end = (
+            AttendanceSession.entered_at
+            - (AttendanceSession.entered_at + JST_UTC_OFFSET_SECONDS) % SECONDS_PER_DAY
+            + SECONDS_PER_DAY
+        )
+        break_minutes = (
+            select(
+                func.coalesce(
+                    func.sum(func.max(0, (func.coalesce(BreakPeriod.ended_at, day_end) - BreakPeriod.started_at) // 60)),
+                    0,
+                )
+            )
+            .where(BreakPeriod.session_id == AttendanceSession.id)
+            .scalar_subquery()
+        )
+        stale_ids = list(self.db.scalars(select(AttendanceSession.id).where(stale)).all())
+        if not stale_ids:
+            return 0
+        self.db.execute(
+            update(AttendanceStatusModel)
+            .where(AttendanceStatusModel.student_id.in_(select(AttendanceSession.student_id).where(stale)))
+            .values(current_status=AttendanceStatus.OUTSIDE.value, last_event_id=None)
+            .execution_options(synchronize_session="fetch")
+        )
+        result = self.db.execute(
+            update(AttendanceSession)
+            .where(stale)
+            .values(
+                left_at=day_end,
+                total_minutes=func.max(0, (day_end - AttendanceSession.entered_at) // 60 - break_minutes),
+                status="CLOSED",
+            )
+            .execution_options(synchronize_session="fetch")
+        )
+        for session in self.db.scalars(select(AttendanceSession).where(AttendanceSession.id.in_(stale_ids))):
+            self.refresh_daily_rollups_for_session(session)
+        self.db.commit()
+        return result.rowcount
+
+    def refresh_daily_rollup(self, student_id: int, day: datetime) -> AttendanceDailyRollup:
+        """その日に重なる終了済みセッションの分数を集計し直す。
+
+        日をまたぐセッションは日ごとに切り分けるので、9〜17時の分数もそれぞれの日の 9〜17時で数える
+        （日次集計を入れる前は、入室日の 9〜17時だけを数えていた）。
+        """
+        day_start = ensure_jst(day).replace(hour=0, minute=0, second=0, microsecond=0)
+        day_end = day_start + timedelta(days=1)
+        net_total = 0
+        business_total = 0
+        sessions = [
+            session
+            for session in self.list_sessions_overlapping_period(student_id, day_start, day_end)
+            if session.left_at is not None
+        ]
+        breaks_by_session = self.list_break_spans_for_sessions([session.id for session in sessions])
+        for session in sessions:
+            net, business = session_period_minutes(
+                session.entered_at,
+                session.left_at,
+                breaks_by_session.get(session.id, []),
+                day_start,
+                day_end,
+                from_unix_seconds(session.left_at),
+            )
+            net_total += net
+            business_total += business
+
+        rollup = self.db.get(AttendanceDailyRollup, (student_id, to_unix_seconds(day_start)))
+        if rollup is None:
+            rollup = AttendanceDailyRollup(student_id=student_id, day_start_at=to_unix_seconds(day_start))
+            self.db.add(rollup)
+        rollup.net_minutes = net_total
+        rollup.business_minutes = business_total
+        self.db.flush()
+        return rollup
+
+    def refresh_daily_rollups_for_session(self, session: AttendanceSession) -> None:
+        if session.left_at is None:
+            return
+        day = from_unix_seconds(session.entered_at).replace(hour=0, minute=0, second=0, microsecond=0)
+        left = from_unix_seconds(session.left_at)
+        while True:
+            self.refresh_daily_rollup(session.student_id, day)
+            day += timedelta(days=1)
+            if day >= left:
+                break
+
+    def sum_daily_rollups(
+        self,
+        start: datetime,
+        end: datetime,
+        student_id: int | None = None,
+    ) -> dict[int, tuple[int, int]]:
+        stmt = (
+            select(
+                AttendanceDailyRollup.student_id,
+                func.sum(AttendanceDailyRollup.net_minutes).label("net_minutes"),
+                func.sum(AttendanceDailyRollup.business_minutes).label("business_minutes"),
+            )
+            .where(
+                and_(
+                    AttendanceDailyRollup.day_start_at >= to_unix_seconds(start),
+                    AttendanceDailyRollup.day_start_at < to_unix_seconds(end),
+                )
+            )
+            .group_by(AttendanceDailyRollup.student_id)
+        )
+        if student_id is not None:
+            stmt = stmt.where(AttendanceDailyRollup.student_id == student_id)
+        return {row.student_id: (int(row.net_minutes), int(row.business_minutes)) for row in self.db.execute(stmt)}
+
+    def rebuild_daily_rollups_if_empty(self) -> int:
+        if self.db.scalar(select(AttendanceDailyRollup.student_id).limit(1)) is not None:
+            return 0
+        start = from_unix_seconds(0)
+        end = datetime(9999, 1, 1, tzinfo=JST)
+        breaks_by_session: dict[int, list[BreakSpan]] = defaultdict(list)
+        for session_id, started_at, ended_at in self.list_breaks_for_sessions_overlapping_period(start, end, open_sessions=False):
+            breaks_by_session[session_id].append((started_at, ended_at))
+
+        totals: dict[tuple[int, int], tuple[int, int]] = {}
+        for session in self.list_all_sessions_overlapping_period(start, end, open_sessions=False):
+            day = from_unix_seconds(session.entered_at).replace(hour=0, minute=0, second=0, microsecond=0)
+            left = from_unix_seconds(session.left_at)
+            while True:
+                net, business = session_period_minutes(
+                    session.entered_at,
+                    session.left_at,
+                    breaks_by_session.get(session.id, []),
+                    day,
+                    day + timedelta(days=1),
+                    left,
+                )
+                key = (session.student_id, to_unix_seconds(day))
+                net_total, business_total = totals.get(key, (0, 0))
+                totals[key] = (net_total + net, business_total + business)
+                day += timedelta(days=1)
+                if day >= left:
+                    break
+
+        self.db.add_all(
+            AttendanceDailyRollup(student_id=student_id, day_start_at=day_start_at, net_minutes=net, business_minutes=business)
+            for (student_id, day_start_at), (net, business) in totals.items()
+        )
+        self.db.commit()
+        return len(totals)
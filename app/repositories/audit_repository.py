@@ -1,12 +1,10 @@
 from sqlalchemy import select
-from sqlalchemy.orm import Session
 
 from app.models.audit_log import AuditLog
+from app.repositories.base import SessionRepository
 
 
-class AuditRepository:
-    def __init__(self, db: Session):
-        self.db = db
+class AuditRepository(SessionRepository):
 
     def create(
         self,
@@ -16,6 +14,7 @@ class AuditRepository:
         actor_name: str | None = None,
         target_id: int | None = None,
         detail_json: str | None = None,
+        commit: bool = True,
     ) -> AuditLog:
         rec = AuditLog(
             actor_type=actor_type,
@@ -26,8 +25,7 @@ class AuditRepository:
             detail_json=detail_json,
         )
         self.db.add(rec)
-        self.db.commit()
-        self.db.refresh(rec)
+        self._persist(rec, commit)
         return rec
 
     def list(self) -> list[AuditLog]:
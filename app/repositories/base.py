@@ -0,0 +1,14 @@
+from sqlalchemy.orm import Session
+
+
+class SessionRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _persist(self, obj: object, commit: bool) -> None:
+        # 呼び出し側のトランザクションに混ぜるときは flush だけして、確定は呼び出し側に任せる
+        if commit:
+            self.db.commit()
+            self.db.refresh(obj)
+        else:
+            self.db.flush()
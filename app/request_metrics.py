@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from threading import Lock
+import time
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics import MetricsRegistry, metrics_registry
+
+# 所要時間（ミリ秒）と SQL 文の数のバケット上限。最後のバケットは上限なし
+DURATION_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+@dataclass
+class RequestMetrics:
+    started_at: float = field(default_factory=time.perf_counter)
+    sql_count: int = 0
+    sql_seconds: float = 0.0
+    commits: int = 0
+    lock: Lock = field(default_factory=Lock)
+
+    def record_sql(self, seconds: float) -> None:
+        with self.lock:
+            self.sql_count += 1
+            self.sql_seconds += seconds
+
+    def record_commit(self) -> None:
+        with self.lock:
+            self.commits += 1
+
+    def elapsed_seconds(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def server_timing(self) -> str:
+        return (
+            f"app;dur={self.elapsed_seconds() * 1000:.1f}, "
+            f'sql;dur={self.sql_seconds * 1000:.1f};desc="{self.sql_count} statements", '
+            f'db-commit;desc="{self.commits}"'
+        )
+
+
+_current_request: ContextVar[RequestMetrics | None] = ContextVar("current_request_metrics", default=None)
+
+
+def current_request_metrics() -> RequestMetrics | None:
+    return _current_request.get()
+
+
+class RequestMetricsRegistry:
+    """ルートごとの所要時間・SQL 文の数・SQL 時間・コミット数を、/metrics と同じ計測器で集計する。"""
+
+    def __init__(self, registry: MetricsRegistry) -> None:
+        self.requests = registry.counter("http_requests_total", "Requests by route.", ("route",))
+        self.errors = registry.counter("http_request_errors_total", "Requests answered with 5xx by route.", ("route",))
+        self.commits = registry.counter("http_request_commits_total", "DB commits by route.", ("route",))
+        self.sql_seconds = registry.counter("http_request_sql_seconds_total", "SQL time by route.", ("route",))
+        # Prometheus の慣例に合わせて秒で持つ。管理画面向けの snapshot() はミリ秒で返す
+        self.duration = registry.histogram(
+            "http_request_duration_seconds",
+            "Request wall time by route.",
+            tuple(bucket / 1000 for bucket in DURATION_BUCKETS_MS),
+            ("route",),
+        )
+        self.sql_statements = registry.histogram(
+            "http_request_sql_statements", "SQL statements executed per request by route.", SQL_COUNT_BUCKETS, ("route",)
+        )
+
+    def observe(self, route: str, metrics: RequestMetrics, status_code: int) -> None:
+        self.requests.inc(route)
+        if status_code >= 500:
+            self.errors.inc(route)
+        self.commits.inc(route, amount=metrics.commits)
+        self.sql_seconds.inc(route, amount=metrics.sql_seconds)
+        self.duration.observe(metrics.elapsed_seconds(), route)
+        self.sql_statements.observe(metrics.sql_count, route)
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        requests = self.requests.values()
+        errors = self.errors.values()
+        commits = self.commits.values()
+        sql_seconds = self.sql_seconds.values()
+        durations = self.duration.series()
+        statements = self.sql_statements.series()
+        return {
+            route: {
+                "count": int(requests[(route,)]),
+                "errors": int(errors.get((route,), 0)),
+                "commits": int(commits.get((route,), 0)),
+                "sql_ms": round(sql_seconds.get((route,), 0) * 1000, 3),
+                "duration_ms": _histogram_snapshot(DURATION_BUCKETS_MS, durations.get((route,)), scale=1000),
+                "sql_count": _histogram_snapshot(SQL_COUNT_BUCKETS, statements.get((route,))),
+            }
+            for (route,) in sorted(requests)
+        }
+
+    def reset(self) -> None:
+        for metric in (self.requests, self.errors, self.commits, self.sql_seconds, self.duration, self.sql_statements):
+            metric.reset()
+
+
+def _histogram_snapshot(
+    buckets: tuple[float, ...], series: tuple[list[int], float] | None, scale: float = 1
+) -> dict[str, Any]:
+    # 件数の加算と観測の間に読むと、まだ観測されていないことがある
+    counts, total = series or ([0] * (len(buckets) + 1), 0.0)
+    labels = [str(bucket) for bucket in buckets] + ["+Inf"]
+    return {"buckets": dict(zip(labels, counts)), "sum": round(total * scale, 3)}
+
+
+request_metrics_registry = RequestMetricsRegistry(metrics_registry)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    # 開始時刻は文ごとの実行コンテキストに持たせ、失敗した文の分が接続に残らないようにする
+    if _current_request.get() is not None and context is not None:
+        context._request_metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    metrics = _current_request.get()
+    started = getattr(context, "_request_metrics_started", None)
+    if metrics is None or started is None:
+        return
+    metrics.record_sql(time.perf_counter() - started)
+
+
+@event.listens_for(Engine, "commit")
+def _on_commit(conn) -> None:
+    metrics = _current_request.get()
+    if metrics is not None:
+        metrics.record_commit()
+
+
+def route_label(scope: Scope) -> str:
+    # パスそのものではなくルートのテンプレートで集計し、トークン入りの URL で種類が増えないようにする
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        return "unmatched"
+    return f"{scope['method']} {path}"
+
+
+class RequestMetricsMiddleware:
+    """リクエストごとに所要時間と SQL の回数・時間・コミット数を測り、Server-Timing ヘッダーで返す。
+
+    ヘッダーは応答の開始時点の値なので、CSV などのストリーミング応答では最初の1チャンクまでになる。
+    集計には送信完了までの値を使う。
+    """
+
+    def __init__(self, app: ASGIApp, registry: RequestMetricsRegistry | None = None) -> None:
+        self.app = app
+        self.registry = registry or request_metrics_registry
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = RequestMetrics()
+        token = _current_request.set(metrics)
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", metrics.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_request.reset(token)
+            self.registry.observe(route_label(scope), metrics, status_code)
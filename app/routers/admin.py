@@ -1,16 +1,24 @@
-from fastapi import APIRouter, Depends, Request
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
 
 from app.admin_session import require_admin_api_auth
+from app.config import get_settings
 from app.deps import get_correction_service
 from app.deps import get_attendance_service
 from app.kiosk import kiosk_state
+from app.pending_touch_store import pending_touch_store
+from app.profiler import ProfilerBusyError, sampling_profiler
+from app.request_metrics import request_metrics_registry
 from app.schemas.attendance import UnknownCardAlertResponse
-from app.schemas.admin import CorrectionRequest
+from app.schemas.admin import CorrectionRequest, PendingTouchStatsResponse
 from app.schemas.kiosk import CardCaptureResponse
 from app.services.attendance_service import AttendanceService
 from app.services.correction_service import CorrectionService
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
+settings = get_settings()
 @router.post("/corrections")
 def create_correction(
     request: Request,
@@ -42,3 +50,42 @@ def get_latest_student_card(request: Request):
         reader_name=capture.reader_name,
         detected_at=capture.detected_at,
     )
+
+
+@router.get("/pending-touches/stats", response_model=PendingTouchStatsResponse)
+def get_pending_touch_stats(request: Request):
+    require_admin_api_auth(request)
+    stats = pending_touch_store.stats()
+    return PendingTouchStatsResponse(
+        size=stats.size,
+        capacity=stats.capacity,
+        expired=stats.expired,
+        evicted=stats.evicted,
+    )
+
+
+@router.get("/request-metrics")
+def get_request_metrics(request: Request):
+    require_admin_api_auth(request)
+    return request_metrics_registry.snapshot()
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+def get_profile(
+    request: Request,
+    seconds: float = Query(10, gt=0, le=60),
+    interval_ms: float = Query(10, ge=1, le=1000),
+):
+    require_admin_api_auth(request)
+    if not settings.profiler_enabled:
+        raise HTTPException(status_code=404, detail="プロファイラは無効です")
+    # 採取はこの要求のスレッドで行い、応答を返すまで待つ。複数ワーカー時は受けたワーカーのみが対象
+    try:
+        stacks, rounds = sampling_profiler.sample(seconds, interval_ms / 1000)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e)) from e
+    filename = f"profile-{datetime.now():%Y%m%d-%H%M%S}.collapsed"
+    return PlainTextResponse(
+        stacks,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Profile-Samples": str(rounds)},
+    )
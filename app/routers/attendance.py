@@ -5,7 +5,8 @@ from fastapi.responses import StreamingResponse
 
 from app.deps import get_attendance_service
 from app.kiosk import kiosk_state
-from app.realtime import attendance_event_broker
+from app.worker_pools import read_pool
+from app.realtime import TOUCH_PANEL_CHANGED, attendance_event_broker
 from app.schemas.attendance import TodayAttendanceResponse
 from app.schemas.touch_panel import TouchPanelActionResponse, TouchPanelActionUpdateRequest
 from app.schemas.kiosk import KioskModeResponse
@@ -18,8 +19,8 @@ router = APIRouter(prefix="/api/attendance", tags=["attendance"])
 
 
 @router.get("/today", response_model=TodayAttendanceResponse)
-def get_today(service: AttendanceService = Depends(get_attendance_service)):
-    return service.get_today_attendance()
+async def get_today(service: AttendanceService = Depends(get_attendance_service)):
+    return await read_pool.run(service.get_today_attendance)
 
 
 @router.get("/touch-panel/action", response_model=TouchPanelActionResponse)
@@ -30,7 +31,7 @@ def get_touch_panel_action():
 @router.post("/touch-panel/action", response_model=TouchPanelActionResponse)
 def set_touch_panel_action(payload: TouchPanelActionUpdateRequest):
     action = touch_panel_state.set_selected_action(payload.action)
-    attendance_event_broker.publish()
+    attendance_event_broker.publish(TOUCH_PANEL_CHANGED, {"selected_action": action.value})
     return TouchPanelActionResponse(selected_action=action)
 
 
@@ -48,13 +49,14 @@ async def stream_today_events():
     async def event_stream():
         yield "retry: 1000\n"
         yield "data: refresh\n\n"
-        async with attendance_event_broker.subscribe() as queue:
+        async with attendance_event_broker.subscribe() as subscription:
             while True:
                 try:
-                    event = await asyncio.wait_for(queue.get(), timeout=15.0)
+                    batch = await asyncio.wait_for(subscription.next_batch(), timeout=15.0)
                 except TimeoutError:
                     yield ": keepalive\n\n"
                     continue
-                yield f"data: {event}\n\n"
+                for event in batch:
+                    yield event.to_sse()
 
     return StreamingResponse(event_stream(), media_type="text/event-stream")
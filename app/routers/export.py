@@ -1,23 +1,39 @@
+from collections.abc import Iterator, Sequence
 import csv
 import io
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, Query
-from fastapi.responses import Response
-from sqlalchemy import and_, select
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import Row, and_, select
 from sqlalchemy.orm import Session
 
 from app.db import get_db
 from app.domain.time_utils import from_unix_seconds, to_unix_seconds
+from app.metrics import export_bytes
 from app.models.attendance_event import AttendanceEvent
 from app.models.student import Student
+from app.worker_pools import read_pool
 
 router = APIRouter(prefix="/api/export", tags=["export"])
 
 
-def _event_rows_between(db: Session, start: datetime, end: datetime):
+EXPORT_COLUMNS = ["student_code", "name", "event_type", "occurred_at", "source", "reader_name"]
+EXPORT_YIELD_PER = 500
+
+
+def _event_row_batches_between(db: Session, start: datetime, end: datetime) -> Iterator[Sequence[Row]]:
+    # エンティティ全体ではなく出力する6列だけを、カーソルから少しずつ読む
     stmt = (
-        select(AttendanceEvent, Student)
+        select(
+            Student.student_code,
+            Student.name,
+            AttendanceEvent.event_type,
+            AttendanceEvent.occurred_at,
+            AttendanceEvent.source,
+            AttendanceEvent.reader_name,
+        )
         .join(Student, Student.id == AttendanceEvent.student_id)
         .where(
             and_(
@@ -26,30 +42,59 @@ def _event_rows_between(db: Session, start: datetime, end: datetime):
             )
         )
         .order_by(AttendanceEvent.occurred_at)
+        .execution_options(yield_per=EXPORT_YIELD_PER)
     )
-    return list(db.execute(stmt).all())
+    result = db.execute(stmt)
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
 
 
-def _csv_response(rows: list[tuple[AttendanceEvent, Student]]) -> Response:
+def _csv_chunks(db: Session, start: datetime, end: datetime) -> Iterator[str]:
     buffer = io.StringIO()
     writer = csv.writer(buffer)
-    writer.writerow(["student_code", "name", "event_type", "occurred_at", "source", "reader_name"])
-    for event, student in rows:
-        writer.writerow(
-            [
-                student.student_code,
-                student.name,
-                event.event_type,
-                from_unix_seconds(event.occurred_at).isoformat(),
-                event.source,
-                event.reader_name or "",
-            ]
-        )
-    return Response(content=buffer.getvalue(), media_type="text/csv; charset=utf-8")
+    writer.writerow(EXPORT_COLUMNS)
+    try:
+        yield _drain(buffer)
+        for batch in _event_row_batches_between(db, start, end):
+            for student_code, name, event_type, occurred_at, source, reader_name in batch:
+                writer.writerow(
+                    [
+                        student_code,
+                        name,
+                        event_type,
+                        from_unix_seconds(occurred_at).isoformat(),
+                        source,
+                        reader_name or "",
+                    ]
+                )
+            yield _drain(buffer)
+    finally:
+        # 送信が終わるまで接続を使うので、ここで確実に返却する
+        db.close()
+
+
+def _drain(buffer: io.StringIO) -> str:
+    chunk = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    export_bytes.inc(amount=len(chunk.encode("utf-8")))
+    return chunk
+
+
+async def _csv_response(db: Session, start: datetime, end: datetime) -> StreamingResponse:
+    # 送信し終えるまで出力枠を占有する。混雑時はヘッダー送信前に 503 を返す
+    ticket = await read_pool.acquire()
+    return StreamingResponse(
+        read_pool.iterate(_csv_chunks(db, start, end), on_close=ticket.release),
+        media_type="text/csv; charset=utf-8",
+        background=BackgroundTask(ticket.release),
+    )
 
 
 @router.get("/monthly.csv")
-def export_monthly_csv(
+async def export_monthly_csv(
     year: int = Query(..., ge=2000, le=2100),
     month: int = Query(..., ge=1, le=12),
     db: Session = Depends(get_db),
@@ -60,12 +105,11 @@ def export_monthly_csv(
     else:
         end = datetime(year, month + 1, 1)
 
-    rows = _event_rows_between(db, start, end)
-    return _csv_response(rows)
+    return await _csv_response(db, start, end)
 
 
 @router.get("/semester.csv")
-def export_semester_csv(
+async def export_semester_csv(
     year: int = Query(..., ge=2000, le=2100),
     semester: int = Query(..., ge=1, le=2),
     db: Session = Depends(get_db),
@@ -77,5 +121,4 @@ def export_semester_csv(
         start = datetime(year, 10, 1)
         end = datetime(year + 1, 4, 1)
 
-    rows = _event_rows_between(db, start, end)
-    return _csv_response(rows)
+    return await _csv_response(db, start, end)
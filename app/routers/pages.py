@@ -1,3 +1,6 @@
+from collections.abc import Callable
+from typing import TypeVar
+
 from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
@@ -7,6 +10,7 @@ from app.domain.enums import AttendanceAction
 from app.domain.time_utils import now_jst
 from app.deps import get_attendance_service, get_student_service
 from app.kiosk import kiosk_state, KioskMode
+from app.worker_pools import read_pool
 from app.schemas.student import StudentCreate, StudentUpdate
 from app.services.attendance_service import AttendanceService
 from app.services.exceptions import (
@@ -21,6 +25,8 @@ from app.touch_panel import TouchPanelSelection, touch_panel_state
 router = APIRouter(tags=["pages"])
 templates = Jinja2Templates(directory="app/templates")
 
+T = TypeVar("T")
+
 ACTION_LABELS = {
     AttendanceAction.ENTER.value: "入室",
     AttendanceAction.LEAVE_TEMP.value: "一時退出",
@@ -54,6 +60,16 @@ def build_touch_result_message(card_id: str, action: str, action_label: str, nex
     return f"カード {card_id} を「{action_label}」で処理しました（次状態: {next_status_label}）"
 
 
+async def _load_admin_view(load: Callable[[], T]) -> T:
+    # 管理画面の集計は読み取り専用プールで同時実行数を絞って行い、リーダーの打刻処理とスレッドを奪い合わない
+    def _run() -> T:
+        kiosk_state.set_mode(KioskMode.ATTENDANCE)
+        return load()
+
+    async with read_pool.admit():
+        return await read_pool.run(_run)
+
+
 @router.get("/", response_class=HTMLResponse)
 def index_page(
     request: Request,
@@ -173,15 +189,14 @@ def student_term_total_page(
 
 
 @router.get("/admin/today", response_class=HTMLResponse)
-def admin_today_page(
+async def admin_today_page(
     request: Request,
     attendance_service: AttendanceService = Depends(get_attendance_service),
 ):
     redirect = require_admin_page_auth(request)
     if redirect:
         return redirect
-    kiosk_state.set_mode(KioskMode.ATTENDANCE)
-    today = attendance_service.get_today_attendance()
+    today = await _load_admin_view(attendance_service.get_today_attendance)
     return templates.TemplateResponse(
         request,
         "admin_today.html",
@@ -194,7 +209,7 @@ def admin_today_page(
 
 
 @router.get("/admin/current-times", response_class=HTMLResponse)
-def admin_current_times_page(
+async def admin_current_times_page(
     request: Request,
     target: str = Query("all"),
     attendance_service: AttendanceService = Depends(get_attendance_service),
@@ -202,10 +217,9 @@ def admin_current_times_page(
     redirect = require_admin_page_auth(request)
     if redirect:
         return redirect
-    kiosk_state.set_mode(KioskMode.ATTENDANCE)
     if target not in AttendanceService.CURRENT_TIME_TARGETS:
         raise HTTPException(status_code=400, detail="不正な表示対象です")
-    entries = attendance_service.list_student_current_times(target=target)
+    entries = await _load_admin_view(lambda: attendance_service.list_student_current_times(target=target))
     return templates.TemplateResponse(
         request,
         "admin_current_times.html",
@@ -224,15 +238,14 @@ def admin_current_times_page(
 
 
 @router.get("/admin/students", response_class=HTMLResponse)
-def admin_students_page(
+async def admin_students_page(
     request: Request,
     student_service: StudentService = Depends(get_student_service),
 ):
     redirect = require_admin_page_auth(request)
     if redirect:
         return redirect
-    kiosk_state.set_mode(KioskMode.ATTENDANCE)
-    students = student_service.list_students(include_inactive=True)
+    students = await _load_admin_view(lambda: student_service.list_students(include_inactive=True))
     return templates.TemplateResponse(
         request,
         "admin_students.html",
@@ -373,15 +386,14 @@ def admin_student_update(
 
 
 @router.get("/admin/events", response_class=HTMLResponse)
-def admin_events_page(
+async def admin_events_page(
     request: Request,
     attendance_service: AttendanceService = Depends(get_attendance_service),
 ):
     redirect = require_admin_page_auth(request)
     if redirect:
         return redirect
-    kiosk_state.set_mode(KioskMode.ATTENDANCE)
-    today = attendance_service.get_today_attendance()
+    today = await _load_admin_view(attendance_service.get_today_attendance)
     return templates.TemplateResponse(
         request,
         "admin_events.html",
@@ -1,69 +1,160 @@
+import asyncio
+from collections.abc import Callable
+from datetime import datetime
+from typing import TypeVar
+
 from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 
 from app.config import get_settings
 from app.deps import get_attendance_service
-from app.kiosk import kiosk_state
-from app.realtime import attendance_event_broker
+from app.idempotency import idempotency_store
+from app.kiosk import KioskMode, kiosk_state
+from app.realtime import KIOSK_MODE_CHANGED, REFRESH, TOUCH_PANEL_CHANGED, attendance_event_broker
+from app.schemas.attendance import TouchPanelErrorResponse
 from app.schemas.kiosk import KioskModeResponse
 from app.schemas.touch_panel import TouchPanelErrorCaptureRequest
 from app.schemas.reader import (
+    ReaderStateResponse,
+    ReaderTapOutcome,
+    ReaderTapRequest,
+    ReaderTapResponse,
     ReaderTouchConfirmRequest,
     ReaderTouchConfirmResponse,
     ReaderTouchRequest,
     ReaderTouchResponse,
 )
 from app.services.attendance_service import AttendanceService
-from app.touch_panel import touch_panel_state
+from app.services.exceptions import InvalidActionError, PreferredActionNotAllowedError
+from app.touch_panel import TouchPanelSelection, touch_panel_state
+from app.worker_pools import reader_pool
 
 router = APIRouter(prefix="/api/reader", tags=["reader"])
 settings = get_settings()
 
+READER_STATE_EVENT = "reader_state"
+# リーダーの状態に関わるイベント。他ワーカーでの変更は refresh としてしか届かない
+READER_STATE_TRIGGERS = {KIOSK_MODE_CHANGED, TOUCH_PANEL_CHANGED, REFRESH}
+
+IDEMPOTENCY_KEY_HEADER = Header(default=None, alias="Idempotency-Key", max_length=128)
+
+ResponseT = TypeVar("ResponseT", bound=BaseModel)
+
+
+def publish_touch_error(message: str, detected_at: datetime) -> None:
+    error = touch_panel_state.store_error(message=message, detected_at=detected_at)
+    alert = TouchPanelErrorResponse(message=error.message, detected_at=error.detected_at)
+    attendance_event_broker.publish_alert("touch_error", alert.model_dump(mode="json"))
+
+
+def store_admin_login_capture(payload: ReaderTouchRequest | ReaderTapRequest) -> None:
+    kiosk_state.store_admin_login_capture(payload.card_id, payload.reader_name, payload.detected_at)
+    attendance_event_broker.publish_card_captured("admin_login")
+
+
+def store_student_card_capture(payload: ReaderTouchRequest | ReaderTapRequest) -> None:
+    kiosk_state.store_student_card_capture(payload.card_id, payload.reader_name, payload.detected_at)
+    attendance_event_broker.publish_card_captured("student_card")
+
 
-def require_reader_token(x_reader_token: str = Header(alias="X-Reader-Token")) -> None:
+async def require_reader_token(x_reader_token: str = Header(alias="X-Reader-Token")) -> None:
     if x_reader_token != settings.reader_token:
         raise HTTPException(status_code=401, detail="リーダートークンが無効です")
 
 
+async def run_idempotent(
+    service: AttendanceService,
+    scope: str,
+    idempotency_key: str | None,
+    process: Callable[[], ResponseT],
+    response_model: type[ResponseT],
+) -> ResponseT:
+    if idempotency_key is None:
+        return await reader_pool.run(process)
+    # タイムアウト直後の再送は、保存済みの応答をスレッドも DB も使わずに返す
+    stored = idempotency_store.cached(service.db, scope, idempotency_key)
+    if stored is not None:
+        return response_model.model_validate(stored)
+    return await reader_pool.run(idempotency_store.run, service.db, scope, idempotency_key, process, response_model)
+
+
 @router.post("/touches", response_model=ReaderTouchResponse, dependencies=[Depends(require_reader_token)])
-def create_touch(
+async def create_touch(
     payload: ReaderTouchRequest,
     service: AttendanceService = Depends(get_attendance_service),
+    idempotency_key: str | None = IDEMPOTENCY_KEY_HEADER,
 ):
-    return service.prepare_touch(payload.card_id, payload.reader_name, payload.detected_at)
+    return await run_idempotent(
+        service,
+        "reader.touch",
+        idempotency_key,
+        lambda: service.prepare_touch(payload.card_id, payload.reader_name, payload.detected_at),
+        ReaderTouchResponse,
+    )
 
 
 @router.post("/captures/admin-login", dependencies=[Depends(require_reader_token)])
-def capture_admin_login_card(payload: ReaderTouchRequest):
-    kiosk_state.store_admin_login_capture(payload.card_id, payload.reader_name, payload.detected_at)
-    attendance_event_broker.publish()
+async def capture_admin_login_card(payload: ReaderTouchRequest):
+    await reader_pool.run(store_admin_login_capture, payload)
     return {"ok": True}
 
 
 @router.post("/captures/student-card", dependencies=[Depends(require_reader_token)])
-def capture_student_card(payload: ReaderTouchRequest):
-    kiosk_state.store_student_card_capture(payload.card_id, payload.reader_name, payload.detected_at)
-    attendance_event_broker.publish()
+async def capture_student_card(payload: ReaderTouchRequest):
+    await reader_pool.run(store_student_card_capture, payload)
     return {"ok": True}
 
 
 @router.post("/captures/term-total", dependencies=[Depends(require_reader_token)])
-def capture_term_total(
+async def capture_term_total(
     payload: ReaderTouchRequest,
     service: AttendanceService = Depends(get_attendance_service),
 ):
-    return service.capture_current_term_total_by_card(payload.card_id, payload.reader_name, payload.detected_at)
+    return await reader_pool.run(
+        service.capture_current_term_total_by_card, payload.card_id, payload.reader_name, payload.detected_at
+    )
 
 
 @router.post("/captures/touch-error", dependencies=[Depends(require_reader_token)])
-def capture_touch_error(payload: TouchPanelErrorCaptureRequest):
-    touch_panel_state.store_error(message=payload.message, detected_at=payload.detected_at)
-    attendance_event_broker.publish()
+async def capture_touch_error(payload: TouchPanelErrorCaptureRequest):
+    await reader_pool.run(publish_touch_error, payload.message, payload.detected_at)
     return {"ok": True}
 
 
 @router.get("/kiosk-mode", response_model=KioskModeResponse, dependencies=[Depends(require_reader_token)])
-def get_kiosk_mode():
-    return KioskModeResponse(mode=kiosk_state.get_mode())
+async def get_kiosk_mode():
+    return KioskModeResponse(mode=await reader_pool.run(kiosk_state.get_mode))
+
+
+def read_reader_state() -> ReaderStateResponse:
+    return ReaderStateResponse(mode=kiosk_state.get_mode(), selected_action=touch_panel_state.get_selected_action())
+
+
+@router.get("/stream", dependencies=[Depends(require_reader_token)])
+async def stream_reader_state():
+    """キオスクモードとタッチパネルの選択をリーダーへ送り続ける。接続直後に現在値、以後は変化のたびに送る。"""
+
+    async def event_stream():
+        yield "retry: 1000\n"
+        last_sent: ReaderStateResponse | None = None
+        # 購読してから現在値を読むので、その間の変更を取りこぼさない
+        async with attendance_event_broker.subscribe() as subscription:
+            while True:
+                state = await reader_pool.run(read_reader_state)
+                if state != last_sent:
+                    last_sent = state
+                    yield f"event: {READER_STATE_EVENT}\ndata: {state.model_dump_json()}\n\n"
+                while True:
+                    try:
+                        batch = await asyncio.wait_for(subscription.next_batch(), timeout=15.0)
+                    except TimeoutError:
+                        yield ": keepalive\n\n"
+                        continue
+                    if any(event.name in READER_STATE_TRIGGERS for event in batch):
+                        break
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 
 @router.post(
@@ -71,9 +162,71 @@ def get_kiosk_mode():
     response_model=ReaderTouchConfirmResponse,
     dependencies=[Depends(require_reader_token)],
 )
-def confirm_touch(
+async def confirm_touch(
     touch_token: str,
     payload: ReaderTouchConfirmRequest,
     service: AttendanceService = Depends(get_attendance_service),
+    idempotency_key: str | None = IDEMPOTENCY_KEY_HEADER,
+):
+    # 1回目の確定でトークンは消えるので、再送には「見つからない」ではなく最初の結果を返す
+    return await run_idempotent(
+        service,
+        f"reader.confirm:{touch_token}",
+        idempotency_key,
+        lambda: service.confirm_touch(touch_token, payload.action, payload.now),
+        ReaderTouchConfirmResponse,
+    )
+
+
+@router.post("/taps", response_model=ReaderTapResponse, dependencies=[Depends(require_reader_token)])
+async def create_tap(
+    payload: ReaderTapRequest,
+    service: AttendanceService = Depends(get_attendance_service),
+    idempotency_key: str | None = IDEMPOTENCY_KEY_HEADER,
 ):
-    return service.confirm_touch(touch_token, payload.action, payload.now)
+    return await run_idempotent(
+        service,
+        "reader.tap",
+        idempotency_key,
+        lambda: process_tap(payload, service),
+        ReaderTapResponse,
+    )
+
+
+def process_tap(payload: ReaderTapRequest, service: AttendanceService) -> ReaderTapResponse:
+    mode = kiosk_state.get_mode()
+    selected_action = touch_panel_state.get_selected_action()
+    response = ReaderTapResponse(outcome=ReaderTapOutcome.CONFIRMED, mode=mode, selected_action=selected_action)
+
+    # 再送された打刻は、リーダーがタッチ時点の画面状態で入退室と確かめ、操作も決めてから貯めたもの。
+    # 今の画面状態では処理しない
+    if payload.replayed and payload.action is None:
+        raise InvalidActionError("再送の打刻には操作の指定が必要です")
+    if not payload.replayed:
+        if mode == KioskMode.ADMIN_LOGIN:
+            store_admin_login_capture(payload)
+            response.outcome = ReaderTapOutcome.ADMIN_LOGIN_CAPTURED
+            return response
+        if mode == KioskMode.STUDENT_REGISTER:
+            store_student_card_capture(payload)
+            response.outcome = ReaderTapOutcome.STUDENT_CARD_CAPTURED
+            return response
+        if selected_action == TouchPanelSelection.TERM_TOTAL:
+            response.outcome = ReaderTapOutcome.TERM_TOTAL
+            response.term_total = service.capture_current_term_total_by_card(
+                payload.card_id, payload.reader_name, payload.detected_at
+            )
+            return response
+
+    try:
+        response.action, response.confirm = service.tap_touch(
+            payload.card_id,
+            payload.reader_name,
+            payload.detected_at,
+            requested_action=payload.action,
+        )
+    except PreferredActionNotAllowedError as exc:
+        publish_touch_error(str(exc), payload.detected_at)
+        response.outcome = ReaderTapOutcome.TOUCH_ERROR
+        response.message = str(exc)
+    return response
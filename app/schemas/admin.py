@@ -12,3 +12,10 @@ class CorrectionRequest(BaseModel):
     operator_name: str | None = None
     memo: str | None = None
     reader_name: str | None = None
+
+
+class PendingTouchStatsResponse(BaseModel):
+    size: int
+    capacity: int
+    expired: int
+    evicted: int
@@ -1,8 +1,12 @@
 from datetime import datetime
+from enum import Enum
 
 from pydantic import BaseModel
 
 from app.domain.enums import AttendanceAction, AttendanceStatus
+from app.kiosk import KioskMode
+from app.schemas.attendance import TermTotalLookupResponse
+from app.touch_panel import TouchPanelSelection
 
 
 class ReaderTouchRequest(BaseModel):
@@ -31,3 +35,35 @@ class ReaderTouchConfirmResponse(BaseModel):
     next_status: AttendanceStatus
     event_id: int
     lock_alert_required: bool
+
+
+class ReaderTapRequest(BaseModel):
+    card_id: str
+    reader_name: str | None = None
+    detected_at: datetime
+    action: AttendanceAction | None = None
+    # リーダーの送信ジャーナルから再送された打刻。action が必須で、キオスクモードやタッチパネルの選択は送信時点のものを使わない
+    replayed: bool = False
+
+
+class ReaderStateResponse(BaseModel):
+    mode: KioskMode
+    selected_action: TouchPanelSelection
+
+
+class ReaderTapOutcome(str, Enum):
+    CONFIRMED = "CONFIRMED"
+    TOUCH_ERROR = "TOUCH_ERROR"
+    TERM_TOTAL = "TERM_TOTAL"
+    ADMIN_LOGIN_CAPTURED = "ADMIN_LOGIN_CAPTURED"
+    STUDENT_CARD_CAPTURED = "STUDENT_CARD_CAPTURED"
+
+
+class ReaderTapResponse(BaseModel):
+    outcome: ReaderTapOutcome
+    mode: KioskMode
+    selected_action: TouchPanelSelection
+    action: AttendanceAction | None = None
+    confirm: ReaderTouchConfirmResponse | None = None
+    term_total: TermTotalLookupResponse | None = None
+    message: str | None = None
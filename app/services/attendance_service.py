@@ -1,21 +1,28 @@
-from datetime import datetime, timedelta
+from collections import defaultdict
+from datetime import date, datetime, timedelta
 import json
 from uuid import uuid4
 
 from sqlalchemy.orm import Session
 
+from app.card_index import CardIndexEntry, card_index
+from app.db import after_commit, commit
+from app.domain.attendance_minutes import BreakSpan, business_minutes, net_minutes_in_window, session_period_minutes
 from app.domain.enums import AttendanceAction, AttendanceStatus
 from app.domain.pending_touch import PendingTouch
+from app.metrics import taps_confirmed, taps_prepared, unknown_card_logs
+from app.pending_touch_store import pending_touch_store
 from app.domain.state_machine import InvalidTransitionError, get_allowed_actions, next_state
 from app.domain.time_utils import ensure_jst, from_unix_seconds, minutes_between, now_jst
 from app.repositories.attendance_repository import AttendanceRepository
 from app.repositories.audit_repository import AuditRepository
 from app.repositories.student_repository import StudentRepository
 from app.repositories.unknown_card_repository import UnknownCardRepository
-from app.realtime import attendance_event_broker
+from app.realtime import EVENT_APPENDED, STATUS_CHANGED, attendance_event_broker
+from app.sweeper import stale_session_sweeper
+from app.today_snapshot import AlertSnapshot, InRoomSnapshotRow, TodaySnapshot, today_snapshot_cache
 from app.touch_panel import touch_panel_state
-from app.models.attendance_session import AttendanceSession
-from app.models.student import Student
+from app.models.attendance_event import AttendanceEvent
 from app.schemas.attendance import AttendanceEventResponse, InRoomEntry, StudentCurrentTimeEntry, TermTotalLookupResponse, TodayAttendanceResponse
 from app.schemas.attendance import LockAlertResponse, TouchPanelErrorResponse, UnknownCardAlertResponse
 from app.schemas.reader import ReaderTouchConfirmResponse, ReaderTouchResponse
@@ -23,18 +30,26 @@ from app.services.audit_service import AuditService
 from app.services.exceptions import (
     InactiveStudentError,
     InvalidActionError,
+    PreferredActionNotAllowedError,
     TouchTokenExpiredError,
     TouchTokenNotFoundError,
     UnknownCardError,
 )
 
 
+ACTION_LABELS = {
+    AttendanceAction.ENTER: "入室",
+    AttendanceAction.LEAVE_TEMP: "一時退出",
+    AttendanceAction.RETURN: "再入室",
+    AttendanceAction.LEAVE_FINAL: "退出",
+}
+
+
 class AttendanceService:
     PENDING_TTL_SECONDS = 20
     UNKNOWN_CARD_ALERT_WINDOW_SECONDS = 30
     LOCK_ALERT_WINDOW_SECONDS = 30
     CURRENT_TIME_TARGETS = {"all", "active", "in_room"}
-    _shared_pending_touches: dict[str, PendingTouch] = {}
 
     def __init__(self, db: Session):
         self.db = db
@@ -43,7 +58,7 @@ class AttendanceService:
         self.audit_repo = AuditRepository(db)
         self.unknown_repo = UnknownCardRepository(db)
         self.audit_service = AuditService(db)
-        self._pending_touches = self._shared_pending_touches
+        self._pending_touches = pending_touch_store
 
     def _get_current_status(self, student_id: int) -> AttendanceStatus:
         status_model = self.att_repo.get_status(student_id)
@@ -52,28 +67,17 @@ class AttendanceService:
         return AttendanceStatus(status_model.current_status)
 
     def _close_stale_open_sessions(self, now: datetime) -> None:
-        current = ensure_jst(now)
-        today_start = current.replace(hour=0, minute=0, second=0, microsecond=0)
-        stale_sessions = self.att_repo.list_open_sessions_started_before(today_start)
-        for session in stale_sessions:
-            session_start = from_unix_seconds(session.entered_at)
-            session_end = session_start.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
-            total_minutes = self._compute_net_minutes(session_start, session_end, session.id)
-            self.att_repo.close_session(session, left_at=session_end, total_minutes=total_minutes)
-            self.att_repo.upsert_status(
-                student_id=session.student_id,
-                current_status=AttendanceStatus.OUTSIDE.value,
-                last_event_id=None,
-            )
+        stale_session_sweeper.sweep_if_needed(self.db, now)
 
     def prepare_touch(self, card_id: str, reader_name: str | None, detected_at: datetime) -> ReaderTouchResponse:
         self._close_stale_open_sessions(detected_at)
-        student = self.student_repo.get_by_card_id(card_id)
+        student = card_index.lookup(self.db, card_id)
         if student is None:
-            self.unknown_repo.create(card_id=card_id, reader_name=reader_name, detected_at=detected_at)
-            attendance_event_broker.publish()
+            taps_prepared.inc("unknown_card")
+            self._record_unknown_card(card_id, reader_name, detected_at)
             raise UnknownCardError("未登録のカードです")
         if not student.is_active:
+            taps_prepared.inc("inactive_student")
             raise InactiveStudentError("非アクティブな学生です")
 
         current_status = self._get_current_status(student.id)
@@ -87,10 +91,11 @@ class AttendanceService:
             reader_name=reader_name,
             detected_at=detected_at,
             current_status=current_status,
-            allowed_actions=allowed_actions,
+            allowed_actions=tuple(allowed_actions),
             expires_at=detected_at + timedelta(seconds=self.PENDING_TTL_SECONDS),
         )
-        self._pending_touches[token] = pending
+        self._pending_touches.put(pending)
+        taps_prepared.inc("prepared")
 
         return ReaderTouchResponse(
             touch_token=token,
@@ -103,47 +108,128 @@ class AttendanceService:
         )
 
     def confirm_touch(self, touch_token: str, action: AttendanceAction, now: datetime | None = None) -> ReaderTouchConfirmResponse:
-        pending = self._pending_touches.get(touch_token)
+        now = now or now_jst()
+        pending = self._pending_touches.get(touch_token, now)
         if pending is None:
+            taps_confirmed.inc(action.value, "token_not_found")
             raise TouchTokenNotFoundError("タッチトークンが見つかりません")
 
-        now = now or now_jst()
         if pending.is_expired(now):
-            self._pending_touches.pop(touch_token, None)
+            self._pending_touches.pop(touch_token)
+            taps_confirmed.inc(action.value, "token_expired")
             raise TouchTokenExpiredError("タッチトークンの有効期限が切れています")
 
         if action not in pending.allowed_actions:
+            taps_confirmed.inc(action.value, "invalid_action")
             raise InvalidActionError("許可されていない操作です")
 
         try:
             new_status = next_state(pending.current_status, action)
         except InvalidTransitionError as e:
+            taps_confirmed.inc(action.value, "invalid_action")
             raise InvalidActionError(str(e)) from e
 
+        # イベント・状態・セッション・監査ログを1トランザクションでコミットする。
+        # 冪等キー付きの要求では、応答の記録も同じトランザクションに入るようコミットを呼び出し側に任せる
+        try:
+            event, lock_alert_required = self._apply_transition(pending, action, new_status, now)
+            after_commit(
+                self.db, lambda: self._finish_confirm(touch_token, action, pending, event, new_status, lock_alert_required, now)
+            )
+            commit(self.db)
+        except Exception:
+            self.db.rollback()
+            raise
+
+        return ReaderTouchConfirmResponse(
+            student_id=pending.student_id,
+            next_status=new_status,
+            event_id=event.id,
+            lock_alert_required=lock_alert_required,
+        )
+
+    def _finish_confirm(
+        self,
+        touch_token: str,
+        action: AttendanceAction,
+        pending: PendingTouch,
+        event: AttendanceEvent,
+        new_status: AttendanceStatus,
+        lock_alert_required: bool,
+        now: datetime,
+    ) -> None:
+        self._pending_touches.pop(touch_token)
+        taps_confirmed.inc(action.value, "confirmed")
+        stale_session_sweeper.rewind(self.db, now)
+        today_snapshot_cache.invalidate()
+        self._publish_transition(pending, event, new_status, lock_alert_required)
+
+    def tap_touch(
+        self,
+        card_id: str,
+        reader_name: str | None,
+        detected_at: datetime,
+        requested_action: AttendanceAction | None = None,
+    ) -> tuple[AttendanceAction, ReaderTouchConfirmResponse]:
+        touch = self.prepare_touch(card_id, reader_name, detected_at)
+        try:
+            action = self._choose_tap_action(touch, requested_action)
+        except InvalidActionError:
+            self._pending_touches.pop(touch.touch_token)
+            raise
+        return action, self.confirm_touch(touch.touch_token, action, detected_at)
+
+    def _choose_tap_action(self, touch: ReaderTouchResponse, requested_action: AttendanceAction | None) -> AttendanceAction:
+        allowed = touch.allowed_actions
+        if requested_action is not None:
+            if requested_action not in allowed:
+                raise InvalidActionError("許可されていない操作です")
+            return requested_action
+        if not allowed:
+            raise InvalidActionError("許可されている操作がありません")
+        preferred = touch.preferred_action
+        if preferred is None:
+            return allowed[0]
+        if preferred not in allowed:
+            allowed_labels = ", ".join(ACTION_LABELS[action] for action in allowed)
+            raise PreferredActionNotAllowedError(
+                f"選択中の操作「{ACTION_LABELS[preferred]}」はこのカードでは使えません（許可: {allowed_labels}）"
+            )
+        return preferred
+
+    def _apply_transition(
+        self,
+        pending: PendingTouch,
+        action: AttendanceAction,
+        new_status: AttendanceStatus,
+        now: datetime,
+    ) -> tuple[AttendanceEvent, bool]:
         event = self.att_repo.add_event(
             student_id=pending.student_id,
             event_type=action.value,
             occurred_at=now,
             source="reader",
             reader_name=pending.reader_name,
+            commit=False,
         )
         self.att_repo.upsert_status(
             student_id=pending.student_id,
             current_status=new_status.value,
             last_event_id=event.id,
+            commit=False,
         )
 
         lock_alert_required = False
         open_session = self.att_repo.get_open_session(pending.student_id)
 
         if pending.current_status == AttendanceStatus.OUTSIDE and action == AttendanceAction.ENTER:
-            self.att_repo.create_session(student_id=pending.student_id, entered_at=now)
+            self.att_repo.create_session(student_id=pending.student_id, entered_at=now, commit=False)
         elif pending.current_status == AttendanceStatus.IN_ROOM and action == AttendanceAction.LEAVE_TEMP:
             if open_session:
-                self.att_repo.start_break(session_id=open_session.id, started_at=now)
+                self.att_repo.start_break(session_id=open_session.id, started_at=now, commit=False)
         elif pending.current_status == AttendanceStatus.OUT_ON_BREAK and action == AttendanceAction.RETURN:
             if open_session:
-                self.att_repo.end_latest_open_break(session_id=open_session.id, ended_at=now)
+                self.att_repo.end_latest_open_break(session_id=open_session.id, ended_at=now, commit=False)
         elif pending.current_status == AttendanceStatus.IN_ROOM and action == AttendanceAction.LEAVE_FINAL:
             if open_session:
                 total_minutes = self._compute_net_minutes(
@@ -151,7 +237,7 @@ class AttendanceService:
                     now,
                     open_session.id,
                 )
-                self.att_repo.close_session(open_session, left_at=now, total_minutes=total_minutes)
+                self.att_repo.close_session(open_session, left_at=now, total_minutes=total_minutes, commit=False)
             lock_alert_required = self.att_repo.count_in_room() == 0
             if lock_alert_required:
                 self.audit_service.log(
@@ -160,17 +246,55 @@ class AttendanceService:
                     target_type="student",
                     target_id=pending.student_id,
                     detail={"message": "在室者が0人になりました。施錠してください"},
+                    commit=False,
                 )
+        return event, lock_alert_required
+
+    def _record_unknown_card(self, card_id: str, reader_name: str | None, detected_at: datetime) -> None:
+        record = self.unknown_repo.create(card_id=card_id, reader_name=reader_name, detected_at=detected_at)
+        unknown_card_logs.inc()
+        today_snapshot_cache.invalidate()
+        alert = UnknownCardAlertResponse(
+            card_id=record.card_id,
+            reader_name=record.reader_name,
+            detected_at=from_unix_seconds(record.detected_at),
+        )
+        attendance_event_broker.publish_alert("unknown_card_alert", alert.model_dump(mode="json"))
 
-        self._pending_touches.pop(touch_token, None)
-        attendance_event_broker.publish()
-
-        return ReaderTouchConfirmResponse(
-            student_id=pending.student_id,
-            next_status=new_status,
-            event_id=event.id,
-            lock_alert_required=lock_alert_required,
+    def _publish_transition(
+        self,
+        pending: PendingTouch,
+        event: AttendanceEvent,
+        new_status: AttendanceStatus,
+        lock_alert_required: bool,
+    ) -> None:
+        # 画面側で再取得せずに済むよう、追加された打刻と変わった在室状態をそのまま送る
+        student = self.student_repo.get_by_id(pending.student_id)
+        attendance_event_broker.publish(
+            EVENT_APPENDED,
+            AttendanceEventResponse(
+                id=event.id,
+                student_id=student.id,
+                student_code=student.student_code,
+                student_name=student.name,
+                event_type=event.event_type,
+                occurred_at=from_unix_seconds(event.occurred_at),
+                source=event.source,
+            ).model_dump(mode="json"),
         )
+        attendance_event_broker.publish(
+            STATUS_CHANGED,
+            {
+                "student_id": student.id,
+                "student_code": student.student_code,
+                "name": student.name,
+                "current_status": new_status.value,
+            },
+        )
+        if lock_alert_required:
+            lock_alert = self.get_latest_lock_alert()
+            if lock_alert is not None:
+                attendance_event_broker.publish_alert("lock_alert", lock_alert.model_dump(mode="json"))
 
     def _compute_net_minutes(self, entered_at: datetime, left_at: datetime, session_id: int) -> int:
         entered = ensure_jst(entered_at)
@@ -179,30 +303,8 @@ class AttendanceService:
         break_minutes = self.att_repo.sum_break_minutes(session_id=session_id, until=left)
         return max(0, gross - break_minutes)
 
-    def _compute_net_minutes_for_period(
-        self,
-        session: AttendanceSession,
-        period_start: datetime,
-        period_end: datetime,
-        now: datetime,
-    ) -> int:
-        session_start = from_unix_seconds(session.entered_at)
-        session_end = from_unix_seconds(session.left_at) if session.left_at is not None else ensure_jst(now)
-        overlap_start = max(session_start, ensure_jst(period_start))
-        overlap_end = min(session_end, ensure_jst(period_end))
-        if overlap_end <= overlap_start:
-            return 0
-
-        gross = minutes_between(overlap_start, overlap_end)
-        break_minutes = 0
-        for bp in self.att_repo.list_breaks(session.id):
-            bp_start = from_unix_seconds(bp.started_at)
-            bp_end = from_unix_seconds(bp.ended_at) if bp.ended_at is not None else session_end
-            b_start = max(bp_start, overlap_start)
-            b_end = min(bp_end, overlap_end)
-            if b_end > b_start:
-                break_minutes += minutes_between(b_start, b_end)
-        return max(0, gross - break_minutes)
+    def _list_break_spans(self, session_id: int) -> list[BreakSpan]:
+        return [(bp.started_at, bp.ended_at) for bp in self.att_repo.list_breaks(session_id)]
 
     def _compute_student_period_totals(
         self,
@@ -211,20 +313,50 @@ class AttendanceService:
         period_end: datetime,
         now: datetime,
     ) -> tuple[int, int]:
-        sessions = self.att_repo.list_sessions_overlapping_period(student_id, period_start, period_end)
-        raw_total = 0
-        business_total = 0
-        for session in sessions:
-            session_start = from_unix_seconds(session.entered_at)
-            session_end = from_unix_seconds(session.left_at) if session.left_at is not None else ensure_jst(now)
-            overlap_start = max(session_start, ensure_jst(period_start))
-            overlap_end = min(session_end, ensure_jst(period_end), ensure_jst(now))
-            if overlap_end <= overlap_start:
-                continue
-            raw_total += self._compute_net_minutes_for_period(session, period_start, period_end, now)
-            business_total += self.compute_9_to_17_minutes(overlap_start, overlap_end, session.id)
+        # 締め済みセッションは日次集計から、在室中のセッションだけをその場で計算する
+        rollups = self.att_repo.sum_daily_rollups(period_start, min(ensure_jst(period_end), ensure_jst(now)), student_id=student_id)
+        raw_total, business_total = rollups.get(student_id, (0, 0))
+        open_session = self.att_repo.get_open_session(student_id)
+        if open_session is not None:
+            raw, business = session_period_minutes(
+                open_session.entered_at,
+                open_session.left_at,
+                self._list_break_spans(open_session.id),
+                period_start,
+                period_end,
+                now,
+            )
+            raw_total += raw
+            business_total += business
         return raw_total, business_total
 
+    def _compute_period_totals_by_student(
+        self,
+        period_start: datetime,
+        period_end: datetime,
+        now: datetime,
+    ) -> dict[int, tuple[int, int]]:
+        totals = self.att_repo.sum_daily_rollups(period_start, min(ensure_jst(period_end), ensure_jst(now)))
+
+        breaks_by_session: dict[int, list[BreakSpan]] = defaultdict(list)
+        for session_id, started_at, ended_at in self.att_repo.list_breaks_for_sessions_overlapping_period(
+            period_start, period_end, open_sessions=True
+        ):
+            breaks_by_session[session_id].append((started_at, ended_at))
+
+        for session in self.att_repo.list_all_sessions_overlapping_period(period_start, period_end, open_sessions=True):
+            raw, business = session_period_minutes(
+                session.entered_at,
+                session.left_at,
+                breaks_by_session.get(session.id, []),
+                period_start,
+                period_end,
+                now,
+            )
+            raw_total, business_total = totals.get(session.student_id, (0, 0))
+            totals[session.student_id] = (raw_total + raw, business_total + business)
+        return totals
+
     def current_term_bounds(self, now: datetime | None = None) -> tuple[datetime, datetime]:
         base = ensure_jst(now or now_jst())
         y = base.year
@@ -248,8 +380,8 @@ class AttendanceService:
         self,
         card_id: str,
         now: datetime | None = None,
-    ) -> tuple[Student, int, datetime, datetime]:
-        student = self.student_repo.get_by_card_id(card_id)
+    ) -> tuple[CardIndexEntry, int, datetime, datetime]:
+        student = card_index.lookup(self.db, card_id)
         if student is None:
             raise UnknownCardError("未登録のカードです")
 
@@ -268,8 +400,7 @@ class AttendanceService:
         try:
             student, total_minutes, start, end = self.get_current_term_total_minutes_by_card(card_id=card_id, now=detected_at)
         except UnknownCardError:
-            self.unknown_repo.create(card_id=card_id, reader_name=reader_name, detected_at=detected_at)
-            attendance_event_broker.publish()
+            self._record_unknown_card(card_id, reader_name, detected_at)
             raise
         period = f"{start.strftime('%Y-%m-%d')} 〜 {end.strftime('%Y-%m-%d')}"
         display = touch_panel_state.store_term_total_display(
@@ -279,40 +410,20 @@ class AttendanceService:
             period_label=period,
             detected_at=detected_at,
         )
-        attendance_event_broker.publish()
-        return TermTotalLookupResponse(
+        response = TermTotalLookupResponse(
             student_code=display.student_code,
             student_name=display.student_name,
             total_minutes=display.total_minutes,
             period_label=display.period_label,
             detected_at=display.detected_at,
         )
+        attendance_event_broker.publish_alert("latest_term_total", response.model_dump(mode="json"))
+        return response
 
     def compute_9_to_17_minutes(self, entered_at: datetime, left_at: datetime, session_id: int) -> int:
-        entered = ensure_jst(entered_at)
-        left = ensure_jst(left_at)
-        if left <= entered:
+        if ensure_jst(left_at) <= ensure_jst(entered_at):
             return 0
-
-        business_start = entered.replace(hour=9, minute=0, second=0, microsecond=0)
-        business_end = entered.replace(hour=17, minute=0, second=0, microsecond=0)
-        start = max(entered, business_start)
-        end = min(left, business_end)
-        if end <= start:
-            return 0
-
-        business_minutes = minutes_between(start, end)
-
-        break_minutes_in_business = 0
-        for bp in self.att_repo.list_breaks(session_id):
-            bp_start = from_unix_seconds(bp.started_at)
-            bp_end = from_unix_seconds(bp.ended_at) if bp.ended_at is not None else left
-            overlap_start = max(bp_start, start)
-            overlap_end = min(bp_end, end)
-            if overlap_end > overlap_start:
-                break_minutes_in_business += minutes_between(overlap_start, overlap_end)
-
-        return max(0, business_minutes - break_minutes_in_business)
+        return business_minutes(entered_at, left_at, self._list_break_spans(session_id))
 
     def list_student_current_times(self, target: str = "all", now: datetime | None = None) -> list[StudentCurrentTimeEntry]:
         if target not in self.CURRENT_TIME_TARGETS:
@@ -330,18 +441,20 @@ class AttendanceService:
             student.id: (session, status)
             for student, session, status in self.att_repo.list_students_with_open_sessions()
         }
+        totals = self._compute_period_totals_by_student(start, end, current)
+        statuses = self.att_repo.list_statuses()
 
         entries: list[StudentCurrentTimeEntry] = []
         for student in students:
             session_row = open_session_rows.get(student.id)
-            cumulative, business_cumulative = self._compute_student_period_totals(student.id, start, end, current)
+            cumulative, business_cumulative = totals.get(student.id, (0, 0))
             if session_row is not None:
                 session, status = session_row
                 entered_at_dt = from_unix_seconds(session.entered_at)
                 current_status = status.current_status
             else:
                 entered_at_dt = None
-                current_status = self._get_current_status(student.id).value
+                current_status = statuses.get(student.id, AttendanceStatus.OUTSIDE.value)
 
             if target == "active" and not student.is_active:
                 continue
@@ -366,47 +479,29 @@ class AttendanceService:
     def get_today_attendance(self) -> TodayAttendanceResponse:
         now = now_jst()
         self._close_stale_open_sessions(now)
-        rows = self.att_repo.list_in_room_students()
-        in_room: list[InRoomEntry] = []
-        for student, session, status in rows:
-            entered_at_dt = from_unix_seconds(session.entered_at)
-            cumulative = self._compute_net_minutes(entered_at_dt, now, session.id)
-            business_cumulative = self.compute_9_to_17_minutes(entered_at_dt, now, session.id)
-            in_room.append(
-                InRoomEntry(
-                    student_id=student.id,
-                    student_code=student.student_code,
-                    name=student.name,
-                    entered_at=entered_at_dt,
-                    current_status=status.current_status,
-                    cumulative_minutes=cumulative,
-                    business_cumulative_minutes=business_cumulative,
-                )
+        today = now.date()
+        snapshot = today_snapshot_cache.get(self.db, today, lambda: self._build_today_snapshot(today))
+
+        in_room = [
+            InRoomEntry(
+                student_id=row.student_id,
+                student_code=row.student_code,
+                name=row.name,
+                entered_at=row.entered_at,
+                current_status=row.current_status,
+                cumulative_minutes=net_minutes_in_window(row.entered_at, now, row.breaks),
+                business_cumulative_minutes=business_minutes(row.entered_at, now, row.breaks),
             )
-
-        events = [
-            AttendanceEventResponse(
-                id=e.id,
-                student_id=e.student_id,
-                student_code=student.student_code,
-                student_name=student.name,
-                event_type=e.event_type,
-                occurred_at=from_unix_seconds(e.occurred_at),
-                source=e.source,
-            )
-            for e, student in self.att_repo.list_today_events(now.date())
+            for row in snapshot.in_room
         ]
-
-        unknown_card_alert = self.get_latest_unknown_card_alert(now=now)
-        lock_alert = self.get_latest_lock_alert(now=now)
         touch_error = touch_panel_state.get_latest_error(now)
         latest_term_total = touch_panel_state.get_latest_term_total_display(now)
 
         return TodayAttendanceResponse(
             in_room=in_room,
-            events=events,
-            unknown_card_alert=unknown_card_alert,
-            lock_alert=lock_alert,
+            events=list(snapshot.events),
+            unknown_card_alert=self._render_unknown_card_alert(snapshot.unknown_card, now),
+            lock_alert=self._render_lock_alert(snapshot.lock_alert, now),
             touch_error=(
                 TouchPanelErrorResponse(
                     message=touch_error.message,
@@ -428,36 +523,63 @@ class AttendanceService:
             ),
         )
 
+    def _build_today_snapshot(self, today: date) -> TodaySnapshot:
+        rows = self.att_repo.list_in_room_students()
+        breaks_by_session = self.att_repo.list_break_spans_for_sessions([session.id for _, session, _ in rows])
+        in_room = tuple(
+            InRoomSnapshotRow(
+                student_id=student.id,
+                student_code=student.student_code,
+                name=student.name,
+                entered_at=from_unix_seconds(session.entered_at),
+                current_status=status.current_status,
+                breaks=tuple(breaks_by_session.get(session.id, ())),
+            )
+            for student, session, status in rows
+        )
+        events = tuple(
+            AttendanceEventResponse(
+                id=e.id,
+                student_id=e.student_id,
+                student_code=student.student_code,
+                student_name=student.name,
+                event_type=e.event_type,
+                occurred_at=from_unix_seconds(e.occurred_at),
+                source=e.source,
+            )
+            for e, student in self.att_repo.list_today_events(today)
+        )
+        return TodaySnapshot(
+            day=today,
+            in_room=in_room,
+            events=events,
+            unknown_card=self._latest_unknown_card_snapshot(),
+            lock_alert=self._latest_lock_alert_snapshot(),
+        )
+
     def get_latest_unknown_card_alert(self, now: datetime | None = None) -> UnknownCardAlertResponse | None:
-        current = ensure_jst(now or now_jst())
+        return self._render_unknown_card_alert(self._latest_unknown_card_snapshot(), ensure_jst(now or now_jst()))
+
+    def get_latest_lock_alert(self, now: datetime | None = None) -> LockAlertResponse | None:
+        return self._render_lock_alert(self._latest_lock_alert_snapshot(), ensure_jst(now or now_jst()))
+
+    def _latest_unknown_card_snapshot(self) -> AlertSnapshot | None:
         latest_unknown = self.unknown_repo.get_latest()
         if latest_unknown is None:
             return None
-
-        detected_at = from_unix_seconds(latest_unknown.detected_at)
-        age_seconds = (current - detected_at).total_seconds()
-        if not 0 <= age_seconds <= self.UNKNOWN_CARD_ALERT_WINDOW_SECONDS:
-            return None
-
-        return UnknownCardAlertResponse(
+        return AlertSnapshot(
+            detected_at=from_unix_seconds(latest_unknown.detected_at),
             card_id=latest_unknown.card_id,
             reader_name=latest_unknown.reader_name,
-            detected_at=detected_at,
         )
 
-    def get_latest_lock_alert(self, now: datetime | None = None) -> LockAlertResponse | None:
-        current = ensure_jst(now or now_jst())
+    def _latest_lock_alert_snapshot(self) -> AlertSnapshot | None:
         if self.att_repo.count_in_room() != 0:
             return None
         latest_audit = self.audit_repo.get_latest_by_action("LOCK_ALERT")
         if latest_audit is None:
             return None
 
-        detected_at = from_unix_seconds(latest_audit.created_at)
-        age_seconds = (current - detected_at).total_seconds()
-        if not 0 <= age_seconds <= self.LOCK_ALERT_WINDOW_SECONDS:
-            return None
-
         message = "在室者が0人になりました。施錠してください。"
         if latest_audit.detail_json:
             try:
@@ -466,5 +588,19 @@ class AttendanceService:
                 payload = None
             if isinstance(payload, dict) and isinstance(payload.get("message"), str):
                 message = payload["message"]
+        return AlertSnapshot(detected_at=from_unix_seconds(latest_audit.created_at), message=message)
+
+    def _render_unknown_card_alert(self, alert: AlertSnapshot | None, now: datetime) -> UnknownCardAlertResponse | None:
+        if alert is None or not self._within_window(alert, now, self.UNKNOWN_CARD_ALERT_WINDOW_SECONDS):
+            return None
+        return UnknownCardAlertResponse(card_id=alert.card_id, reader_name=alert.reader_name, detected_at=alert.detected_at)
+
+    def _render_lock_alert(self, alert: AlertSnapshot | None, now: datetime) -> LockAlertResponse | None:
+        if alert is None or not self._within_window(alert, now, self.LOCK_ALERT_WINDOW_SECONDS):
+            return None
+        return LockAlertResponse(message=alert.message, detected_at=alert.detected_at)
 
-        return LockAlertResponse(message=message, detected_at=detected_at)
+    @staticmethod
+    def _within_window(alert: AlertSnapshot, now: datetime, window_seconds: int) -> bool:
+        age_seconds = (now - alert.detected_at).total_seconds()
+        return 0 <= age_seconds <= window_seconds
@@ -17,6 +17,7 @@ class AuditService:
         actor_name: str | None = None,
         target_id: int | None = None,
         detail: dict | None = None,
+        commit: bool = True,
     ) -> AuditLog:
         return self.repo.create(
             actor_type=actor_type,
@@ -25,4 +26,5 @@ class AuditService:
             target_type=target_type,
             target_id=target_id,
             detail_json=json.dumps(detail, ensure_ascii=False) if detail else None,
+            commit=commit,
         )
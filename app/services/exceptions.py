@@ -32,3 +32,15 @@ class TouchTokenExpiredError(ServiceError):
 
 class InvalidActionError(ServiceError):
     pass
+
+
+class PreferredActionNotAllowedError(InvalidActionError):
+    pass
+
+
+class ServerBusyError(ServiceError):
+    pass
+
+
+class IdempotencyConflictError(ServiceError):
+    pass
@@ -1,6 +1,7 @@
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.card_index import CardIndexEntry, card_index
 from app.models.student import Student
 from app.repositories.student_repository import StudentRepository
 from app.schemas.student import StudentCreate, StudentUpdate
@@ -9,6 +10,7 @@ from app.services.exceptions import (
     DuplicateStudentCodeError,
     StudentNotFoundError,
 )
+from app.today_snapshot import today_snapshot_cache
 
 
 class StudentService:
@@ -17,7 +19,7 @@ class StudentService:
 
     def register_student(self, payload: StudentCreate) -> Student:
         try:
-            return self.repo.create(
+            student = self.repo.create(
                 student_code=payload.student_code,
                 name=payload.name,
                 card_id=payload.card_id,
@@ -31,13 +33,16 @@ class StudentService:
             if "card_id" in msg:
                 raise DuplicateCardIdError("カードIDが重複しています") from e
             raise
+        card_index.store(self.repo.db, student)
+        return student
 
     def update_student(self, student_id: int, payload: StudentUpdate) -> Student:
         student = self.repo.get_by_id(student_id)
         if student is None:
             raise StudentNotFoundError(f"学生が見つかりません: {student_id}")
+        previous_card_id = student.card_id
         try:
-            return self.repo.update(student, **payload.model_dump(exclude_unset=True))
+            student = self.repo.update(student, **payload.model_dump(exclude_unset=True))
         except IntegrityError as e:
             msg = str(e.orig).lower() if getattr(e, "orig", None) else str(e).lower()
             if "student_code" in msg:
@@ -45,12 +50,15 @@ class StudentService:
             if "card_id" in msg:
                 raise DuplicateCardIdError("カードIDが重複しています") from e
             raise
+        card_index.store(self.repo.db, student, previous_card_id=previous_card_id)
+        today_snapshot_cache.invalidate()
+        return student
 
     def list_students(self, include_inactive: bool = False) -> list[Student]:
         return self.repo.list_all(include_inactive=include_inactive)
 
-    def get_by_card_id(self, card_id: str) -> Student | None:
-        return self.repo.get_by_card_id(card_id)
+    def get_by_card_id(self, card_id: str) -> CardIndexEntry | None:
+        return card_index.lookup(self.repo.db, card_id)
 
     def get_student(self, student_id: int) -> Student:
         student = self.repo.get_by_id(student_id)
@@ -62,4 +70,7 @@ class StudentService:
         student = self.repo.get_by_id(student_id)
         if student is None:
             raise StudentNotFoundError(f"学生が見つかりません: {student_id}")
-        return self.repo.deactivate(student)
+        student = self.repo.deactivate(student)
+        card_index.store(self.repo.db, student)
+        today_snapshot_cache.invalidate()
+        return student
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+import json
+from threading import Lock
+from typing import Any
+
+from sqlalchemy import Integer, Text, cast, delete, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from app.config import get_settings
+from app.db import engine as default_engine
+from app.models.shared_state import SharedStateEntry
+
+STATE_BACKEND_MEMORY = "memory"
+STATE_BACKEND_SQLITE = "sqlite"
+
+
+class StateBackend(ABC):
+    """キオスク状態などを保持するキー・値ストア。shared=True なら他のワーカーと共有される。"""
+
+    shared = False
+
+    @abstractmethod
+    def get(self, key: str) -> Any | None: ...
+
+    @abstractmethod
+    def put(self, key: str, value: Any) -> None: ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None: ...
+
+    def get_version(self, key: str) -> int:
+        value = self.get(key)
+        return int(value) if value is not None else 0
+
+    @abstractmethod
+    def bump_version(self, key: str) -> int: ...
+
+
+class MemoryStateBackend(StateBackend):
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._values: dict[str, Any] = {}
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            return self._values.get(key)
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._values[key] = value
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+    def bump_version(self, key: str) -> int:
+        with self._lock:
+            version = int(self._values.get(key) or 0) + 1
+            self._values[key] = version
+            return version
+
+
+class SqlStateBackend(StateBackend):
+    shared = True
+
+    def __init__(self, engine: Engine) -> None:
+        self.engine = engine
+        self._table = SharedStateEntry.__table__
+
+    def get(self, key: str) -> Any | None:
+        with self.engine.connect() as conn:
+            raw = conn.execute(select(self._table.c.value).where(self._table.c.key == key)).scalar_one_or_none()
+        return json.loads(raw) if raw is not None else None
+
+    def put(self, key: str, value: Any) -> None:
+        raw = json.dumps(value, ensure_ascii=False)
+        with self.engine.begin() as conn:
+            updated = conn.execute(update(self._table).where(self._table.c.key == key).values(value=raw))
+            if updated.rowcount == 0:
+                conn.execute(self._table.insert().values(key=key, value=raw))
+
+    def delete(self, key: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(delete(self._table).where(self._table.c.key == key))
+
+    def bump_version(self, key: str) -> int:
+        for _ in range(2):
+            try:
+                with self.engine.begin() as conn:
+                    # 先にUPDATEして書き込みロックを取るので、読み直した値は自分の更新結果になる
+                    updated = conn.execute(
+                        update(self._table)
+                        .where(self._table.c.key == key)
+                        .values(value=cast(cast(self._table.c.value, Integer) + 1, Text))
+                    )
+                    if updated.rowcount == 0:
+                        conn.execute(self._table.insert().values(key=key, value="1"))
+                        return 1
+                    return int(conn.execute(select(self._table.c.value).where(self._table.c.key == key)).scalar_one())
+            except IntegrityError:
+                # 別ワーカーが同時に初期行を入れた場合はUPDATEからやり直す
+                continue
+        raise RuntimeError(f"状態のバージョンを更新できませんでした: {key}")
+
+
+def build_state_backend(backend_name: str | None = None, engine: Engine | None = None) -> StateBackend:
+    name = backend_name or get_settings().state_backend
+    if name == STATE_BACKEND_MEMORY:
+        return MemoryStateBackend()
+    if name == STATE_BACKEND_SQLITE:
+        return SqlStateBackend(engine or default_engine)
+    raise ValueError(f"未対応の STATE_BACKEND です: {name}")
+
+
+state_backend = build_state_backend()
@@ -13,6 +13,8 @@ let attendancePollTimerId = null;
 let attendanceRefreshInFlight = false;
 let attendanceEventSource = null;
 let attendanceSseFallbackActive = false;
+let attendanceInRoom = new Map();
+let attendanceEvents = [];
 let studentCardCaptureEventSource = null;
 let studentCardCapturePollTimerId = null;
 let studentCardCaptureRefreshInFlight = false;
@@ -135,6 +137,73 @@ function updateInRoom(inRoom) {
   }).join("");
 }
 
+function compareKeys(left, right) {
+  if (left < right) {
+    return -1;
+  }
+  return left > right ? 1 : 0;
+}
+
+function renderInRoomState() {
+  const entries = Array.from(attendanceInRoom.values()).sort((a, b) => {
+    return compareKeys(a.name, b.name) || compareKeys(a.student_code, b.student_code) || a.student_id - b.student_id;
+  });
+  updateInRoom(entries);
+}
+
+function todayInJst() {
+  return new Intl.DateTimeFormat("en-CA", {
+    timeZone: "Asia/Tokyo",
+    year: "numeric",
+    month: "2-digit",
+    day: "2-digit",
+  }).format(new Date());
+}
+
+function applyStatusChanged(change) {
+  if (change.current_status === "IN_ROOM") {
+    attendanceInRoom.set(change.student_id, change);
+  } else {
+    attendanceInRoom.delete(change.student_id);
+  }
+  renderInRoomState();
+}
+
+function applyEventAppended(event) {
+  if (!String(event.occurred_at).startsWith(todayInJst())) {
+    return;
+  }
+  if (attendanceEvents.some((item) => item.id === event.id)) {
+    return;
+  }
+  attendanceEvents = [event, ...attendanceEvents]
+    .sort((a, b) => compareKeys(b.occurred_at, a.occurred_at) || b.id - a.id)
+    .slice(0, 20);
+  updateRecentEvents(attendanceEvents);
+}
+
+function applyAlertRaised(payload) {
+  const updaters = {
+    unknown_card_alert: updateUnknownCardAlert,
+    lock_alert: updateLockAlert,
+    touch_error: updateTouchErrorAlert,
+    latest_term_total: updateTermTotalAlert,
+  };
+  const updater = updaters[payload.kind];
+  if (updater) {
+    updater(payload.alert);
+  }
+}
+
+function parseEventData(message) {
+  try {
+    return JSON.parse(message.data);
+  } catch (error) {
+    console.warn("Failed to parse attendance event", error);
+    return null;
+  }
+}
+
 function updateRecentEvents(events) {
   const list = document.getElementById("recent-events-list");
   if (!list) {
@@ -410,8 +479,10 @@ async function refreshTodayAttendance() {
     }
 
     const payload = await response.json();
+    attendanceInRoom = new Map((payload.in_room || []).map((entry) => [entry.student_id, entry]));
+    attendanceEvents = (payload.events || []).slice(0, 20);
     updateInRoom(payload.in_room || []);
-    updateRecentEvents(payload.events || []);
+    updateRecentEvents(attendanceEvents);
     updateUnknownCardAlert(payload.unknown_card_alert || null);
     updateLockAlert(payload.lock_alert || null);
     updateTouchErrorAlert(payload.touch_error || null);
@@ -446,6 +517,21 @@ function initTopDashboard() {
       attendanceSseFallbackActive = false;
       refreshTodayAttendance();
     };
+    const deltaHandlers = {
+      event_appended: applyEventAppended,
+      status_changed: applyStatusChanged,
+      alert_raised: applyAlertRaised,
+      touch_panel_changed: (payload) => updateTouchPanelAction(payload.selected_action),
+    };
+    Object.entries(deltaHandlers).forEach(([eventName, handler]) => {
+      attendanceEventSource.addEventListener(eventName, function (message) {
+        attendanceSseFallbackActive = false;
+        const payload = parseEventData(message);
+        if (payload) {
+          handler(payload);
+        }
+      });
+    });
     attendanceEventSource.onerror = function () {
       console.warn("Attendance SSE connection failed");
       if (!attendanceSseFallbackActive) {
@@ -536,6 +622,9 @@ function initStudentCardCapture() {
     studentCardCaptureEventSource.onmessage = function () {
       refreshStudentCardCapture();
     };
+    studentCardCaptureEventSource.addEventListener("card_captured", function () {
+      refreshStudentCardCapture();
+    });
     studentCardCaptureEventSource.onerror = function () {
       console.warn("Student card capture SSE connection failed");
     };
@@ -614,6 +703,9 @@ function initLoginCardCapture() {
     source.onmessage = function () {
       refreshLoginCardCapture();
     };
+    source.addEventListener("card_captured", function () {
+      refreshLoginCardCapture();
+    });
     source.onerror = function () {
       console.warn("Login card capture SSE connection failed");
     };
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from datetime import date, datetime, timedelta
+import logging
+from threading import Lock
+from weakref import WeakKeyDictionary
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.domain.time_utils import ensure_jst, now_jst
+from app.idempotency import prune_idempotency_records
+from app.metrics import stale_sessions_closed
+from app.repositories.attendance_repository import AttendanceRepository
+from app.today_snapshot import today_snapshot_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+class StaleSessionSweeper:
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._swept_days: WeakKeyDictionary[Engine, date] = WeakKeyDictionary()
+
+    def _is_swept(self, bind: Engine, day: date) -> bool:
+        swept_day = self._swept_days.get(bind)
+        return swept_day is not None and swept_day >= day
+
+    def sweep_if_needed(self, db: Session, now: datetime) -> int:
+        current = ensure_jst(now)
+        bind = db.get_bind()
+        if self._is_swept(bind, current.date()):
+            return 0
+        with self._lock:
+            if self._is_swept(bind, current.date()):
+                return 0
+            closed = self.sweep(db, current)
+            self._swept_days[bind] = current.date()
+        return closed
+
+    def rewind(self, db: Session, occurred_at: datetime) -> None:
+        """スイープ済みの日より前の打刻（ジャーナルからの再送など）が後から届いたら、スイープ済みの印をその日まで戻す。
+
+        その打刻で開いたセッションは、次に今日の時刻で打刻や画面表示があったときのスイープで締められる。
+        同じ日の再送が続く間は締めないので、入室に続く退室の再送もそのまま受け付けられる。
+        """
+        occurred_day = ensure_jst(occurred_at).date()
+        bind = db.get_bind()
+        with self._lock:
+            swept_day = self._swept_days.get(bind)
+            if swept_day is not None and occurred_day < swept_day:
+                self._swept_days[bind] = occurred_day
+
+    def sweep(self, db: Session, now: datetime) -> int:
+        today_start = ensure_jst(now).replace(hour=0, minute=0, second=0, microsecond=0)
+        closed = AttendanceRepository(db).close_open_sessions_started_before(today_start)
+        if closed:
+            stale_sessions_closed.inc(amount=closed)
+            today_snapshot_cache.invalidate()
+        return closed
+
+    def reset(self) -> None:
+        with self._lock:
+            self._swept_days.clear()
+
+
+def sweep_stale_sessions(session_factory: Callable[[], Session]) -> int:
+    db = session_factory()
+    try:
+        return stale_session_sweeper.sweep_if_needed(db, now_jst())
+    finally:
+        db.close()
+
+
+async def run_midnight_sweeps(session_factory: Callable[[], Session]) -> None:
+    while True:
+        now = now_jst()
+        next_midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        await asyncio.sleep((next_midnight - now).total_seconds())
+        try:
+            closed = await asyncio.to_thread(sweep_stale_sessions, session_factory)
+        except Exception:
+            logger.exception("stale session sweep failed")
+        else:
+            logger.info("stale session sweep closed=%s", closed)
+        # 冪等キーの記録の掃除も、打刻の処理中ではなくここで1日1回まとめて行う
+        try:
+            pruned = await asyncio.to_thread(prune_idempotency_records, session_factory)
+        except Exception:
+            logger.exception("idempotency record prune failed")
+        else:
+            logger.info("idempotency record prune removed=%s", pruned)
+
+
+stale_session_sweeper = StaleSessionSweeper()
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import date, datetime
+from threading import Lock
+from weakref import WeakKeyDictionary
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.domain.attendance_minutes import BreakSpan
+from app.schemas.attendance import AttendanceEventResponse
+from app.state_backends import MemoryStateBackend, StateBackend, state_backend
+
+
+@dataclass(frozen=True, slots=True)
+class InRoomSnapshotRow:
+    student_id: int
+    student_code: str
+    name: str
+    entered_at: datetime
+    current_status: str
+    breaks: tuple[BreakSpan, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class AlertSnapshot:
+    detected_at: datetime
+    message: str | None = None
+    card_id: str | None = None
+    reader_name: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class TodaySnapshot:
+    """当日画面の元データ。経過分数や警告の表示期限は表示時刻から都度計算する。"""
+
+    day: date
+    in_room: tuple[InRoomSnapshotRow, ...]
+    events: tuple[AttendanceEventResponse, ...]
+    unknown_card: AlertSnapshot | None
+    lock_alert: AlertSnapshot | None
+
+
+@dataclass(frozen=True, slots=True)
+class _CachedSnapshot:
+    version: int
+    snapshot: TodaySnapshot
+
+
+class TodaySnapshotCache:
+    VERSION_KEY = "attendance.write_version"
+
+    def __init__(self, backend: StateBackend | None = None) -> None:
+        self._backend = backend or MemoryStateBackend()
+        self._lock = Lock()
+        self._build_lock = Lock()
+        self._cached: WeakKeyDictionary[Engine, _CachedSnapshot] = WeakKeyDictionary()
+
+    def get(self, db: Session, day: date, build: Callable[[], TodaySnapshot]) -> TodaySnapshot:
+        bind = db.get_bind()
+        version = self._backend.get_version(self.VERSION_KEY)
+        cached = self._lookup(bind, version, day)
+        if cached is not None:
+            return cached
+        # 同じ版を待っている読み手は先行した1回の計算結果を共有する
+        with self._build_lock:
+            cached = self._lookup(bind, version, day)
+            if cached is not None:
+                return cached
+            snapshot = build()
+            with self._lock:
+                self._cached[bind] = _CachedSnapshot(version=version, snapshot=snapshot)
+            return snapshot
+
+    def invalidate(self) -> int:
+        return self._backend.bump_version(self.VERSION_KEY)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._cached.clear()
+
+    def _lookup(self, bind: Engine, version: int, day: date) -> TodaySnapshot | None:
+        with self._lock:
+            cached = self._cached.get(bind)
+        if cached is None or cached.version != version or cached.snapshot.day != day:
+            return None
+        return cached.snapshot
+
+
+today_snapshot_cache = TodaySnapshotCache(state_backend)
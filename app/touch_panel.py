@@ -1,12 +1,12 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta
 from enum import Enum
-from threading import Lock
 
 from app.domain.enums import AttendanceAction
 from app.domain.time_utils import ensure_jst, now_jst
+from app.state_backends import MemoryStateBackend, StateBackend, state_backend
 
 
 class TouchPanelSelection(str, Enum):
@@ -33,26 +33,26 @@ class TouchPanelErrorDisplay:
 
 
 class TouchPanelState:
-    def __init__(self) -> None:
-        self._lock = Lock()
-        self._selected_action = TouchPanelSelection.ENTER
-        self._latest_term_total: TermTotalDisplay | None = None
-        self._latest_error: TouchPanelErrorDisplay | None = None
+    SELECTED_ACTION_KEY = "touch_panel.selected_action"
+    TERM_TOTAL_KEY = "touch_panel.latest_term_total"
+    ERROR_KEY = "touch_panel.latest_error"
+
+    def __init__(self, backend: StateBackend | None = None) -> None:
+        self._backend = backend or MemoryStateBackend()
 
     def get_selected_action(self) -> TouchPanelSelection:
-        with self._lock:
-            return self._selected_action
+        selected = self._backend.get(self.SELECTED_ACTION_KEY)
+        return TouchPanelSelection(selected) if selected is not None else TouchPanelSelection.ENTER
 
     def set_selected_action(self, action: TouchPanelSelection) -> TouchPanelSelection:
-        with self._lock:
-            self._selected_action = action
-            return self._selected_action
+        self._backend.put(self.SELECTED_ACTION_KEY, action.value)
+        return action
 
     def get_selected_attendance_action(self) -> AttendanceAction | None:
-        with self._lock:
-            if self._selected_action == TouchPanelSelection.TERM_TOTAL:
-                return None
-            return AttendanceAction(self._selected_action.value)
+        selected = self.get_selected_action()
+        if selected == TouchPanelSelection.TERM_TOTAL:
+            return None
+        return AttendanceAction(selected.value)
 
     def store_term_total_display(
         self,
@@ -62,40 +62,44 @@ class TouchPanelState:
         period_label: str,
         detected_at: datetime,
     ) -> TermTotalDisplay:
-        with self._lock:
-            self._latest_term_total = TermTotalDisplay(
-                student_code=student_code,
-                student_name=student_name,
-                total_minutes=total_minutes,
-                period_label=period_label,
-                detected_at=ensure_jst(detected_at),
-            )
-            return self._latest_term_total
+        display = TermTotalDisplay(
+            student_code=student_code,
+            student_name=student_name,
+            total_minutes=total_minutes,
+            period_label=period_label,
+            detected_at=ensure_jst(detected_at),
+        )
+        self._backend.put(self.TERM_TOTAL_KEY, {**asdict(display), "detected_at": display.detected_at.isoformat()})
+        return display
 
     def store_error(self, message: str, detected_at: datetime) -> TouchPanelErrorDisplay:
-        with self._lock:
-            self._latest_error = TouchPanelErrorDisplay(message=message, detected_at=ensure_jst(detected_at))
-            return self._latest_error
+        display = TouchPanelErrorDisplay(message=message, detected_at=ensure_jst(detected_at))
+        self._backend.put(self.ERROR_KEY, {**asdict(display), "detected_at": display.detected_at.isoformat()})
+        return display
 
     def get_latest_error(self, now: datetime | None = None, ttl_seconds: int = 30) -> TouchPanelErrorDisplay | None:
-        with self._lock:
-            latest = self._latest_error
-        if latest is None:
+        payload = self._backend.get(self.ERROR_KEY)
+        if payload is None:
             return None
+        latest = TouchPanelErrorDisplay(**{**payload, "detected_at": _parse_detected_at(payload)})
         current = ensure_jst(now or now_jst())
         if current - latest.detected_at > timedelta(seconds=ttl_seconds):
             return None
         return latest
 
     def get_latest_term_total_display(self, now: datetime | None = None, ttl_seconds: int = 30) -> TermTotalDisplay | None:
-        with self._lock:
-            latest = self._latest_term_total
-        if latest is None:
+        payload = self._backend.get(self.TERM_TOTAL_KEY)
+        if payload is None:
             return None
+        latest = TermTotalDisplay(**{**payload, "detected_at": _parse_detected_at(payload)})
         current = ensure_jst(now or now_jst())
         if current - latest.detected_at > timedelta(seconds=ttl_seconds):
             return None
         return latest
 
 
-touch_panel_state = TouchPanelState()
+def _parse_detected_at(payload: dict) -> datetime:
+    return ensure_jst(datetime.fromisoformat(payload["detected_at"]))
+
+
+touch_panel_state = TouchPanelState(state_backend)
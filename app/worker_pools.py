@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import contextvars
+from dataclasses import dataclass
+from functools import partial
+from threading import Lock
+from typing import Any, TypeVar
+from weakref import WeakKeyDictionary
+
+from app.config import get_settings
+from app.services.exceptions import ServerBusyError
+
+T = TypeVar("T")
+
+_EXHAUSTED = object()
+
+BUSY_MESSAGE = "混雑しています。しばらくしてから再度お試しください"
+
+
+@dataclass
+class _Admission:
+    slots: asyncio.Semaphore
+    waiting: int = 0
+
+
+class AdmissionTicket:
+    """確保した実行枠。release は何度呼んでもよく、どのスレッドから呼んでもよい。"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop | None, slots: asyncio.Semaphore | None) -> None:
+        self._loop = loop
+        self._slots = slots
+        self._released = False
+        self._lock = Lock()
+
+    def release(self) -> None:
+        with self._lock:
+            if self._released or self._slots is None:
+                return
+            self._released = True
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._slots.release)
+
+
+class WorkerPool:
+    """用途ごとに専用スレッドを持つ実行レーン。既定のスレッドプールを他の処理と奪い合わない。
+
+    max_active を指定すると admit() / acquire() で同時実行数を制限し、待ちが max_queued 件を超えた要求や
+    queue_timeout_seconds 以内に順番が来なかった要求は ServerBusyError で断る。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        *,
+        max_active: int | None = None,
+        max_queued: int = 0,
+        queue_timeout_seconds: float = 10.0,
+    ) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = Lock()
+        # asyncio.Semaphore はイベントループごとに作る（ワーカープロセスごとに1つ）
+        self._admissions: WeakKeyDictionary[asyncio.AbstractEventLoop, _Admission] = WeakKeyDictionary()
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        # run_in_executor はコンテキスト変数を引き継がないので、要求ごとの計測値などを明示的に渡す
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, partial(context.run, func, *args))
+
+    async def iterate(self, iterator: Iterator[T], on_close: Callable[[], None] | None = None) -> AsyncIterator[T]:
+        # 同期ジェネレータを1要素ずつこのプールで進める。途中で切断されてもプール側で後始末させる
+        try:
+            while True:
+                item = await self.run(next, iterator, _EXHAUSTED)
+                if item is _EXHAUSTED:
+                    return
+                yield item
+        finally:
+            try:
+                close = getattr(iterator, "close", None)
+                if close is not None:
+                    await self.run(close)
+            finally:
+                if on_close is not None:
+                    on_close()
+
+    async def acquire(self) -> AdmissionTicket:
+        """実行枠を確保する。ストリーミング応答のように、枠を応答の送信完了まで持ち越す場合に使う。"""
+        if self.max_active is None:
+            return AdmissionTicket(None, None)
+        loop = asyncio.get_running_loop()
+        admission = self._admission(loop)
+        if admission.slots.locked() and admission.waiting >= self.max_queued:
+            raise ServerBusyError(BUSY_MESSAGE)
+        admission.waiting += 1
+        try:
+            await asyncio.wait_for(admission.slots.acquire(), timeout=self.queue_timeout_seconds)
+        except TimeoutError as exc:
+            raise ServerBusyError(BUSY_MESSAGE) from exc
+        finally:
+            admission.waiting -= 1
+        return AdmissionTicket(loop, admission.slots)
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        ticket = await self.acquire()
+        try:
+            yield
+        finally:
+            ticket.release()
+
+    def _admission(self, loop: asyncio.AbstractEventLoop) -> _Admission:
+        with self._lock:
+            admission = self._admissions.get(loop)
+            if admission is None:
+                admission = _Admission(slots=asyncio.Semaphore(self.max_active))
+                self._admissions[loop] = admission
+            return admission
+
+
+settings = get_settings()
+
+# リーダーからの打刻はこのレーンだけで処理し、一覧表示や CSV 出力の混雑に巻き込まれないようにする
+reader_pool = WorkerPool("reader", settings.reader_pool_workers)
+read_pool = WorkerPool(
+    "db-read",
+    settings.read_pool_workers,
+    max_active=settings.heavy_request_slots,
+    max_queued=settings.heavy_request_queue,
+    queue_timeout_seconds=settings.heavy_request_queue_timeout_seconds,
+)
@@ -0,0 +1,56 @@
+"""ベンチマーク結果の集計と、保存済みベースラインとの比較。"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+
+
+def percentile(sorted_values: list[float], ratio: float) -> float:
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * ratio))
+    return sorted_values[index]
+
+
+def summarize_latencies(latencies: list[float]) -> dict[str, float | int | None]:
+    """秒単位の所要時間をミリ秒の p50/p95/p99/最大にまとめる。"""
+    values = sorted(latencies)
+    if not values:
+        return {"count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2),
+    }
+
+
+def load_baseline(path: Path) -> dict:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_baseline(path: Path, result: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(result, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def compare_metric(
+    name: str,
+    current: float | None,
+    baseline: float | None,
+    max_regression: float,
+    higher_is_better: bool = False,
+) -> dict:
+    """ratio は悪化の倍率（1.0 より大きいほど悪い）。max_regression=0.25 なら 25% までの悪化を許す。"""
+    if not current or not baseline:
+        return {"name": name, "current": current, "baseline": baseline, "ratio": None, "regressed": False}
+    ratio = baseline / current if higher_is_better else current / baseline
+    return {
+        "name": name,
+        "current": current,
+        "baseline": baseline,
+        "ratio": round(ratio, 3),
+        "regressed": ratio > 1 + max_regression,
+    }
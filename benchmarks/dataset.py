@@ -0,0 +1,205 @@
+"""何年分もの打刻履歴を持つ検証用 DB を作る。
+
+attendance_sessions・break_periods・attendance_events をまとめて INSERT し、最後に日次集計を作り直す。
+セッションは平日に1人1日1件で、今日から過去へさかのぼって埋める。open_ratio の割合の学生は今日入室中にする。
+
+    uv run python -m benchmarks.dataset --database-url sqlite:///./var/bench.db --students 2000 --sessions 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import random
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.db import Base
+from app.domain.enums import AttendanceAction, AttendanceStatus
+from app.domain.time_utils import now_jst, to_unix_seconds
+from app.models.attendance_event import AttendanceEvent
+from app.models.attendance_session import AttendanceSession
+from app.models.attendance_status import AttendanceStatusModel
+from app.models.break_period import BreakPeriod
+from app.models.student import Student
+from app.repositories.attendance_repository import AttendanceRepository
+import app.models  # noqa: F401
+
+BATCH_SIZE = 5000
+
+
+@dataclass(frozen=True, slots=True)
+class DatasetSummary:
+    students: int
+    sessions: int
+    break_periods: int
+    events: int
+    open_sessions: int
+    first_day: datetime
+
+
+def _weekdays_back(today: datetime) -> Iterator[datetime]:
+    day = today.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    while True:
+        if day.weekday() < 5:
+            yield day
+        day -= timedelta(days=1)
+
+
+def _chunks(rows: list[dict]) -> Iterator[list[dict]]:
+    for index in range(0, len(rows), BATCH_SIZE):
+        yield rows[index : index + BATCH_SIZE]
+
+
+def seed_attendance_history(
+    db: Session,
+    students: int,
+    sessions: int,
+    now: datetime | None = None,
+    open_ratio: float = 0.1,
+    seed: int = 1,
+) -> DatasetSummary:
+    """空の DB に学生と打刻履歴を入れる。sessions には今日の入室中セッションも含む。"""
+    rng = random.Random(seed)
+    current = now or now_jst()
+    db.execute(
+        insert(Student),
+        [
+            {"student_code": f"D{index:06d}", "name": f"dataset{index}", "card_id": f"DATA{index:06d}", "is_active": True}
+            for index in range(students)
+        ],
+    )
+    student_ids = list(db.scalars(select(Student.id).order_by(Student.id)))
+
+    # 今日の入室中セッションは、今日の打刻を模して数分前までに入室したことにする
+    open_students = student_ids[: int(min(len(student_ids), sessions) * open_ratio)]
+    today_start = current.replace(hour=0, minute=0, second=0, microsecond=0)
+    session_rows: list[dict] = []
+    for student_id in open_students:
+        entered = max(today_start, current - timedelta(minutes=rng.randint(5, 240)))
+        session_rows.append(
+            {"student_id": student_id, "entered_at": to_unix_seconds(entered), "left_at": None, "total_minutes": None, "status": "OPEN"}
+        )
+
+    breaks_by_index: dict[int, list[tuple[int, int]]] = {}
+    closed_sessions = sessions - len(open_students)
+    days = _weekdays_back(current)
+    first_day = today_start
+    while closed_sessions > 0:
+        day = next(days)
+        first_day = day
+        for student_id in student_ids[:closed_sessions]:
+            entered = day + timedelta(hours=8, minutes=rng.randint(30, 150))
+            left = day + timedelta(hours=16, minutes=rng.randint(0, 180))
+            breaks: list[tuple[int, int]] = []
+            cursor = entered + timedelta(hours=2)
+            for _ in range(rng.choice((0, 0, 1, 1, 2))):
+                started = cursor + timedelta(minutes=rng.randint(0, 60))
+                ended = started + timedelta(minutes=rng.randint(10, 60))
+                if ended >= left:
+                    break
+                breaks.append((to_unix_seconds(started), to_unix_seconds(ended)))
+                cursor = ended + timedelta(minutes=30)
+            break_minutes = sum((ended - started) // 60 for started, ended in breaks)
+            breaks_by_index[len(session_rows)] = breaks
+            session_rows.append(
+                {
+                    "student_id": student_id,
+                    "entered_at": to_unix_seconds(entered),
+                    "left_at": to_unix_seconds(left),
+                    "total_minutes": max(0, int((left - entered).total_seconds()) // 60 - break_minutes),
+                    "status": "CLOSED",
+                }
+            )
+        closed_sessions -= min(closed_sessions, len(student_ids))
+
+    # 挿入順に id が振られるので、入室時刻順に並べておけば打刻ログの id も時刻順になる
+    order = sorted(range(len(session_rows)), key=lambda index: session_rows[index]["entered_at"])
+    session_ids: dict[int, int] = {}
+    for chunk_start in range(0, len(order), BATCH_SIZE):
+        chunk = order[chunk_start : chunk_start + BATCH_SIZE]
+        inserted = db.scalars(
+            insert(AttendanceSession).returning(AttendanceSession.id, sort_by_parameter_order=True),
+            [session_rows[index] for index in chunk],
+        )
+        session_ids.update(zip(chunk, inserted))
+
+    break_rows: list[dict] = []
+    event_rows: list[dict] = []
+    last_event_by_student: dict[int, int] = {}
+    for index in order:
+        row = session_rows[index]
+        student_id = row["student_id"]
+        events = [(row["entered_at"], AttendanceAction.ENTER)]
+        for started, ended in breaks_by_index.get(index, []):
+            break_rows.append({"session_id": session_ids[index], "started_at": started, "ended_at": ended})
+            events += [(started, AttendanceAction.LEAVE_TEMP), (ended, AttendanceAction.RETURN)]
+        if row["left_at"] is not None:
+            events.append((row["left_at"], AttendanceAction.LEAVE_FINAL))
+        for occurred_at, action in events:
+            event_rows.append(
+                {
+                    "student_id": student_id,
+                    "event_type": action.value,
+                    "occurred_at": occurred_at,
+                    "source": "reader",
+                    "reader_name": "dataset",
+                    "created_at": occurred_at,
+                }
+            )
+    event_rows.sort(key=lambda event: event["occurred_at"])
+    for chunk in _chunks(break_rows):
+        db.execute(insert(BreakPeriod), chunk)
+    event_ids: list[int] = []
+    for chunk in _chunks(event_rows):
+        event_ids += db.scalars(insert(AttendanceEvent).returning(AttendanceEvent.id, sort_by_parameter_order=True), chunk)
+    for event_id, event in zip(event_ids, event_rows):
+        last_event_by_student[event["student_id"]] = event_id
+
+    open_set = set(open_students)
+    status_rows = []
+    for student_id in student_ids:
+        status = AttendanceStatus.IN_ROOM if student_id in open_set else AttendanceStatus.OUTSIDE
+        status_rows.append(
+            {"student_id": student_id, "current_status": status.value, "last_event_id": last_event_by_student.get(student_id)}
+        )
+    for chunk in _chunks(status_rows):
+        db.execute(insert(AttendanceStatusModel), chunk)
+    db.commit()
+    AttendanceRepository(db).rebuild_daily_rollups_if_empty()
+    return DatasetSummary(
+        students=students,
+        sessions=len(session_rows),
+        break_periods=len(break_rows),
+        events=len(event_rows),
+        open_sessions=len(open_students),
+        first_day=first_day,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", required=True, help="空の DB を指定する（既存の学生とカードIDが重なると失敗する）")
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--open-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url, future=True)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
+    with SessionLocal() as db:
+        summary = seed_attendance_history(db, args.students, args.sessions, open_ratio=args.open_ratio, seed=args.seed)
+    engine.dispose()
+    print(
+        f"students={summary.students} sessions={summary.sessions} break_periods={summary.break_periods} "
+        f"events={summary.events} open_sessions={summary.open_sessions} first_day={summary.first_day.date()}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""複数の reader から打刻を送り続け、サーバーのスループットとエンドポイント別の遅延を測る。
+
+一時 SQLite DB を使うローカル uvicorn を起動し、ReaderApiClient を持つ reader スレッドを並行に動かす。
+学生は reader ごとに受け持ちを分け、入室 → (外出 → 戻り)×0〜2 → 退室 の順に打刻する。
+
+    uv run python -m benchmarks.reader_load --readers 4 --students 200 --taps-per-reader 250
+    uv run python -m benchmarks.reader_load --save-baseline
+    uv run python -m benchmarks.reader_load --compare
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass, field
+from datetime import datetime
+import json
+import os
+from pathlib import Path
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+from threading import Barrier, Thread
+import time
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import Base
+from app.domain.enums import AttendanceAction
+from app.repositories.student_repository import StudentRepository
+from benchmarks.baseline import BASELINE_DIR, compare_metric, load_baseline, save_baseline, summarize_latencies
+from reader.client import ReaderApiClient
+import app.models  # noqa: F401
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = BASELINE_DIR / "reader_load.json"
+READER_TOKEN = "bench-reader-token"
+
+TAP_ENDPOINT = "POST /api/reader/taps"
+TOUCH_ENDPOINT = "POST /api/reader/touches"
+CONFIRM_ENDPOINT = "POST /api/reader/touches/{touch_token}/confirm"
+
+
+def student_day(rng: random.Random) -> list[AttendanceAction]:
+    """1人分の1日の打刻列。外出と戻りは0〜2回。"""
+    breaks = rng.choice((0, 0, 1, 1, 2))
+    return [
+        AttendanceAction.ENTER,
+        *[action for _ in range(breaks) for action in (AttendanceAction.LEAVE_TEMP, AttendanceAction.RETURN)],
+        AttendanceAction.LEAVE_FINAL,
+    ]
+
+
+@dataclass
+class StudentScript:
+    card_id: str
+    rng: random.Random
+    actions: list[AttendanceAction] = field(default_factory=list)
+
+    def next_action(self) -> AttendanceAction:
+        if not self.actions:
+            self.actions = student_day(self.rng)
+        return self.actions[0]
+
+    def advance(self) -> None:
+        self.actions.pop(0)
+
+
+@dataclass
+class ReaderRecorder:
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    errors: dict[str, int] = field(default_factory=dict)
+
+    def timed(self, endpoint: str, func, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except httpx.HTTPError:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            raise
+        finally:
+            self.latencies.setdefault(endpoint, []).append(time.perf_counter() - started)
+
+
+def seed_database(database_path: Path, students: int) -> list[str]:
+    engine = create_engine(f"sqlite:///{database_path}", future=True)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
+    card_ids = [f"LOAD{index:05d}" for index in range(students)]
+    with SessionLocal() as db:
+        repo = StudentRepository(db)
+        for index, card_id in enumerate(card_ids):
+            repo.create(student_code=f"L{index:05d}", name=f"load{index}", card_id=card_id)
+    engine.dispose()
+    return card_ids
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database_path: Path, port: int, workers: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{database_path}",
+        "READER_TOKEN": READER_TOKEN,
+        "STATE_BACKEND": "sqlite" if workers > 1 else "memory",
+    }
+    command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)]
+    command += ["--workers", str(workers), "--log-level", "warning"]
+    return subprocess.Popen(command, cwd=PROJECT_ROOT, env=env)
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen, timeout_seconds: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+        try:
+            httpx.get(f"{base_url}/api/reader/kiosk-mode", headers={"X-Reader-Token": READER_TOKEN}, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError("uvicorn did not become ready")
+
+
+def run_reader(
+    base_url: str,
+    reader_name: str,
+    scripts: list[StudentScript],
+    taps: int,
+    api: str,
+    think_seconds: float,
+    start: Barrier,
+    recorder: ReaderRecorder,
+) -> None:
+    with ReaderApiClient(base_url=base_url, reader_token=READER_TOKEN) as client:
+        start.wait()
+        for tap in range(taps):
+            script = scripts[tap % len(scripts)]
+            action = script.next_action()
+            detected_at = datetime.now().astimezone()
+            try:
+                if api == "tap":
+                    recorder.timed(TAP_ENDPOINT, client.tap, script.card_id, reader_name, detected_at, action=action.value)
+                else:
+                    touch = recorder.timed(TOUCH_ENDPOINT, client.prepare_touch, script.card_id, reader_name, detected_at)
+                    recorder.timed(CONFIRM_ENDPOINT, client.confirm_touch, touch["touch_token"], action.value, detected_at)
+            except httpx.HTTPError:
+                # 届いたか分からない打刻の後は状態がずれうるので、次の日の打刻列から始め直す
+                script.actions = []
+                continue
+            script.advance()
+            if think_seconds:
+                time.sleep(think_seconds)
+
+
+def run(
+    readers: int,
+    students: int,
+    taps_per_reader: int,
+    api: str,
+    server_workers: int,
+    think_seconds: float,
+    seed: int,
+) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_path = Path(tmp_dir) / "load.db"
+        card_ids = seed_database(database_path, students)
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(database_path, port, server_workers)
+        try:
+            wait_until_ready(base_url, server)
+            rng = random.Random(seed)
+            # 学生は1台の reader だけに割り当て、同じ学生の打刻が並行しないようにする
+            assignments: list[list[StudentScript]] = [[] for _ in range(readers)]
+            for index, card_id in enumerate(card_ids):
+                assignments[index % readers].append(StudentScript(card_id, random.Random(rng.random())))
+            recorders = [ReaderRecorder() for _ in range(readers)]
+            start = Barrier(readers + 1)
+            threads = [
+                Thread(
+                    target=run_reader,
+                    args=(base_url, f"load-reader-{index}", assignments[index], taps_per_reader, api, think_seconds, start, recorders[index]),
+                    daemon=True,
+                )
+                for index in range(readers)
+            ]
+            for thread in threads:
+                thread.start()
+            start.wait()
+            started = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+    endpoints: dict[str, dict] = {}
+    for name in sorted({name for recorder in recorders for name in recorder.latencies}):
+        latencies = [value for recorder in recorders for value in recorder.latencies.get(name, [])]
+        summary = summarize_latencies(latencies)
+        summary["errors"] = sum(recorder.errors.get(name, 0) for recorder in recorders)
+        summary["requests_per_second"] = round(len(latencies) / elapsed, 1)
+        endpoints[name] = summary
+    taps = readers * taps_per_reader
+    return {
+        "config": {
+            "readers": readers,
+            "students": students,
+            "taps_per_reader": taps_per_reader,
+            "api": api,
+            "server_workers": server_workers,
+            "think_seconds": think_seconds,
+            "seed": seed,
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        "taps_per_second": round(taps / elapsed, 1),
+        "endpoints": endpoints,
+    }
+
+
+def compare(result: dict, baseline: dict, max_regression: float) -> list[dict]:
+    rows = [compare_metric("taps_per_second", result["taps_per_second"], baseline["taps_per_second"], max_regression, higher_is_better=True)]
+    for name, summary in result["endpoints"].items():
+        previous = baseline["endpoints"].get(name, {})
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            rows.append(compare_metric(f"{name} {metric}", summary[metric], previous.get(metric), max_regression))
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--taps-per-reader", type=int, default=250)
+    parser.add_argument("--api", choices=("tap", "touch"), default="tap", help="tap は /taps の1往復、touch は prepare + confirm")
+    parser.add_argument("--server-workers", type=int, default=1)
+    parser.add_argument("--think", type=float, default=0.0, help="reader が打刻ごとに待つ秒数")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="結果を --baseline に保存する")
+    parser.add_argument("--compare", action="store_true", help="--baseline と比べ、悪化があれば終了コード 1 を返す")
+    # 裾の遅延は同じマシンでも 2〜3 割ぶれるので、既定は 5 割の悪化までを許す
+    parser.add_argument("--max-regression", type=float, default=0.5, help="許容する悪化の割合")
+    args = parser.parse_args()
+    if args.readers > args.students:
+        parser.error("--students は --readers 以上にしてください")
+
+    result = run(args.readers, args.students, args.taps_per_reader, args.api, args.server_workers, args.think, args.seed)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.save_baseline:
+        save_baseline(args.baseline, result)
+    if not args.compare:
+        return 0
+    baseline = load_baseline(args.baseline)
+    if baseline["config"] != result["config"]:
+        print(f"warning: baseline config differs {baseline['config']}", file=sys.stderr)
+    rows = compare(result, baseline, args.max_regression)
+    for row in rows:
+        mark = "REGRESSED" if row["regressed"] else "ok"
+        print(f"{mark:9} {row['name']}: {row['current']} (baseline {row['baseline']}, x{row['ratio']})")
+    return 1 if any(row["regressed"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""AttendanceService の集計・一覧と CSV 出力が、履歴の件数に対してどう伸びるかを測る。
+
+セッション数 10²〜10⁵ の DB をそれぞれ benchmarks.dataset で作り、各処理を rounds 回ずつ計測する。
+ベースラインと比べ、中央値が --max-regression を超えて悪化した処理があれば終了コード 1 を返す。
+
+    uv run python -m benchmarks.service_queries
+    uv run python -m benchmarks.service_queries --sizes 100 1000 --save-baseline
+    uv run python -m benchmarks.service_queries --compare
+"""
+
+from __future__ import annotations
+
+import argparse
+from collections.abc import Callable
+from datetime import timedelta
+import json
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.card_index import card_index
+from app.db import Base, apply_sqlite_tuning
+from app.config import get_settings
+from app.domain.time_utils import now_jst
+from app.routers.export import _csv_chunks
+from app.services.attendance_service import AttendanceService
+from app.sweeper import stale_session_sweeper
+from app.today_snapshot import today_snapshot_cache
+from benchmarks.baseline import BASELINE_DIR, compare_metric, load_baseline, save_baseline, summarize_latencies
+from benchmarks.dataset import seed_attendance_history
+import app.models  # noqa: F401
+
+DEFAULT_BASELINE = BASELINE_DIR / "service_queries.json"
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+
+
+def _drain_csv(db: Session, days: int) -> int:
+    end = now_jst().replace(tzinfo=None)
+    return sum(len(chunk) for chunk in _csv_chunks(db, end - timedelta(days=days), end))
+
+
+def _today_cold(service: AttendanceService) -> None:
+    # 打刻のたびにスナップショットは作り直されるので、キャッシュ無しの値を測る
+    today_snapshot_cache.reset()
+    service.get_today_attendance()
+
+
+def cases(db: Session, card_id: str) -> dict[str, Callable[[], object]]:
+    service = AttendanceService(db)
+    return {
+        "list_student_current_times": lambda: service.list_student_current_times("all"),
+        "get_today_attendance": lambda: _today_cold(service),
+        "get_current_term_total_minutes_by_card": lambda: service.get_current_term_total_minutes_by_card(card_id),
+        "csv_export_month": lambda: _drain_csv(db, 31),
+        "csv_export_half_year": lambda: _drain_csv(db, 183),
+    }
+
+
+def run_size(sessions: int, students: int, rounds: int) -> dict[str, dict]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{Path(tmp_dir) / 'queries.db'}", future=True)
+        apply_sqlite_tuning(engine, get_settings())
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
+        try:
+            with SessionLocal() as db:
+                seed_attendance_history(db, students, sessions)
+            results: dict[str, dict] = {}
+            with SessionLocal() as db:
+                # 履歴を持つ学生のうち、最後に登録された人のカードで引く
+                for name, func in cases(db, f"DATA{min(students, sessions) - 1:06d}").items():
+                    func()
+                    timings = []
+                    for _ in range(rounds):
+                        started = time.perf_counter()
+                        func()
+                        timings.append(time.perf_counter() - started)
+                        db.expire_all()
+                    results[name] = summarize_latencies(timings)
+        finally:
+            card_index.reset()
+            stale_session_sweeper.reset()
+            today_snapshot_cache.reset()
+            engine.dispose()
+    return results
+
+
+def compare(result: dict, baseline: dict, max_regression: float) -> list[dict]:
+    rows = []
+    for size, methods in result["sizes"].items():
+        for name, summary in methods.items():
+            previous = baseline["sizes"].get(size, {}).get(name, {})
+            rows.append(compare_metric(f"{size} sessions {name} p50_ms", summary["p50_ms"], previous.get("p50_ms"), max_regression))
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="計測するセッション数")
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="結果を --baseline に保存する")
+    parser.add_argument("--compare", action="store_true", help="--baseline と比べ、悪化があれば終了コード 1 を返す")
+    parser.add_argument("--max-regression", type=float, default=0.5, help="許容する中央値の悪化の割合")
+    args = parser.parse_args()
+
+    result = {
+        "config": {"students": args.students, "rounds": args.rounds},
+        "sizes": {str(size): run_size(size, args.students, args.rounds) for size in args.sizes},
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.save_baseline:
+        save_baseline(args.baseline, result)
+    if not args.compare:
+        return 0
+    rows = compare(result, load_baseline(args.baseline), args.max_regression)
+    for row in rows:
+        mark = "REGRESSED" if row["regressed"] else "ok"
+        print(f"{mark:9} {row['name']}: {row['current']} (baseline {row['baseline']}, x{row['ratio']})")
+    return 1 if any(row["regressed"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""SQLite の PRAGMA 設定の有無で打刻スループットを比べる。
+
+CSV 出力を模した長い読み取りを別スレッドで流しながら、打刻（prepare + confirm）を繰り返す。
+
+    uv run python -m benchmarks.sqlite_tuning --taps 500 --students 50
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import replace
+import json
+from pathlib import Path
+import tempfile
+from threading import Event, Thread
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app.config import get_settings
+from app.db import Base, apply_sqlite_tuning
+from app.domain.enums import AttendanceAction, AttendanceStatus
+from app.domain.time_utils import now_jst
+from app.models.attendance_event import AttendanceEvent
+from app.repositories.student_repository import StudentRepository
+from app.services.attendance_service import AttendanceService
+import app.models  # noqa: F401
+
+
+def _run_export_reader(SessionLocal, stop: Event, pause_seconds: float) -> None:
+    # 行を少しずつ読み進め、読み取りトランザクションを長く保持する
+    while not stop.is_set():
+        with SessionLocal() as db:
+            for _ in db.execute(select(AttendanceEvent.id).execution_options(yield_per=50)):
+                if stop.is_set():
+                    break
+                time.sleep(pause_seconds)
+
+
+def run(tuned: bool, taps: int, students: int, reader_pause_seconds: float) -> dict[str, float | int | bool]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{Path(tmp_dir) / 'bench.db'}", future=True)
+        apply_sqlite_tuning(engine, replace(get_settings(), sqlite_tuning=tuned))
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
+
+        with SessionLocal() as db:
+            for index in range(students):
+                StudentRepository(db).create(student_code=f"B{index:05d}", name=f"bench{index}", card_id=f"BENCH{index}")
+
+        stop = Event()
+        reader = Thread(target=_run_export_reader, args=(SessionLocal, stop, reader_pause_seconds), daemon=True)
+        reader.start()
+        latencies: list[float] = []
+        failures = 0
+        started = time.perf_counter()
+        try:
+            with SessionLocal() as db:
+                svc = AttendanceService(db)
+                for tap in range(taps):
+                    tap_started = time.perf_counter()
+                    try:
+                        now = now_jst()
+                        pending = svc.prepare_touch(f"BENCH{tap % students}", "bench", now)
+                        action = AttendanceAction.ENTER if pending.current_status == AttendanceStatus.OUTSIDE else AttendanceAction.LEAVE_FINAL
+                        svc.confirm_touch(pending.touch_token, action, now)
+                    except Exception:
+                        db.rollback()
+                        failures += 1
+                    latencies.append(time.perf_counter() - tap_started)
+        finally:
+            elapsed = time.perf_counter() - started
+            stop.set()
+            reader.join()
+            engine.dispose()
+
+    latencies.sort()
+    return {
+        "tuned": tuned,
+        "taps": taps,
+        "failures": failures,
+        "taps_per_second": round(taps / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--taps", type=int, default=300)
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--reader-pause", type=float, default=0.001, help="読み取りスレッドが1行ごとに待つ秒数")
+    args = parser.parse_args()
+    for tuned in (False, True):
+        print(json.dumps(run(tuned, args.taps, args.students, args.reader_pause), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
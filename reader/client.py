@@ -1,78 +1,173 @@
 from __future__ import annotations
 
+from collections.abc import Iterator
 from datetime import datetime
+import json
+from threading import Lock
+from uuid import uuid4
 
 import httpx
 
 
+class TapEndpointUnavailableError(RuntimeError):
+    pass
+
+
 class ReaderApiClient:
+    # サーバーは15秒ごとに keepalive を送るので、それより長く無音なら切れたとみなす
+    STREAM_READ_TIMEOUT_SECONDS = 30.0
+
     def __init__(self, base_url: str, reader_token: str, timeout: float = 10.0):
         self.base_url = base_url.rstrip("/")
         self.reader_token = reader_token
         self.timeout = timeout
+        self.supports_tap = True
+        # main() が ReaderStateMirror を設定すると、キオスクモードと選択中の操作は問い合わせずに手元の値を使う
+        self.state_mirror = None
+        self._client: httpx.Client | None = None
+        self._client_lock = Lock()
 
     @property
     def _headers(self) -> dict[str, str]:
         return {"X-Reader-Token": self.reader_token}
 
-    def prepare_touch(self, card_id: str, reader_name: str | None, detected_at: datetime) -> dict:
+    def _get_client(self) -> httpx.Client:
+        with self._client_lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(max_connections=4, max_keepalive_connections=4, keepalive_expiry=60.0),
+                )
+            return self._client
+
+    def _reset_client(self) -> None:
+        with self._client_lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    def _request(self, method: str, path: str, payload: dict | None = None, idempotency_key: str | None = None) -> dict:
+        url = f"{self.base_url}{path}"
+        headers = self._headers
+        if idempotency_key is not None:
+            headers = {**headers, "Idempotency-Key": idempotency_key}
+        try:
+            res = self._get_client().request(method, url, json=payload, headers=headers)
+        except (httpx.ConnectError, httpx.RemoteProtocolError, httpx.ReadTimeout) as exc:
+            # サーバー再起動で切れたkeep-alive接続を捨てて張り直す。
+            # 送信済みかもしれないPOSTは、冪等キーが無ければ二重適用を避けるため再送しない。
+            self._reset_client()
+            if method != "GET" and idempotency_key is None and not isinstance(exc, httpx.ConnectError):
+                raise
+            res = self._get_client().request(method, url, json=payload, headers=headers)
+        res.raise_for_status()
+        return res.json()
+
+    def close(self) -> None:
+        self._reset_client()
+
+    def __enter__(self) -> ReaderApiClient:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def prepare_touch(
+        self, card_id: str, reader_name: str | None, detected_at: datetime, idempotency_key: str | None = None
+    ) -> dict:
         payload = {
             "card_id": card_id,
             "reader_name": reader_name,
             "detected_at": detected_at.isoformat(),
         }
-        with httpx.Client(timeout=self.timeout) as client:
-            res = client.post(f"{self.base_url}/api/reader/touches", json=payload, headers=self._headers)
-            res.raise_for_status()
-            return res.json()
+        return self._request("POST", "/api/reader/touches", payload, idempotency_key=idempotency_key or str(uuid4()))
 
     def get_touch_panel_action(self) -> dict:
-        with httpx.Client(timeout=self.timeout) as client:
-            res = client.get(f"{self.base_url}/api/attendance/touch-panel/action", headers=self._headers)
-            res.raise_for_status()
-            return res.json()
+        state = self.state_mirror.current() if self.state_mirror is not None else None
+        if state is not None:
+            return {"selected_action": state.selected_action}
+        return self._request("GET", "/api/attendance/touch-panel/action")
 
     def get_kiosk_mode(self) -> dict:
-        with httpx.Client(timeout=self.timeout) as client:
-            res = client.get(f"{self.base_url}/api/reader/kiosk-mode", headers=self._headers)
-            res.raise_for_status()
-            return res.json()
+        state = self.state_mirror.current() if self.state_mirror is not None else None
+        if state is not None:
+            return {"mode": state.mode}
+        return self._request("GET", "/api/reader/kiosk-mode")
+
+    def stream_reader_state(self) -> Iterator[tuple[str, dict]]:
+        """/api/reader/stream のイベントを (イベント名, データ) で返す。切断されると httpx.HTTPError を送出する。"""
+        timeout = httpx.Timeout(self.timeout, read=self.STREAM_READ_TIMEOUT_SECONDS)
+        with httpx.Client(timeout=timeout) as client:
+            with client.stream("GET", f"{self.base_url}/api/reader/stream", headers=self._headers) as res:
+                res.raise_for_status()
+                event_name = "message"
+                data_lines: list[str] = []
+                for line in res.iter_lines():
+                    if line.startswith("event:"):
+                        event_name = line[len("event:") :].strip()
+                    elif line.startswith("data:"):
+                        data_lines.append(line[len("data:") :].strip())
+                    elif not line and data_lines:
+                        yield event_name, json.loads("\n".join(data_lines))
+                        event_name = "message"
+                        data_lines = []
+                    elif not line:
+                        event_name = "message"
 
     def capture_admin_login_card(self, card_id: str, reader_name: str | None, detected_at: datetime) -> dict:
         payload = {"card_id": card_id, "reader_name": reader_name, "detected_at": detected_at.isoformat()}
-        with httpx.Client(timeout=self.timeout) as client:
-            res = client.post(f"{self.base_url}/api/reader/captures/admin-login", json=payload, headers=self._headers)
-            res.raise_for_status()
-            return res.json()
+        return self._request("POST", "/api/reader/captures/admin-login", payload)
 
     def capture_student_card(self, card_id: str, reader_name: str | None, detected_at: datetime) -> dict:
         payload = {"card_id": card_id, "reader_name": reader_name, "detected_at": detected_at.isoformat()}
-        with httpx.Client(timeout=self.timeout) as client:
-            res = client.post(f"{self.base_url}/api/reader/captures/student-card", json=payload, headers=self._headers)
-            res.raise_for_status()
-            return res.json()
+        return self._request("POST", "/api/reader/captures/student-card", payload)
 
     def capture_term_total(self, card_id: str, reader_name: str | None, detected_at: datetime) -> dict:
         payload = {"card_id": card_id, "reader_name": reader_name, "detected_at": detected_at.isoformat()}
-        with httpx.Client(timeout=self.timeout) as client:
-            res = client.post(f"{self.base_url}/api/reader/captures/term-total", json=payload, headers=self._headers)
-            res.raise_for_status()
-            return res.json()
+        return self._request("POST", "/api/reader/captures/term-total", payload)
 
     def capture_touch_error(self, message: str, detected_at: datetime) -> dict:
         payload = {"message": message, "detected_at": detected_at.isoformat()}
-        with httpx.Client(timeout=self.timeout) as client:
-            res = client.post(f"{self.base_url}/api/reader/captures/touch-error", json=payload, headers=self._headers)
-            res.raise_for_status()
-            return res.json()
+        return self._request("POST", "/api/reader/captures/touch-error", payload)
 
-    def confirm_touch(self, touch_token: str, action: str, now: datetime) -> dict:
+    def confirm_touch(self, touch_token: str, action: str, now: datetime, idempotency_key: str | None = None) -> dict:
         payload = {"action": action, "now": now.isoformat()}
-        with httpx.Client(timeout=self.timeout) as client:
-            res = client.post(
-                f"{self.base_url}/api/reader/touches/{touch_token}/confirm",
-                json=payload,
-                headers=self._headers,
-            )
-            res.raise_for_status()
-            return res.json()
+        path = f"/api/reader/touches/{touch_token}/confirm"
+        return self._request("POST", path, payload, idempotency_key=idempotency_key or str(uuid4()))
+
+    def tap(
+        self,
+        card_id: str,
+        reader_name: str | None,
+        detected_at: datetime,
+        action: str = "auto",
+        idempotency_key: str | None = None,
+        replayed: bool = False,
+    ) -> dict:
+        payload = {
+            "card_id": card_id,
+            "reader_name": reader_name,
+            "detected_at": detected_at.isoformat(),
+            "action": None if action == "auto" else action,
+            "replayed": replayed,
+        }
+        try:
+            return self._request("POST", "/api/reader/taps", payload, idempotency_key=idempotency_key)
+        except httpx.HTTPStatusError as exc:
+            if not _is_missing_route(exc.response):
+                raise
+            # 旧サーバーには /taps が無いので以後は従来の4往復に切り替える
+            self.supports_tap = False
+            raise TapEndpointUnavailableError("サーバーが /api/reader/taps に対応していません") from exc
+
+
+def _is_missing_route(response: httpx.Response) -> bool:
+    if response.status_code == 405:
+        return True
+    if response.status_code != 404:
+        return False
+    try:
+        payload = response.json()
+    except ValueError:
+        return True
+    return isinstance(payload, dict) and payload.get("detail") == "Not Found"
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+import json
+import logging
+import os
+from pathlib import Path
+from threading import Event, Lock, Thread
+from typing import Protocol
+from uuid import uuid4
+
+import httpx
+
+from reader.state_mirror import ReaderState
+
+logger = logging.getLogger("reader.journal")
+
+# サーバー停止中・再起動中・DBロック中など、時間をおけば受け付けられる応答
+RETRYABLE_STATUS_CODES = {409, 502, 503, 504}
+
+
+def is_retryable_error(exc: httpx.HTTPError) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, httpx.TransportError)
+
+
+def new_idempotency_key() -> str:
+    return str(uuid4())
+
+
+@dataclass(frozen=True, slots=True)
+class JournaledTap:
+    idempotency_key: str
+    card_id: str
+    reader_name: str | None
+    detected_at: datetime
+    action: str
+    # タッチした時点のキオスクモードとタッチパネルの選択。再送では action をそのまま確定するので、
+    # 入退室として記録される状態で、操作も具体的に決まった打刻だけを貯める
+    mode: str | None = None
+    selected_action: str | None = None
+
+    @property
+    def replayable(self) -> bool:
+        if self.mode is None or self.selected_action is None or self.action == "auto":
+            return False
+        return ReaderState(self.mode, self.selected_action).records_attendance
+
+    def to_record(self) -> dict:
+        return {
+            "type": "tap",
+            "idempotency_key": self.idempotency_key,
+            "card_id": self.card_id,
+            "reader_name": self.reader_name,
+            "detected_at": self.detected_at.isoformat(),
+            "action": self.action,
+            "mode": self.mode,
+            "selected_action": self.selected_action,
+        }
+
+    @classmethod
+    def from_record(cls, record: dict) -> JournaledTap:
+        return cls(
+            idempotency_key=record["idempotency_key"],
+            card_id=record["card_id"],
+            reader_name=record["reader_name"],
+            detected_at=datetime.fromisoformat(record["detected_at"]),
+            action=record["action"],
+            mode=record.get("mode"),
+            selected_action=record.get("selected_action"),
+        )
+
+
+class TapJournal:
+    """送信できなかった打刻を貯める追記専用の JSONL ファイル。
+
+    1行ごとに fsync するので、書き込みが返った打刻は電源断でも残る。送信済みの打刻には ack 行を
+    追記し、未送信が無くなった時点でファイルを空にする。
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self._lock = Lock()
+        self._pending: dict[str, JournaledTap] = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    def append(self, tap: JournaledTap) -> None:
+        with self._lock:
+            self._write_locked(tap.to_record())
+            self._pending[tap.idempotency_key] = tap
+
+    def acknowledge(self, idempotency_key: str) -> None:
+        with self._lock:
+            if self._pending.pop(idempotency_key, None) is None:
+                return
+            if self._pending:
+                self._write_locked({"type": "ack", "idempotency_key": idempotency_key})
+            else:
+                self._truncate_locked()
+
+    def pending(self) -> list[JournaledTap]:
+        with self._lock:
+            return list(self._pending.values())
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            return bool(self._pending)
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        with self.path.open(encoding="utf-8") as fp:
+            for line_number, line in enumerate(fp, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    if record["type"] == "tap":
+                        tap = JournaledTap.from_record(record)
+                        self._pending[tap.idempotency_key] = tap
+                    elif record["type"] == "ack":
+                        self._pending.pop(record["idempotency_key"], None)
+                except (ValueError, KeyError, TypeError):
+                    # 書き込み途中で止まった最終行など。読める行だけ使う
+                    logger.warning("skip broken journal line path=%s line=%s", self.path, line_number)
+
+    def _write_locked(self, record: dict) -> None:
+        with self.path.open("a", encoding="utf-8") as fp:
+            fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+            fp.flush()
+            os.fsync(fp.fileno())
+
+    def _truncate_locked(self) -> None:
+        with self.path.open("w", encoding="utf-8") as fp:
+            fp.flush()
+            os.fsync(fp.fileno())
+
+
+class TapSender(Protocol):
+    def tap(
+        self,
+        card_id: str,
+        reader_name: str | None,
+        detected_at: datetime,
+        action: str = "auto",
+        idempotency_key: str | None = None,
+        replayed: bool = False,
+    ) -> dict: ...
+
+
+class JournalReplayer:
+    """ジャーナルの打刻を記録順にサーバーへ再送するバックグラウンドスレッド。"""
+
+    def __init__(self, journal: TapJournal, client: TapSender, retry_interval_seconds: float = 5.0) -> None:
+        self.journal = journal
+        self.client = client
+        self.retry_interval_seconds = retry_interval_seconds
+        self._wakeup = Event()
+        self._stopped = Event()
+        self._thread: Thread | None = None
+
+    def start(self) -> None:
+        self._thread = Thread(target=self._run, name="reader-journal-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.retry_interval_seconds + 1)
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def enqueue(self, tap: JournaledTap) -> None:
+        self.journal.append(tap)
+        self.wake()
+
+    def replay_pending(self) -> bool:
+        """未送信を先頭から送る。全件送れたら True、サーバーがまだ受け付けなければ False。"""
+        for tap in self.journal.pending():
+            if not tap.replayable:
+                # 画面状態の分からない古い行は、入退室として送ると記録を壊しうるので送らない
+                logger.error(
+                    "journal replay skipped idempotency_key=%s card_id=%s mode=%s action=%s",
+                    tap.idempotency_key,
+                    tap.card_id,
+                    tap.mode,
+                    tap.action,
+                )
+                self.journal.acknowledge(tap.idempotency_key)
+                continue
+            try:
+                result = self.client.tap(
+                    card_id=tap.card_id,
+                    reader_name=tap.reader_name,
+                    detected_at=tap.detected_at,
+                    action=tap.action,
+                    idempotency_key=tap.idempotency_key,
+                    replayed=True,
+                )
+            except httpx.HTTPError as exc:
+                if is_retryable_error(exc):
+                    logger.info("journal replay deferred idempotency_key=%s error=%s", tap.idempotency_key, exc)
+                    return False
+                # 未登録カードなど、再送しても結果が変わらない失敗は記録して読み飛ばす
+                logger.error("journal replay rejected idempotency_key=%s card_id=%s error=%s", tap.idempotency_key, tap.card_id, exc)
+            else:
+                logger.info(
+                    "journal replayed idempotency_key=%s card_id=%s detected_at=%s outcome=%s action=%s",
+                    tap.idempotency_key,
+                    tap.card_id,
+                    tap.detected_at.isoformat(),
+                    result.get("outcome"),
+                    result.get("action"),
+                )
+            self.journal.acknowledge(tap.idempotency_key)
+        return True
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            if self.journal.has_pending():
+                try:
+                    self.replay_pending()
+                except Exception:
+                    logger.exception("journal replay failed")
+            self._wakeup.wait(self.retry_interval_seconds)
+            self._wakeup.clear()
@@ -13,8 +13,11 @@ from typing import Callable
 
 import httpx
 from app.env import load_project_dotenv
-from reader.client import ReaderApiClient
+from reader.client import ReaderApiClient, TapEndpointUnavailableError
 from reader.debounce import Debouncer
+from reader.journal import JournaledTap, JournalReplayer, TapJournal, is_retryable_error, new_idempotency_key
+from reader.pipeline import TapPipeline
+from reader.state_mirror import ReaderStateMirror
 
 
 load_project_dotenv()
@@ -49,7 +52,8 @@ def configure_logger() -> logging.Logger:
     return logger
 
 
-logger = configure_logger()
+# ファイルへの出力は main() で設定する。import しただけ（テストなど）では logs/ に書かない
+logger = logging.getLogger("reader")
 
 ACTION_LABELS = {
     "ENTER": "入室",
@@ -75,6 +79,11 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("--count", type=int, default=1)
     parser.add_argument("--loop", action="store_true")
     parser.add_argument("--device-keyword", default=os.getenv("READER_DEVICE_KEYWORD", "SONY FeliCa"))
+    parser.add_argument("--journal-path", default=os.getenv("READER_JOURNAL_PATH", "var/reader-journal.jsonl"))
+    parser.add_argument("--replay-interval", type=float, default=5.0)
+    parser.add_argument("--pipeline-workers", type=int, default=1)
+    parser.add_argument("--pipeline-queue-size", type=int, default=32)
+    parser.add_argument("--metrics-interval", type=float, default=60.0)
     return parser
 
 
@@ -125,13 +134,123 @@ def summarize_http_error(exc: httpx.HTTPStatusError) -> str:
     return f"status={response.status_code} detail={detail}"
 
 
-def run_once(client: ReaderApiClient, debouncer: Debouncer, card_id: str, reader_name: str, action: str):
-    now = datetime.now().astimezone()
-    if not debouncer.allow(card_id):
+def journal_tap(replayer: JournalReplayer, tap: JournaledTap, reason: str) -> None:
+    replayer.enqueue(tap)
+    logger.warning(
+        "tap journaled for replay card_id=%s reader_name=%s detected_at=%s action=%s idempotency_key=%s reason=%s",
+        tap.card_id,
+        tap.reader_name,
+        tap.detected_at.isoformat(),
+        tap.action,
+        tap.idempotency_key,
+        reason,
+    )
+
+
+def journal_entry(
+    client: ReaderApiClient,
+    idempotency_key: str,
+    card_id: str,
+    reader_name: str,
+    action: str,
+    detected_at: datetime,
+) -> JournaledTap | None:
+    """送れなかったときにジャーナルへ残す内容。貯めてはいけない打刻なら None。
+
+    再送は入退室としてしか処理されないので、ログイン・登録・累計表示のタッチや、画面状態を一度も受け取っていない
+    ときのタッチは貯めない。切断中は最後に受け取った状態を使い、"auto" はその時点の選択で具体的な操作に決めておく。
+    """
+    state_mirror = getattr(client, "state_mirror", None)
+    state = state_mirror.last_known() if state_mirror is not None else None
+    if state is None or not state.records_attendance:
+        return None
+    resolved = state.selected_action if action == "auto" else action
+    return JournaledTap(idempotency_key, card_id, reader_name, detected_at, resolved, state.mode, state.selected_action)
+
+
+def run_tap(
+    client: ReaderApiClient,
+    card_id: str,
+    reader_name: str,
+    action: str,
+    detected_at: datetime,
+    replayer: JournalReplayer | None = None,
+) -> bool:
+    idempotency_key = new_idempotency_key()
+    tap = journal_entry(client, idempotency_key, card_id, reader_name, action, detected_at)
+    if replayer is not None and tap is not None and replayer.journal.has_pending():
+        # 未送信が残っている間は順序を保つため、新しい打刻もジャーナルの後ろに並べる
+        journal_tap(replayer, tap, "backlog")
+        return True
+    try:
+        result = client.tap(
+            card_id=card_id,
+            reader_name=reader_name,
+            detected_at=detected_at,
+            action=action,
+            idempotency_key=idempotency_key,
+        )
+    except TapEndpointUnavailableError:
+        logger.info("tap endpoint unavailable, falling back to per-step api base_url=%s", client.base_url)
+        return False
+    except httpx.HTTPError as exc:
+        if replayer is None or tap is None or not is_retryable_error(exc):
+            raise
+        # 届いたかどうか分からない場合も同じ冪等キーで再送するので、サーバー側で二重にならない
+        journal_tap(replayer, tap, type(exc).__name__)
+        return True
+
+    outcome = result.get("outcome")
+    if outcome == "ADMIN_LOGIN_CAPTURED":
+        logger.info("card captured for admin login card_id=%s reader_name=%s", card_id, reader_name)
+    elif outcome == "STUDENT_CARD_CAPTURED":
+        logger.info("card captured for student registration card_id=%s reader_name=%s", card_id, reader_name)
+    elif outcome == "TERM_TOTAL":
+        term_total = result.get("term_total") or {}
+        logger.info(
+            "term total captured card_id=%s reader_name=%s student_code=%s total_minutes=%s",
+            card_id,
+            reader_name,
+            term_total.get("student_code"),
+            term_total.get("total_minutes"),
+        )
+    elif outcome == "TOUCH_ERROR":
+        logger.warning(
+            "reader invalid selected action card_id=%s reader_name=%s error=%s",
+            card_id,
+            reader_name,
+            result.get("message"),
+        )
+    else:
+        confirm = result.get("confirm") or {}
+        logger.info(
+            "touch processed card_id=%s reader_name=%s action=%s next_status=%s lock_alert_required=%s",
+            card_id,
+            reader_name,
+            result.get("action"),
+            confirm.get("next_status"),
+            confirm.get("lock_alert_required"),
+        )
+    return True
+
+
+def run_once(
+    client: ReaderApiClient,
+    debouncer: Debouncer,
+    card_id: str,
+    reader_name: str,
+    action: str,
+    replayer: JournalReplayer | None = None,
+    detected_at: datetime | None = None,
+):
+    now = detected_at or datetime.now().astimezone()
+    if not debouncer.allow(card_id, now=now.timestamp()):
         logger.info("skip cooldown card_id=%s reader_name=%s detected_at=%s", card_id, reader_name, now.isoformat())
         return
 
     try:
+        if getattr(client, "supports_tap", False) and run_tap(client, card_id, reader_name, action, now, replayer):
+            return
         kiosk_mode = client.get_kiosk_mode().get("mode", "ATTENDANCE")
         if kiosk_mode == "ADMIN_LOGIN":
             client.capture_admin_login_card(card_id=card_id, reader_name=reader_name, detected_at=now)
@@ -186,11 +305,31 @@ def run_once(client: ReaderApiClient, debouncer: Debouncer, card_id: str, reader
     )
 
 
+def build_tap_worker(
+    client: ReaderApiClient,
+    debouncer: Debouncer,
+    reader_name: str,
+    action: str,
+    replayer: JournalReplayer | None = None,
+) -> Callable[[str, datetime], None]:
+    def process_card(card_id: str, detected_at: datetime) -> None:
+        try:
+            run_once(client, debouncer, card_id, reader_name, action, replayer, detected_at=detected_at)
+        except httpx.HTTPError:
+            return
+        except Exception:
+            logger.exception("failed to process card event card_id=%s reader_name=%s", card_id, reader_name)
+
+    return process_card
+
+
 def build_card_event_handler(
     client: ReaderApiClient,
     debouncer: Debouncer,
     reader_name: str,
     action: str,
+    replayer: JournalReplayer | None = None,
+    pipeline: TapPipeline | None = None,
 ) -> Callable[[str, str | None, Exception | None], None]:
     def handle_event(event_type: str, card_id: str | None, error: Exception | None = None) -> None:
         if error is not None:
@@ -198,8 +337,12 @@ def build_card_event_handler(
             return
         if event_type != "insert" or not card_id:
             return
+        if pipeline is not None:
+            # 監視スレッドでは検出時刻を付けて積むだけにし、次のカード検出を待たせない
+            pipeline.submit(card_id, datetime.now().astimezone())
+            return
         try:
-            run_once(client, debouncer, card_id, reader_name, action)
+            run_once(client, debouncer, card_id, reader_name, action, replayer)
         except httpx.HTTPError:
             return
         except Exception:
@@ -208,7 +351,30 @@ def build_card_event_handler(
     return handle_event
 
 
-def run_dummy_mode(args: argparse.Namespace, client: ReaderApiClient, debouncer: Debouncer) -> int:
+def log_pipeline_metrics(pipeline: TapPipeline) -> None:
+    metrics = pipeline.metrics()
+    logger.info(
+        "reader pipeline metrics queue_depth=%s max_queue_depth=%s submitted=%s processed=%s failed=%s waited=%s dropped=%s "
+        "latency_p50_ms=%s latency_p95_ms=%s latency_max_ms=%s",
+        metrics.queue_depth,
+        metrics.max_queue_depth,
+        metrics.submitted,
+        metrics.processed,
+        metrics.failed,
+        metrics.waited,
+        metrics.dropped,
+        metrics.latency_p50_ms,
+        metrics.latency_p95_ms,
+        metrics.latency_max_ms,
+    )
+
+
+def run_dummy_mode(
+    args: argparse.Namespace,
+    client: ReaderApiClient,
+    debouncer: Debouncer,
+    replayer: JournalReplayer | None = None,
+) -> int:
     reader_name = resolve_reader_name(args)
     logger.info(
         "reader started base_url=%s reader_name=%s mode=%s interval=%s count=%s cooldown=%s",
@@ -222,7 +388,7 @@ def run_dummy_mode(args: argparse.Namespace, client: ReaderApiClient, debouncer:
     if args.loop:
         try:
             while True:
-                run_once(client, debouncer, args.card_id, reader_name, args.action)
+                run_once(client, debouncer, args.card_id, reader_name, args.action, replayer)
                 time.sleep(args.interval)
         except KeyboardInterrupt:
             logger.info("reader stopped by keyboard interrupt")
@@ -231,7 +397,7 @@ def run_dummy_mode(args: argparse.Namespace, client: ReaderApiClient, debouncer:
     count = max(1, args.count)
     try:
         for _ in range(count):
-            run_once(client, debouncer, args.card_id, reader_name, args.action)
+            run_once(client, debouncer, args.card_id, reader_name, args.action, replayer)
             if count > 1:
                 time.sleep(args.interval)
     finally:
@@ -240,14 +406,24 @@ def run_dummy_mode(args: argparse.Namespace, client: ReaderApiClient, debouncer:
     return 0
 
 
-def run_real_mode(args: argparse.Namespace, client: ReaderApiClient, debouncer: Debouncer) -> int:
+def run_real_mode(
+    args: argparse.Namespace,
+    client: ReaderApiClient,
+    debouncer: Debouncer,
+    replayer: JournalReplayer | None = None,
+) -> int:
     from reader.nfc import NFCMonitor, NFCReaderError
 
     reader_name = resolve_reader_name(args)
+    pipeline = TapPipeline(
+        build_tap_worker(client, debouncer, reader_name, args.action, replayer),
+        workers=args.pipeline_workers,
+        max_queue_size=args.pipeline_queue_size,
+    )
     try:
         monitor = NFCMonitor(
             reader_name_keyword=args.device_keyword,
-            callback=build_card_event_handler(client, debouncer, reader_name, args.action),
+            callback=build_card_event_handler(client, debouncer, reader_name, args.action, replayer, pipeline),
         )
     except NFCReaderError:
         logger.exception("failed to start real reader monitor device_keyword=%s", args.device_keyword)
@@ -260,27 +436,44 @@ def run_real_mode(args: argparse.Namespace, client: ReaderApiClient, debouncer:
         args.device_keyword,
         args.cooldown,
     )
+    pipeline.start()
     monitor.start()
+    next_metrics_at = time.monotonic() + args.metrics_interval
     try:
         while True:
             time.sleep(1)
+            if time.monotonic() >= next_metrics_at:
+                log_pipeline_metrics(pipeline)
+                next_metrics_at = time.monotonic() + args.metrics_interval
     except KeyboardInterrupt:
         logger.info("reader stopped by keyboard interrupt")
         return 0
     finally:
         monitor.stop()
+        pipeline.stop()
+        log_pipeline_metrics(pipeline)
 
 
 def main() -> int:
+    configure_logger()
     args = parse_args()
     client = ReaderApiClient(base_url=args.base_url, reader_token=args.reader_token)
     debouncer = Debouncer(cooldown_seconds=args.cooldown)
+    replayer = JournalReplayer(TapJournal(args.journal_path), client, retry_interval_seconds=args.replay_interval)
+    state_mirror = ReaderStateMirror(client, reconnect_interval_seconds=args.replay_interval)
+    client.state_mirror = state_mirror
+    replayer.start()
+    state_mirror.start()
     try:
         if args.card_id:
-            return run_dummy_mode(args, client, debouncer)
-        return run_real_mode(args, client, debouncer)
+            return run_dummy_mode(args, client, debouncer, replayer)
+        return run_real_mode(args, client, debouncer, replayer)
     except httpx.HTTPError:
         return 1
+    finally:
+        state_mirror.stop()
+        replayer.stop()
+        client.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+import logging
+import queue
+from threading import Event, Lock, Thread
+import time
+from typing import Callable
+import zlib
+
+logger = logging.getLogger("reader.pipeline")
+
+_STOP = object()
+
+
+@dataclass(frozen=True, slots=True)
+class CardEvent:
+    card_id: str
+    detected_at: datetime
+    enqueued_at: float
+
+
+@dataclass(frozen=True, slots=True)
+class PipelineMetrics:
+    queue_depth: int
+    max_queue_depth: int
+    submitted: int
+    processed: int
+    failed: int
+    waited: int
+    dropped: int
+    latency_p50_ms: float | None
+    latency_p95_ms: float | None
+    latency_max_ms: float | None
+
+
+def _percentile(sorted_values: list[float], ratio: float) -> float:
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * ratio))
+    return sorted_values[index]
+
+
+class TapPipeline:
+    """カード検出スレッドから HTTP 送信を切り離すキュー。
+
+    pyscard の監視スレッドは submit() で積むだけで戻り、送信はワーカースレッドが行う。同じカードの
+    打刻は同じワーカーに振り分けるので、入室と退室の順序が入れ替わらない。キューがあふれた場合は
+    打刻を失わないよう、空くまで submit() で待たせて waited に数える。検出時刻は積む前に決めてあるので、
+    待った分が打刻時刻にずれ込むことはない。停止後に積めなかったものだけを dropped に数える。
+    """
+
+    SUBMIT_WAIT_SECONDS = 1.0
+
+    LATENCY_WINDOW = 256
+
+    def __init__(
+        self,
+        handler: Callable[[str, datetime], None],
+        workers: int = 1,
+        max_queue_size: int = 32,
+    ) -> None:
+        self.handler = handler
+        self._queues: list[queue.Queue] = [queue.Queue(maxsize=max_queue_size) for _ in range(max(1, workers))]
+        self._threads: list[Thread] = []
+        self._lock = Lock()
+        self._latencies: deque[float] = deque(maxlen=self.LATENCY_WINDOW)
+        self._max_queue_depth = 0
+        self._submitted = 0
+        self._processed = 0
+        self._failed = 0
+        self._waited = 0
+        self._dropped = 0
+        self._stopping = Event()
+
+    def start(self) -> None:
+        for index, work_queue in enumerate(self._queues):
+            thread = Thread(target=self._run, args=(work_queue,), name=f"reader-pipeline-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """積まれている打刻を送り終えるまで最大 timeout 秒待つ。"""
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        for work_queue in self._queues:
+            try:
+                # 停止の合図は積まれた打刻の後ろに入れる。満杯のまま空かなければ待ちすぎずに諦める
+                work_queue.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                logger.warning("reader pipeline stop timed out queue_depth=%s", work_queue.qsize())
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        self._threads.clear()
+
+    def submit(self, card_id: str, detected_at: datetime) -> bool:
+        event = CardEvent(card_id=card_id, detected_at=detected_at, enqueued_at=time.monotonic())
+        work_queue = self._queues[zlib.crc32(card_id.encode()) % len(self._queues)]
+        waited = False
+        while True:
+            try:
+                work_queue.put(event, timeout=self.SUBMIT_WAIT_SECONDS if waited else 0.0)
+                break
+            except queue.Full:
+                if self._stopping.is_set():
+                    with self._lock:
+                        self._dropped += 1
+                    logger.error("reader pipeline stopped, dropped card_id=%s detected_at=%s", card_id, detected_at.isoformat())
+                    return False
+                if not waited:
+                    waited = True
+                    with self._lock:
+                        self._waited += 1
+                logger.warning("reader pipeline full, waiting card_id=%s detected_at=%s", card_id, detected_at.isoformat())
+        depth = self.queue_depth()
+        with self._lock:
+            self._submitted += 1
+            self._max_queue_depth = max(self._max_queue_depth, depth)
+        return True
+
+    def queue_depth(self) -> int:
+        return sum(work_queue.qsize() for work_queue in self._queues)
+
+    def metrics(self) -> PipelineMetrics:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return PipelineMetrics(
+                queue_depth=self.queue_depth(),
+                max_queue_depth=self._max_queue_depth,
+                submitted=self._submitted,
+                processed=self._processed,
+                failed=self._failed,
+                waited=self._waited,
+                dropped=self._dropped,
+                latency_p50_ms=round(_percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+                latency_p95_ms=round(_percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+                latency_max_ms=round(latencies[-1] * 1000, 1) if latencies else None,
+            )
+
+    def process_next(self, work_queue: queue.Queue, timeout: float | None = None) -> bool:
+        """1件処理する。停止の合図を受け取ったら False を返す。"""
+        event = work_queue.get(timeout=timeout)
+        if event is _STOP:
+            return False
+        failed = False
+        try:
+            self.handler(event.card_id, event.detected_at)
+        except Exception:
+            failed = True
+            logger.exception("reader pipeline handler failed card_id=%s", event.card_id)
+        # 検出からサーバー応答（またはジャーナル追記）までの時間
+        latency = time.monotonic() - event.enqueued_at
+        with self._lock:
+            self._processed += 1
+            self._failed += int(failed)
+            self._latencies.append(latency)
+        return True
+
+    def _run(self, work_queue: queue.Queue) -> None:
+        while self.process_next(work_queue):
+            pass
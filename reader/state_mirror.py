@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from dataclasses import dataclass
+import logging
+from threading import Event, Lock, Thread
+from typing import Protocol
+
+import httpx
+
+logger = logging.getLogger("reader.state_mirror")
+
+READER_STATE_EVENT = "reader_state"
+
+
+@dataclass(frozen=True, slots=True)
+class ReaderState:
+    mode: str
+    selected_action: str
+
+    @property
+    def records_attendance(self) -> bool:
+        """この状態でのタッチが入退室として記録されるか（登録・ログイン・累計表示ではないか）。"""
+        return self.mode == "ATTENDANCE" and self.selected_action != "TERM_TOTAL"
+
+
+class ReaderStateSource(Protocol):
+    def stream_reader_state(self) -> Iterator[tuple[str, dict]]: ...
+
+
+class ReaderStateMirror:
+    """サーバーから送られるキオスクモードとタッチパネルの選択を手元に保持するバックグラウンドスレッド。
+
+    接続中だけ current() が値を返す。切断中は None を返すので、呼び出し側は従来どおりサーバーに問い合わせる。
+    last_known() は切断後も最後に受け取った値を返す。送信できなかった打刻を、タッチした時点の画面状態と一緒に
+    ジャーナルへ残すのに使う。
+    """
+
+    def __init__(self, client: ReaderStateSource, reconnect_interval_seconds: float = 5.0) -> None:
+        self.client = client
+        self.reconnect_interval_seconds = reconnect_interval_seconds
+        self._lock = Lock()
+        self._state: ReaderState | None = None
+        self._last_known: ReaderState | None = None
+        self._stopped = Event()
+        self._thread: Thread | None = None
+
+    def current(self) -> ReaderState | None:
+        with self._lock:
+            return self._state
+
+    def last_known(self) -> ReaderState | None:
+        with self._lock:
+            return self._last_known
+
+    def apply(self, event_name: str, data: dict) -> None:
+        if event_name != READER_STATE_EVENT:
+            return
+        state = ReaderState(mode=data["mode"], selected_action=data["selected_action"])
+        with self._lock:
+            previous, self._state = self._state, state
+            self._last_known = state
+        if state != previous:
+            logger.info("reader state updated mode=%s selected_action=%s", state.mode, state.selected_action)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._state = None
+
+    def start(self) -> None:
+        self._thread = Thread(target=self._run, name="reader-state-mirror", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        # 受信待ちのスレッドは keepalive か切断で目覚めるまで止まらないので、待ちすぎずに戻る
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def follow(self) -> None:
+        """ストリームが切れるまで受信して反映する。"""
+        try:
+            for event_name, data in self.client.stream_reader_state():
+                if self._stopped.is_set():
+                    return
+                self.apply(event_name, data)
+        finally:
+            self.invalidate()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.follow()
+            except httpx.HTTPError as exc:
+                logger.info("reader state stream disconnected error=%s", exc)
+            except Exception:
+                logger.exception("reader state stream failed")
+            self._stopped.wait(self.reconnect_interval_seconds)
@@ -1,5 +1,7 @@
 from datetime import timedelta
 
+from sqlalchemy import event
+
 from app.domain.enums import AttendanceStatus
 from app.domain.time_utils import now_jst
 from app.repositories.attendance_repository import AttendanceRepository
@@ -34,3 +36,25 @@ def test_count_in_room(db_session):
     ev = repo.add_event(student.id, "ENTER", now_jst(), "reader")
     repo.upsert_status(student.id, AttendanceStatus.IN_ROOM.value, ev.id)
     assert repo.count_in_room() == 1
+
+
+def test_refresh_daily_rollup_reads_breaks_in_one_query(db_session):
+    student = StudentRepository(db_session).create("S001", "Alice", "CARD1")
+    repo = AttendanceRepository(db_session)
+    day = now_jst().replace(hour=9, minute=0, second=0, microsecond=0)
+    for hour in (0, 3, 6):
+        session = repo.create_session(student.id, day + timedelta(hours=hour))
+        repo.start_break(session.id, day + timedelta(hours=hour, minutes=30))
+        repo.end_latest_open_break(session.id, day + timedelta(hours=hour, minutes=40))
+        repo.close_session(session, day + timedelta(hours=hour + 2), 0)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    try:
+        rollup = repo.refresh_daily_rollup(student.id, day)
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+
+    assert rollup.net_minutes == 3 * 110
+    assert sum("FROM break_periods" in statement for statement in statements) == 1
@@ -1,10 +1,12 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 import pytest
+from sqlalchemy import event
 
 from app.domain.enums import AttendanceAction, AttendanceStatus
-from app.domain.time_utils import from_unix_seconds, now_jst
+from app.domain.time_utils import JST, from_unix_seconds, now_jst
 from app import realtime
+from app.models.attendance_daily_rollup import AttendanceDailyRollup
 from app.services import attendance_service as attendance_service_module
 from app.schemas.student import StudentCreate
 from app.services.attendance_service import AttendanceService
@@ -24,13 +26,13 @@ def test_prepare_touch_unknown_card(db_session):
 
 def test_prepare_touch_unknown_card_publishes_realtime_event(db_session, monkeypatch):
     published = []
-    monkeypatch.setattr(realtime.attendance_event_broker, "publish", lambda event="refresh": published.append(event))
+    monkeypatch.setattr(realtime.attendance_event_broker, "publish", lambda event="refresh", data=None: published.append(event))
     svc = AttendanceService(db_session)
 
     with pytest.raises(UnknownCardError):
         svc.prepare_touch("NOPE", "reader", now_jst())
 
-    assert published == ["refresh"]
+    assert published == ["alert_raised"]
 
 
 def test_attendance_flow_and_lock_alert(db_session):
@@ -57,7 +59,7 @@ def test_attendance_flow_and_lock_alert(db_session):
 
 def test_confirm_touch_publishes_realtime_event(db_session, monkeypatch):
     published = []
-    monkeypatch.setattr(realtime.attendance_event_broker, "publish", lambda event="refresh": published.append(event))
+    monkeypatch.setattr(realtime.attendance_event_broker, "publish", lambda event="refresh", data=None: published.append(event))
     StudentService(db_session).register_student(StudentCreate(student_code="S001", name="Alice", card_id="CARD1"))
     svc = AttendanceService(db_session)
     t1 = now_jst().replace(hour=9, minute=0, second=0, microsecond=0)
@@ -65,7 +67,41 @@ def test_confirm_touch_publishes_realtime_event(db_session, monkeypatch):
     pending = svc.prepare_touch("CARD1", "reader", t1)
     svc.confirm_touch(pending.touch_token, AttendanceAction.ENTER, t1)
 
-    assert published == ["refresh"]
+    assert published == ["event_appended", "status_changed"]
+
+
+def test_confirm_touch_commits_once_per_transition(db_session):
+    StudentService(db_session).register_student(StudentCreate(student_code="S001", name="Alice", card_id="CARD1"))
+    svc = AttendanceService(db_session)
+    t1 = now_jst().replace(hour=9, minute=0, second=0, microsecond=0)
+    pending = svc.prepare_touch("CARD1", "reader", t1)
+    svc.confirm_touch(pending.touch_token, AttendanceAction.ENTER, t1)
+
+    commits = []
+    event.listen(db_session, "after_commit", lambda session: commits.append(session))
+    pending = svc.prepare_touch("CARD1", "reader", t1 + timedelta(minutes=30))
+    confirm = svc.confirm_touch(pending.touch_token, AttendanceAction.LEAVE_FINAL, t1 + timedelta(minutes=30))
+
+    assert confirm.lock_alert_required is True
+    assert len(commits) == 1
+    assert svc.audit_repo.get_latest_by_action("LOCK_ALERT") is not None
+
+
+def test_confirm_touch_rolls_back_on_failure(db_session, monkeypatch):
+    student = StudentService(db_session).register_student(StudentCreate(student_code="S001", name="Alice", card_id="CARD1"))
+    svc = AttendanceService(db_session)
+    t1 = now_jst().replace(hour=9, minute=0, second=0, microsecond=0)
+    pending = svc.prepare_touch("CARD1", "reader", t1)
+
+    def fail_create_session(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(svc.att_repo, "create_session", fail_create_session)
+    with pytest.raises(RuntimeError):
+        svc.confirm_touch(pending.touch_token, AttendanceAction.ENTER, t1)
+
+    assert svc.att_repo.get_status(student.id) is None
+    assert svc.att_repo.list_today_events(t1.date()) == []
 
 
 def test_token_expiry(db_session):
@@ -307,3 +343,134 @@ def test_list_student_current_times_includes_closed_session_totals(db_session):
     assert row.entered_at is None
     assert row.cumulative_minutes == 90
     assert row.business_cumulative_minutes == 90
+
+
+def test_period_totals_by_student_match_per_student_totals(db_session):
+    svc = AttendanceService(db_session)
+    students = [
+        StudentService(db_session).register_student(
+            StudentCreate(student_code=f"S1{index:02d}", name=f"User {index}", card_id=f"BULK{index}")
+        )
+        for index in range(4)
+    ]
+    now = datetime(2026, 6, 10, 15, 20, tzinfo=JST)
+    start, end = svc.current_term_bounds(now)
+    day = now.replace(hour=0, minute=0)
+    for index, student in enumerate(students[:3]):
+        for days_ago in range(3):
+            entered_at = day - timedelta(days=days_ago) + timedelta(hours=7 + index, minutes=13)
+            session = svc.att_repo.create_session(student.id, entered_at)
+            svc.att_repo.start_break(session.id, entered_at + timedelta(minutes=95))
+            svc.att_repo.end_latest_open_break(session.id, entered_at + timedelta(minutes=131))
+            if days_ago == 0 and index == 2:
+                svc.att_repo.start_break(session.id, entered_at + timedelta(minutes=200))
+                continue
+            left_at = entered_at + timedelta(hours=5 + days_ago, minutes=7)
+            svc.att_repo.close_session(session, left_at, 0)
+
+    bulk = svc._compute_period_totals_by_student(start, end, now)
+
+    # 変更前の実装（セッションごとに休憩を読み直して数える版）で出した値
+    expected = {
+        students[0].id: (993, 708),
+        students[1].id: (993, 852),
+        # 今日のセッションは入室中で、12:33 からの休憩が続いている
+        students[2].id: (886, 886),
+    }
+    for student in students:
+        assert bulk.get(student.id, (0, 0)) == expected.get(student.id, (0, 0))
+        assert svc._compute_student_period_totals(student.id, start, end, now) == expected.get(student.id, (0, 0))
+
+
+def test_business_minutes_of_multi_day_session_count_each_day(db_session):
+    student = StudentService(db_session).register_student(
+        StudentCreate(student_code="S008", name="Overnight User", card_id="CARD8")
+    )
+    svc = AttendanceService(db_session)
+    entered_at = datetime(2026, 6, 8, 15, 0, tzinfo=JST)
+    session = svc.att_repo.create_session(student.id, entered_at)
+    svc.att_repo.close_session(session, entered_at + timedelta(hours=20), 0)
+    now = datetime(2026, 6, 10, 12, 0, tzinfo=JST)
+    start, end = svc.current_term_bounds(now)
+
+    # 日次集計は日ごとの 9〜17 時を数える（15〜17 時と翌日 9〜11 時）。
+    # 変更前は入室日の 9〜17 時だけを数えていたので 120 分だった
+    assert svc._compute_student_period_totals(student.id, start, end, now) == (1200, 240)
+
+
+def test_list_student_current_times_query_count_is_independent_of_students(db_session):
+    svc = AttendanceService(db_session)
+    now = now_jst().replace(hour=12, minute=0, second=0, microsecond=0)
+
+    def count_queries() -> int:
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+        try:
+            svc.list_student_current_times(target="all", now=now)
+        finally:
+            event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+        return len(statements)
+
+    for index in range(2):
+        student = StudentService(db_session).register_student(
+            StudentCreate(student_code=f"Q{index:03d}", name=f"Q {index}", card_id=f"QCARD{index}")
+        )
+        svc.att_repo.create_session(student.id, now - timedelta(hours=1))
+    count_queries()
+    few = count_queries()
+
+    for index in range(2, 12):
+        student = StudentService(db_session).register_student(
+            StudentCreate(student_code=f"Q{index:03d}", name=f"Q {index}", card_id=f"QCARD{index}")
+        )
+        session = svc.att_repo.create_session(student.id, now - timedelta(hours=2))
+        svc.att_repo.close_session(session, now - timedelta(hours=1), 60)
+    many = count_queries()
+
+    assert many == few
+
+
+def test_daily_rollup_is_maintained_on_leave_and_rebuildable(db_session):
+    student = StudentService(db_session).register_student(
+        StudentCreate(student_code="S006", name="Rollup User", card_id="CARD6")
+    )
+    svc = AttendanceService(db_session)
+    entered_at = now_jst().replace(hour=8, minute=30, second=0, microsecond=0)
+    for action, offset in [
+        (AttendanceAction.ENTER, 0),
+        (AttendanceAction.LEAVE_TEMP, 60),
+        (AttendanceAction.RETURN, 90),
+        (AttendanceAction.LEAVE_FINAL, 300),
+    ]:
+        at = entered_at + timedelta(minutes=offset)
+        pending = svc.prepare_touch("CARD6", "reader", at)
+        svc.confirm_touch(pending.touch_token, action, at)
+
+    day_start = entered_at.replace(hour=0, minute=0)
+    rollups = svc.att_repo.sum_daily_rollups(day_start, day_start + timedelta(days=1))
+    assert rollups[student.id] == (270, 240)
+
+    db_session.query(AttendanceDailyRollup).delete()
+    db_session.commit()
+    assert svc.att_repo.rebuild_daily_rollups_if_empty() == 1
+    assert svc.att_repo.rebuild_daily_rollups_if_empty() == 0
+    assert svc.att_repo.sum_daily_rollups(day_start, day_start + timedelta(days=1)) == rollups
+
+
+def test_term_total_adds_live_open_session_to_rollup(db_session):
+    StudentService(db_session).register_student(
+        StudentCreate(student_code="S007", name="Live User", card_id="CARD7")
+    )
+    svc = AttendanceService(db_session)
+    entered_at = now_jst().replace(hour=9, minute=0, second=0, microsecond=0)
+    pending = svc.prepare_touch("CARD7", "reader", entered_at)
+    svc.confirm_touch(pending.touch_token, AttendanceAction.ENTER, entered_at)
+    pending = svc.prepare_touch("CARD7", "reader", entered_at + timedelta(minutes=60))
+    svc.confirm_touch(pending.touch_token, AttendanceAction.LEAVE_FINAL, entered_at + timedelta(minutes=60))
+    pending = svc.prepare_touch("CARD7", "reader", entered_at + timedelta(minutes=120))
+    svc.confirm_touch(pending.touch_token, AttendanceAction.ENTER, entered_at + timedelta(minutes=120))
+
+    _, total_minutes, _, _ = svc.get_current_term_total_minutes_by_card("CARD7", now=entered_at + timedelta(minutes=150))
+
+    assert total_minutes == 90
@@ -60,6 +60,20 @@ def test_admin_api_requires_login(client):
     res_latest_unknown = client.get("/api/admin/latest-unknown-card")
     assert res_latest_unknown.status_code == 401
 
+    res_pending_stats = client.get("/api/admin/pending-touches/stats")
+    assert res_pending_stats.status_code == 401
+
+
+def test_admin_api_pending_touch_stats(client):
+    client.post(
+        "/login",
+        data={"username": settings.admin_username, "password": settings.admin_password, "next": "/admin/today"},
+        follow_redirects=False,
+    )
+    res = client.get("/api/admin/pending-touches/stats")
+    assert res.status_code == 200
+    assert set(res.json()) == {"size", "capacity", "expired", "evicted"}
+
 
 def test_touch_login_success(client):
     client.post(
@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from app.domain.time_utils import JST
+from app.models.attendance_daily_rollup import AttendanceDailyRollup
+from app.models.attendance_event import AttendanceEvent
+from app.models.attendance_session import AttendanceSession
+from app.services.attendance_service import AttendanceService
+from benchmarks.dataset import seed_attendance_history
+
+
+def test_seeded_history_is_consistent_with_service_totals(db_session):
+    now = datetime(2026, 6, 10, 11, 0, tzinfo=JST)
+
+    summary = seed_attendance_history(db_session, students=20, sessions=300, now=now, open_ratio=0.1)
+
+    assert summary.sessions == 300
+    assert summary.open_sessions == 2
+    assert db_session.scalar(select(func.count()).select_from(AttendanceSession)) == 300
+    assert db_session.scalar(select(func.count()).select_from(AttendanceEvent)) == summary.events
+    # 日次集計は閉じたセッションの正味時間と一致する
+    closed_minutes = db_session.scalar(select(func.sum(AttendanceSession.total_minutes)))
+    assert db_session.scalar(select(func.sum(AttendanceDailyRollup.net_minutes))) == closed_minutes
+
+    entries = AttendanceService(db_session).list_student_current_times("in_room", now=now)
+    assert len(entries) == 2
@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from app.card_index import CardIndex, card_index
+from app.domain.time_utils import JST
+from app.schemas.student import StudentCreate, StudentUpdate
+from app.services.attendance_service import AttendanceService
+from app.services.exceptions import UnknownCardError
+from app.services.student_service import StudentService
+
+
+def _capture_student_queries(db_session):
+    statements: list[str] = []
+
+    def listener(_conn, _cursor, statement, *_args):
+        if "FROM students" in statement:
+            statements.append(statement)
+
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    return statements, lambda: event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+
+
+def test_prepare_touch_serves_known_card_from_index(db_session):
+    StudentService(db_session).register_student(StudentCreate(student_code="S001", name="Alice", card_id="CARD1"))
+    card_index.warm(db_session)
+    svc = AttendanceService(db_session)
+
+    statements, stop = _capture_student_queries(db_session)
+    try:
+        pending = svc.prepare_touch("CARD1", "reader", datetime(2026, 4, 1, 9, 0, tzinfo=JST))
+    finally:
+        stop()
+
+    assert pending.student_name == "Alice"
+    assert statements == []
+
+
+def test_unknown_card_is_negatively_cached(db_session):
+    index = CardIndex()
+    index.warm(db_session)
+
+    statements, stop = _capture_student_queries(db_session)
+    try:
+        assert index.lookup(db_session, "NOPE") is None
+        assert index.lookup(db_session, "NOPE") is None
+    finally:
+        stop()
+
+    assert len(statements) == 1
+
+
+def test_registering_card_replaces_negative_cache_entry(db_session):
+    card_index.warm(db_session)
+    svc = AttendanceService(db_session)
+    detected_at = datetime(2026, 4, 1, 9, 0, tzinfo=JST)
+
+    with pytest.raises(UnknownCardError):
+        svc.prepare_touch("NEW1", "reader", detected_at)
+    StudentService(db_session).register_student(StudentCreate(student_code="S002", name="Bob", card_id="NEW1"))
+
+    pending = svc.prepare_touch("NEW1", "reader", detected_at)
+    assert pending.student_name == "Bob"
+
+
+def test_updating_card_id_forgets_previous_card(db_session):
+    student_svc = StudentService(db_session)
+    student = student_svc.register_student(StudentCreate(student_code="S003", name="Carol", card_id="OLD1"))
+    card_index.warm(db_session)
+
+    student_svc.update_student(student.id, StudentUpdate(card_id="NEW2"))
+
+    assert student_svc.get_by_card_id("OLD1") is None
+    entry = student_svc.get_by_card_id("NEW2")
+    assert entry is not None
+    assert entry.student_code == "S003"
+
+    student_svc.deactivate_student(student.id)
+    assert student_svc.get_by_card_id("NEW2").is_active is False
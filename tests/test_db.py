@@ -0,0 +1,42 @@
+from dataclasses import replace
+
+import pytest
+from sqlalchemy import create_engine
+
+from app.config import Settings
+from app.db import apply_sqlite_tuning
+
+
+def _pragma(engine, name: str):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def test_sqlite_tuning_applies_pragmas_on_connect(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tuned.db'}", future=True)
+    config = replace(Settings(), sqlite_tuning=True, sqlite_busy_timeout_ms=1234, sqlite_cache_size_kib=2048)
+    apply_sqlite_tuning(engine, config)
+    try:
+        assert _pragma(engine, "journal_mode") == "wal"
+        assert _pragma(engine, "synchronous") == 1
+        assert _pragma(engine, "busy_timeout") == 1234
+        assert _pragma(engine, "cache_size") == -2048
+        assert _pragma(engine, "temp_store") == 2
+    finally:
+        engine.dispose()
+
+
+def test_sqlite_tuning_can_be_disabled(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plain.db'}", future=True)
+    apply_sqlite_tuning(engine, replace(Settings(), sqlite_tuning=False))
+    try:
+        assert _pragma(engine, "journal_mode") == "delete"
+    finally:
+        engine.dispose()
+
+
+def test_sqlite_tuning_rejects_unknown_modes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bad.db'}", future=True)
+    with pytest.raises(ValueError):
+        apply_sqlite_tuning(engine, replace(Settings(), sqlite_tuning=True, sqlite_synchronous="FAST; DROP TABLE students"))
+    engine.dispose()
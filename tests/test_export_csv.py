@@ -1,6 +1,12 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
 from app.domain.time_utils import now_jst
 from app.repositories.attendance_repository import AttendanceRepository
 from app.repositories.student_repository import StudentRepository
+from app.routers import export
+from app.worker_pools import WorkerPool
 
 
 def test_export_monthly_csv(client, db_session):
@@ -47,3 +53,46 @@ def test_export_semester_csv(client, db_session):
     res_h2 = client.get("/api/export/semester.csv?year=2026&semester=2")
     assert res_h2.status_code == 200
     assert "S301,Taro,LEAVE_FINAL" in res_h2.text
+
+
+def test_export_streams_only_needed_columns_in_batches(db_session, monkeypatch):
+    student = StudentRepository(db_session).create("S302", "Jiro", "CARD302")
+    repo = AttendanceRepository(db_session)
+    base = now_jst().replace(year=2026, month=6, day=1, hour=9, minute=0, second=0, microsecond=0)
+    for offset in range(5):
+        repo.add_event(
+            student_id=student.id,
+            event_type="ENTER",
+            occurred_at=base + timedelta(days=offset),
+            source="reader",
+        )
+    monkeypatch.setattr(export, "EXPORT_YIELD_PER", 2)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    try:
+        chunks = list(export._csv_chunks(db_session, datetime(2026, 6, 1), datetime(2026, 7, 1)))
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+
+    assert chunks[0] == "student_code,name,event_type,occurred_at,source,reader_name\r\n"
+    assert [chunk.count("\r\n") for chunk in chunks[1:]] == [2, 2, 1]
+    assert len(statements) == 1
+    assert "card_id" not in statements[0]
+    assert "memo" not in statements[0]
+
+
+def test_export_rejected_when_admission_queue_is_full_but_reader_still_served(client, db_session, monkeypatch):
+    StudentRepository(db_session).create("S302", "Jiro", "CARD302")
+    monkeypatch.setattr(export, "read_pool", WorkerPool("db-read", max_workers=1, max_active=0, max_queued=0))
+
+    res = client.get("/api/export/monthly.csv?year=2026&month=4")
+    assert res.status_code == 503
+
+    touch = client.post(
+        "/api/reader/touches",
+        headers={"X-Reader-Token": "dev-reader-token"},
+        json={"card_id": "CARD302", "reader_name": "reader-a", "detected_at": "2026-04-01T09:00:00+09:00"},
+    )
+    assert touch.status_code == 200
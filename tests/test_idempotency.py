@@ -0,0 +1,59 @@
+import json
+
+from pydantic import BaseModel
+import pytest
+from sqlalchemy import func, select
+
+from app.db import commit
+from app.idempotency import IdempotencyStore
+from app.models.idempotency_record import IdempotencyRecord
+from app.models.student import Student
+
+
+class Echo(BaseModel):
+    value: str
+
+
+def test_duplicate_key_rolls_back_changes_and_returns_first_response(db_session, monkeypatch):
+    store = IdempotencyStore()
+    db_session.add(IdempotencyRecord(scope="test", key="k1", response=json.dumps({"value": "first"}), created_at=0))
+    db_session.commit()
+    # 先の要求がコミットする前に読んだ場合と同じく、保存済みの記録を見落とさせる
+    loads = iter([None])
+    original_load = store._load
+    monkeypatch.setattr(store, "_load", lambda db, scope, key: next(loads, None) or original_load(db, scope, key))
+
+    def process() -> Echo:
+        db_session.add(Student(student_code="S001", name="Alice", card_id="CARD1"))
+        commit(db_session)
+        return Echo(value="second")
+
+    response = store.run(db_session, "test", "k1", process, Echo)
+
+    assert response == Echo(value="first")
+    assert db_session.scalar(select(func.count()).select_from(Student)) == 0
+
+
+def test_failed_request_leaves_no_record(db_session):
+    store = IdempotencyStore()
+
+    def process() -> Echo:
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        store.run(db_session, "test", "k1", process, Echo)
+
+    assert db_session.get(IdempotencyRecord, ("test", "k1")) is None
+    assert store.run(db_session, "test", "k1", lambda: Echo(value="retry"), Echo) == Echo(value="retry")
+
+
+def test_prune_removes_expired_and_overflowing_records(db_session, monkeypatch):
+    store = IdempotencyStore()
+    monkeypatch.setattr(store, "MAX_ENTRIES", 2)
+    now = 10 * store.RETENTION_SECONDS
+    for index, created_at in enumerate((0, now - 3, now - 2, now - 1)):
+        db_session.add(IdempotencyRecord(scope="test", key=f"k{index}", response="{}", created_at=created_at))
+    db_session.commit()
+
+    assert store.prune(db_session, now) == 2
+    assert sorted(db_session.scalars(select(IdempotencyRecord.key))) == ["k2", "k3"]
@@ -0,0 +1,92 @@
+from dataclasses import replace
+from threading import Thread
+
+from app import main as main_module
+
+from app.metrics import Counter, Histogram, taps_confirmed, taps_prepared, unknown_card_logs
+from app.schemas.student import StudentCreate
+from app.services.student_service import StudentService
+
+HEADERS = {"X-Reader-Token": "dev-reader-token"}
+
+
+def test_counter_sums_cells_of_all_threads():
+    counter = Counter("test_total", "test", ("kind",))
+
+    def work() -> None:
+        for _ in range(1000):
+            counter.inc("a")
+        counter.inc("b", amount=2)
+
+    threads = [Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 終了したスレッドの分も残る
+    assert counter.values() == {("a",): 4000, ("b",): 8}
+    assert counter.render() == [
+        "# HELP test_total test",
+        "# TYPE test_total counter",
+        'test_total{kind="a"} 4000',
+        'test_total{kind="b"} 8',
+    ]
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "test", (0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value)
+
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        "test_seconds_sum 4.05",
+        "test_seconds_count 4",
+    ]
+
+
+def test_touch_flow_updates_counters_and_metrics_endpoint(client, db_session, monkeypatch):
+    StudentService(db_session).register_student(StudentCreate(student_code="S001", name="Alice", card_id="CARD1"))
+    prepared = taps_prepared.values()
+    confirmed = taps_confirmed.values()
+    unknown = unknown_card_logs.values()
+
+    touch = client.post(
+        "/api/reader/touches",
+        headers=HEADERS,
+        json={"card_id": "CARD1", "reader_name": "reader-a", "detected_at": "2026-04-01T09:00:00+09:00"},
+    ).json()
+    client.post(
+        f"/api/reader/touches/{touch['touch_token']}/confirm",
+        headers=HEADERS,
+        json={"action": "ENTER", "now": "2026-04-01T09:00:01+09:00"},
+    )
+    client.post(
+        "/api/reader/touches",
+        headers=HEADERS,
+        json={"card_id": "UNKNOWN", "reader_name": "reader-a", "detected_at": "2026-04-01T09:00:02+09:00"},
+    )
+
+    assert taps_prepared.values().get(("prepared",), 0) == prepared.get(("prepared",), 0) + 1
+    assert taps_prepared.values().get(("unknown_card",), 0) == prepared.get(("unknown_card",), 0) + 1
+    assert taps_confirmed.values().get(("ENTER", "confirmed"), 0) == confirmed.get(("ENTER", "confirmed"), 0) + 1
+    assert unknown_card_logs.values().get((), 0) == unknown.get((), 0) + 1
+
+    assert client.get("/metrics").status_code == 404
+    monkeypatch.setattr(main_module, "settings", replace(main_module.settings, metrics_endpoint=True))
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = res.text
+    for name in (
+        'attendance_taps_confirmed_total{action="ENTER",outcome="confirmed"}',
+        "attendance_pending_touches ",
+        "attendance_sse_subscribers ",
+        "attendance_sse_queue_depth ",
+        "attendance_db_commit_seconds_count ",
+        'http_request_duration_seconds_count{route="POST /api/reader/touches"}',
+    ):
+        assert name in body
@@ -3,6 +3,7 @@ from datetime import timedelta
 from app.domain.enums import AttendanceAction, AttendanceStatus
 from app.domain.pending_touch import PendingTouch
 from app.domain.time_utils import now_jst
+from app.pending_touch_store import MemoryPendingTouchStore, PendingTouchStore, PendingTouchStoreStats
 
 
 def test_pending_touch_expiry():
@@ -19,3 +20,56 @@ def test_pending_touch_expiry():
     )
     assert p.is_expired(now + timedelta(seconds=21)) is True
     assert p.is_expired(now + timedelta(seconds=5)) is False
+
+
+def _pending(token: str, detected_at, ttl_seconds: int = 20) -> PendingTouch:
+    return PendingTouch(
+        touch_token=token,
+        student_id=1,
+        card_id="card",
+        reader_name="reader",
+        detected_at=detected_at,
+        current_status=AttendanceStatus.OUTSIDE,
+        allowed_actions=(AttendanceAction.ENTER,),
+        expires_at=detected_at + timedelta(seconds=ttl_seconds),
+    )
+
+
+def test_pending_touch_store_keeps_expired_tokens_for_grace_period():
+    now = now_jst()
+    store = MemoryPendingTouchStore(expired_grace_seconds=60)
+    store.put(_pending("a", now))
+
+    expired = store.get("a", now + timedelta(seconds=30))
+    assert expired is not None
+    assert expired.is_expired(now + timedelta(seconds=30)) is True
+
+    assert store.get("a", now + timedelta(seconds=81)) is None
+    assert store.stats() == PendingTouchStoreStats(size=0, capacity=PendingTouchStore.MAX_ENTRIES, expired=1, evicted=0)
+
+
+def test_pending_touch_store_evicts_soonest_expiring_when_full():
+    now = now_jst()
+    store = MemoryPendingTouchStore(max_entries=2)
+    store.put(_pending("long", now, ttl_seconds=60))
+    store.put(_pending("short", now, ttl_seconds=10))
+    store.put(_pending("new", now))
+
+    assert store.get("short", now) is None
+    assert store.get("long", now) is not None
+    assert store.get("new", now) is not None
+    assert store.stats().evicted == 1
+
+
+def test_pending_touch_store_skips_confirmed_tokens_in_expiry_order():
+    now = now_jst()
+    store = MemoryPendingTouchStore(max_entries=2)
+    store.put(_pending("a", now, ttl_seconds=5))
+    store.put(_pending("b", now, ttl_seconds=10))
+    assert store.pop("a") is not None
+    store.put(_pending("c", now))
+    store.put(_pending("d", now))
+
+    assert store.get("b", now) is None
+    assert store.stats().size == 2
+    assert store.stats().evicted == 1
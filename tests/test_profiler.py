@@ -0,0 +1,68 @@
+from dataclasses import replace
+from threading import Event, Thread
+
+from app.config import get_settings
+from app.profiler import ProfilerBusyError, SamplingProfiler
+from app.routers import admin as admin_router
+
+settings = get_settings()
+
+
+def _login(client) -> None:
+    client.post(
+        "/login",
+        data={"username": settings.admin_username, "password": settings.admin_password, "next": "/admin/today"},
+        follow_redirects=False,
+    )
+
+
+def _park_here(stop: Event) -> None:
+    stop.wait()
+
+
+def test_sampling_profiler_collapses_stacks_of_other_threads():
+    stop = Event()
+    worker = Thread(target=_park_here, args=(stop,), name="parked worker")
+    worker.start()
+    try:
+        stacks, rounds = SamplingProfiler().sample(0.05, 0.005)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert rounds > 0
+    parked = [line for line in stacks.splitlines() if line.startswith("parked_worker;")]
+    assert parked
+    stack, count = parked[0].rsplit(" ", 1)
+    assert f"{__name__}:_park_here" in stack.split(";")
+    assert int(count) > 0
+    # 採取しているスレッド自身は含めない
+    assert "app.profiler:SamplingProfiler._sample" not in stacks
+
+
+def test_sampling_profiler_runs_one_at_a_time():
+    profiler = SamplingProfiler()
+    profiler._running.acquire()
+    try:
+        try:
+            profiler.sample(0.01, 0.005)
+        except ProfilerBusyError:
+            pass
+        else:
+            raise AssertionError("ProfilerBusyError was not raised")
+    finally:
+        profiler._running.release()
+
+
+def test_profile_endpoint_requires_admin_and_opt_in(client, monkeypatch):
+    assert client.get("/api/admin/profile?seconds=0.01").status_code == 401
+
+    _login(client)
+    assert client.get("/api/admin/profile?seconds=0.01").status_code == 404
+
+    monkeypatch.setattr(admin_router, "settings", replace(settings, profiler_enabled=True))
+    res = client.get("/api/admin/profile?seconds=0.05&interval_ms=5")
+    assert res.status_code == 200
+    assert res.headers["content-disposition"].endswith('.collapsed"')
+    assert int(res.headers["x-profile-samples"]) > 0
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in res.text.splitlines())
@@ -0,0 +1,72 @@
+from datetime import date
+
+from sqlalchemy import create_engine, event, inspect, text
+
+from app.db import Base, ensure_schema_compatibility
+from app.domain.time_utils import now_jst
+from app.repositories.attendance_repository import AttendanceRepository
+from app.repositories.audit_repository import AuditRepository
+from app.repositories.unknown_card_repository import UnknownCardRepository
+import app.models  # noqa: F401
+
+
+def _query_plan(db_session, func) -> str:
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, context, executemany: statements.append(  # noqa: E731
+        (statement, parameters)
+    )
+    bind = db_session.get_bind()
+    event.listen(bind, "before_cursor_execute", listener)
+    try:
+        func()
+    finally:
+        event.remove(bind, "before_cursor_execute", listener)
+    statement, parameters = statements[-1]
+    rows = db_session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    return "\n".join(row[3] for row in rows)
+
+
+def test_today_events_search_by_occurred_at(db_session):
+    repo = AttendanceRepository(db_session)
+    plan = _query_plan(db_session, lambda: repo.list_today_events(date(2026, 4, 1)))
+    assert "SEARCH attendance_events USING INDEX ix_attendance_events_occurred_at_id" in plan
+
+
+def test_open_session_queries_use_partial_index(db_session):
+    repo = AttendanceRepository(db_session)
+    plan = _query_plan(db_session, lambda: repo.list_open_sessions_started_before(now_jst()))
+    assert "ix_attendance_sessions_open_entered_at" in plan
+
+
+def test_count_in_room_is_covered_by_status_index(db_session):
+    repo = AttendanceRepository(db_session)
+    plan = _query_plan(db_session, repo.count_in_room)
+    assert "COVERING INDEX ix_attendance_status_current_status" in plan
+
+
+def test_latest_alert_lookups_avoid_table_scan(db_session):
+    audit_plan = _query_plan(db_session, lambda: AuditRepository(db_session).get_latest_by_action("lock_alert"))
+    unknown_plan = _query_plan(db_session, UnknownCardRepository(db_session).get_latest)
+    assert "ix_audit_logs_action_id" in audit_plan
+    assert "ix_unknown_card_logs_detected_at_id" in unknown_plan
+    assert "TEMP B-TREE" not in audit_plan + unknown_plan
+
+
+def test_schema_compatibility_creates_missing_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}", future=True)
+    try:
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_attendance_events_occurred_at_id"))
+            conn.execute(text("DROP INDEX ix_attendance_sessions_open_entered_at"))
+
+        ensure_schema_compatibility(engine)
+
+        inspector = inspect(engine)
+        assert "ix_attendance_events_occurred_at_id" in {index["name"] for index in inspector.get_indexes("attendance_events")}
+        assert "ix_attendance_sessions_open_entered_at" in {
+            index["name"] for index in inspector.get_indexes("attendance_sessions")
+        }
+        ensure_schema_compatibility(engine)
+    finally:
+        engine.dispose()
@@ -1,6 +1,17 @@
+import asyncio
+import re
+
+from sqlalchemy import event, func, select
+
+from app.models.attendance_event import AttendanceEvent
+from app.models.idempotency_record import IdempotencyRecord
 from app.schemas.student import StudentCreate
 from app.domain.time_utils import now_jst
+from app.kiosk import KioskMode, kiosk_state
+from app.realtime import attendance_event_broker
+from app.routers.reader import stream_reader_state
 from app.services.student_service import StudentService
+from app.touch_panel import TouchPanelSelection, touch_panel_state
 
 
 def test_reader_touch_and_confirm_api(client, db_session):
@@ -98,3 +109,180 @@ def test_today_api_includes_student_fields_and_latest_first(client, db_session):
     assert payload["events"][0]["student_code"] == "S001"
     assert payload["events"][0]["student_name"] == "Alice"
     assert [event["event_type"] for event in payload["events"][:2]] == ["LEAVE_FINAL", "ENTER"]
+
+
+def test_reader_tap_confirms_in_one_request(client, db_session):
+    StudentService(db_session).register_student(
+        StudentCreate(student_code="S001", name="Alice", card_id="CARD1")
+    )
+    headers = {"X-Reader-Token": "dev-reader-token"}
+
+    res = client.post(
+        "/api/reader/taps",
+        headers=headers,
+        json={"card_id": "CARD1", "reader_name": "reader-a", "detected_at": "2026-04-01T09:00:00+09:00"},
+    )
+
+    assert res.status_code == 200
+    payload = res.json()
+    assert payload["outcome"] == "CONFIRMED"
+    assert payload["action"] == "ENTER"
+    assert payload["confirm"]["next_status"] == "IN_ROOM"
+
+
+def test_reader_tap_reports_touch_error_for_disallowed_selection(client, db_session):
+    StudentService(db_session).register_student(
+        StudentCreate(student_code="S001", name="Alice", card_id="CARD1")
+    )
+    headers = {"X-Reader-Token": "dev-reader-token"}
+    touch_panel_state.set_selected_action(TouchPanelSelection.LEAVE_FINAL)
+    try:
+        res = client.post(
+            "/api/reader/taps",
+            headers=headers,
+            json={"card_id": "CARD1", "reader_name": "reader-a", "detected_at": now_jst().isoformat()},
+        )
+    finally:
+        touch_panel_state.set_selected_action(TouchPanelSelection.ENTER)
+
+    assert res.status_code == 200
+    payload = res.json()
+    assert payload["outcome"] == "TOUCH_ERROR"
+    assert "使えません" in payload["message"]
+    assert touch_panel_state.get_latest_error() is not None
+
+
+def test_reader_tap_captures_card_in_admin_login_mode(client):
+    headers = {"X-Reader-Token": "dev-reader-token"}
+    kiosk_state.set_mode(KioskMode.ADMIN_LOGIN)
+    try:
+        res = client.post(
+            "/api/reader/taps",
+            headers=headers,
+            json={"card_id": "ADMIN1", "reader_name": "reader-a", "detected_at": now_jst().isoformat()},
+        )
+    finally:
+        kiosk_state.set_mode(KioskMode.ATTENDANCE)
+
+    assert res.status_code == 200
+    assert res.json()["outcome"] == "ADMIN_LOGIN_CAPTURED"
+    assert kiosk_state.get_latest_admin_login_capture().card_id == "ADMIN1"
+    kiosk_state.clear_admin_login_capture()
+
+
+def test_reader_tap_with_same_idempotency_key_is_applied_once(client, db_session):
+    StudentService(db_session).register_student(
+        StudentCreate(student_code="S001", name="Alice", card_id="CARD1")
+    )
+    headers = {"X-Reader-Token": "dev-reader-token", "Idempotency-Key": "tap-1"}
+    body = {"card_id": "CARD1", "reader_name": "reader-a", "detected_at": "2026-04-01T09:00:00+09:00"}
+
+    first = client.post("/api/reader/taps", headers=headers, json=body)
+    second = client.post("/api/reader/taps", headers=headers, json=body)
+
+    assert first.status_code == 200
+    assert second.json() == first.json()
+    assert first.json()["confirm"]["next_status"] == "IN_ROOM"
+    assert db_session.scalar(select(func.count()).select_from(AttendanceEvent)) == 1
+    # 打刻と応答の記録は1回のコミットにまとめる
+    assert re.search(r'db-commit;desc="1"', first.headers["server-timing"])
+    assert db_session.scalar(select(func.count()).select_from(IdempotencyRecord)) == 1
+
+
+def test_replayed_reader_tap_ignores_kiosk_mode_and_touch_panel(client, db_session):
+    StudentService(db_session).register_student(
+        StudentCreate(student_code="S001", name="Alice", card_id="CARD1")
+    )
+    headers = {"X-Reader-Token": "dev-reader-token"}
+    kiosk_state.set_mode(KioskMode.ADMIN_LOGIN)
+    touch_panel_state.set_selected_action(TouchPanelSelection.LEAVE_FINAL)
+    try:
+        res = client.post(
+            "/api/reader/taps",
+            headers={**headers, "Idempotency-Key": "tap-2"},
+            json={
+                "card_id": "CARD1",
+                "reader_name": "reader-a",
+                "detected_at": "2026-04-01T09:00:00+09:00",
+                "action": "ENTER",
+                "replayed": True,
+            },
+        )
+        # 操作はリーダーがタッチ時点の選択で決めて送るので、指定の無い再送は受け付けない
+        missing_action = client.post(
+            "/api/reader/taps",
+            headers={**headers, "Idempotency-Key": "tap-3"},
+            json={
+                "card_id": "CARD1",
+                "reader_name": "reader-a",
+                "detected_at": "2026-04-01T09:01:00+09:00",
+                "replayed": True,
+            },
+        )
+    finally:
+        kiosk_state.set_mode(KioskMode.ATTENDANCE)
+        touch_panel_state.set_selected_action(TouchPanelSelection.ENTER)
+
+    assert res.status_code == 200
+    assert res.json()["outcome"] == "CONFIRMED"
+    assert res.json()["action"] == "ENTER"
+    assert missing_action.status_code == 400
+
+
+def test_reader_confirm_replay_returns_original_result_from_cache(client, db_session):
+    StudentService(db_session).register_student(
+        StudentCreate(student_code="S001", name="Alice", card_id="CARD1")
+    )
+    headers = {"X-Reader-Token": "dev-reader-token"}
+    touch_body = {"card_id": "CARD1", "reader_name": "reader-a", "detected_at": "2026-04-01T09:00:00+09:00"}
+    touch = client.post("/api/reader/touches", headers={**headers, "Idempotency-Key": "touch-1"}, json=touch_body)
+    touch_replay = client.post("/api/reader/touches", headers={**headers, "Idempotency-Key": "touch-1"}, json=touch_body)
+    assert touch_replay.json() == touch.json()
+
+    token = touch.json()["touch_token"]
+    confirm_headers = {**headers, "Idempotency-Key": "confirm-1"}
+    confirm_body = {"action": "ENTER", "now": "2026-04-01T09:00:03+09:00"}
+    first = client.post(f"/api/reader/touches/{token}/confirm", headers=confirm_headers, json=confirm_body)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    try:
+        replay = client.post(f"/api/reader/touches/{token}/confirm", headers=confirm_headers, json=confirm_body)
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+
+    assert first.status_code == 200
+    assert replay.status_code == 200
+    assert replay.json() == first.json()
+    assert statements == []
+
+    without_key = client.post(f"/api/reader/touches/{token}/confirm", headers=headers, json=confirm_body)
+    assert without_key.status_code == 404
+
+
+def test_reader_stream_requires_token(client):
+    assert client.get("/api/reader/stream").status_code == 422
+    assert client.get("/api/reader/stream", headers={"X-Reader-Token": "wrong"}).status_code == 401
+
+
+def test_reader_stream_pushes_kiosk_mode_changes(monkeypatch):
+    monkeypatch.setattr(attendance_event_broker, "COALESCE_WINDOW_SECONDS", 0.01)
+
+    async def scenario() -> list[str]:
+        response = await stream_reader_state()
+        stream = response.body_iterator
+        chunks = [await anext(stream), await anext(stream)]
+        kiosk_state.set_mode(KioskMode.ADMIN_LOGIN)
+        try:
+            chunks.append(await asyncio.wait_for(anext(stream), timeout=1.0))
+        finally:
+            kiosk_state.set_mode(KioskMode.ATTENDANCE)
+            await stream.aclose()
+        return chunks
+
+    chunks = asyncio.run(scenario())
+
+    assert chunks[0] == "retry: 1000\n"
+    assert chunks[1] == 'event: reader_state\ndata: {"mode":"ATTENDANCE","selected_action":"ENTER"}\n\n'
+    assert chunks[2] == 'event: reader_state\ndata: {"mode":"ADMIN_LOGIN","selected_action":"ENTER"}\n\n'
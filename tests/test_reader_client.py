@@ -1,8 +1,10 @@
 from datetime import datetime
+import json
 
 import httpx
+import pytest
 
-from reader.client import ReaderApiClient
+from reader.client import ReaderApiClient, TapEndpointUnavailableError
 
 
 def test_reader_client_prepare_and_confirm(monkeypatch):
@@ -66,3 +68,138 @@ def test_reader_client_prepare_and_confirm(monkeypatch):
 
     confirm = client.confirm_touch("tok123", "ENTER", datetime.now().astimezone())
     assert confirm["next_status"] == "IN_ROOM"
+
+
+def test_reader_client_reuses_one_pooled_client(monkeypatch):
+    created = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.headers["X-Reader-Token"] == "token"
+        return httpx.Response(200, json={"mode": "ATTENDANCE", "selected_action": "ENTER"})
+
+    class PatchedClient(httpx.Client):
+        def __init__(self, *args, **kwargs):
+            kwargs["transport"] = httpx.MockTransport(handler)
+            super().__init__(*args, **kwargs)
+            created.append(self)
+
+    monkeypatch.setattr("reader.client.httpx.Client", PatchedClient)
+
+    with ReaderApiClient(base_url="http://localhost:8000", reader_token="token") as client:
+        client.get_kiosk_mode()
+        client.get_touch_panel_action()
+        client.get_kiosk_mode()
+        assert len(created) == 1
+
+    assert created[0].is_closed
+
+
+def test_reader_client_reconnects_after_server_restart(monkeypatch):
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(str(request.url))
+        if len(attempts) == 1:
+            raise httpx.RemoteProtocolError("Server disconnected without sending a response.", request=request)
+        return httpx.Response(200, json={"mode": "ATTENDANCE"})
+
+    class PatchedClient(httpx.Client):
+        def __init__(self, *args, **kwargs):
+            kwargs["transport"] = httpx.MockTransport(handler)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr("reader.client.httpx.Client", PatchedClient)
+    client = ReaderApiClient(base_url="http://localhost:8000", reader_token="token")
+
+    assert client.get_kiosk_mode() == {"mode": "ATTENDANCE"}
+    assert len(attempts) == 2
+
+
+def test_reader_client_tap_detects_older_server(monkeypatch):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/reader/taps":
+            return httpx.Response(404, json={"detail": "Not Found"})
+        return httpx.Response(404, json={"detail": "未登録のカードです"})
+
+    class PatchedClient(httpx.Client):
+        def __init__(self, *args, **kwargs):
+            kwargs["transport"] = httpx.MockTransport(handler)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr("reader.client.httpx.Client", PatchedClient)
+    client = ReaderApiClient(base_url="http://localhost:8000", reader_token="token")
+
+    with pytest.raises(TapEndpointUnavailableError):
+        client.tap("CARD1", "dummy", datetime.now().astimezone())
+    assert client.supports_tap is False
+
+    with pytest.raises(httpx.HTTPStatusError):
+        client.prepare_touch("CARD1", "dummy", datetime.now().astimezone())
+
+
+def test_reader_client_resends_confirm_with_same_idempotency_key(monkeypatch):
+    keys = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        keys.append(request.headers.get("Idempotency-Key"))
+        if len(keys) == 1:
+            raise httpx.ReadTimeout("timed out", request=request)
+        return httpx.Response(200, json={"next_status": "IN_ROOM"})
+
+    class PatchedClient(httpx.Client):
+        def __init__(self, *args, **kwargs):
+            kwargs["transport"] = httpx.MockTransport(handler)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr("reader.client.httpx.Client", PatchedClient)
+    client = ReaderApiClient(base_url="http://localhost:8000", reader_token="token")
+
+    assert client.confirm_touch("tok123", "ENTER", datetime.now().astimezone()) == {"next_status": "IN_ROOM"}
+    assert len(keys) == 2
+    assert keys[0] is not None and keys[0] == keys[1]
+
+
+def test_reader_client_tap_sends_idempotency_key_in_header_only(monkeypatch):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json={"outcome": "CONFIRMED"})
+
+    class PatchedClient(httpx.Client):
+        def __init__(self, *args, **kwargs):
+            kwargs["transport"] = httpx.MockTransport(handler)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr("reader.client.httpx.Client", PatchedClient)
+    client = ReaderApiClient(base_url="http://localhost:8000", reader_token="token")
+
+    client.tap("CARD1", "dummy", datetime.now().astimezone(), "ENTER", idempotency_key="tap-1")
+
+    assert requests[0].headers["Idempotency-Key"] == "tap-1"
+    assert "idempotency_key" not in json.loads(requests[0].content)
+
+
+def test_reader_client_touch_calls_use_given_idempotency_key(monkeypatch):
+    keys = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        keys.append(request.headers.get("Idempotency-Key"))
+        return httpx.Response(200, json={"touch_token": "tok123"})
+
+    class PatchedClient(httpx.Client):
+        def __init__(self, *args, **kwargs):
+            kwargs["transport"] = httpx.MockTransport(handler)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr("reader.client.httpx.Client", PatchedClient)
+    client = ReaderApiClient(base_url="http://localhost:8000", reader_token="token")
+    now = datetime.now().astimezone()
+
+    client.prepare_touch("CARD1", "dummy", now, idempotency_key="touch-1")
+    client.confirm_touch("tok123", "ENTER", now, idempotency_key="confirm-1")
+    client.prepare_touch("CARD1", "dummy", now)
+
+    assert keys[:2] == ["touch-1", "confirm-1"]
+    # 指定が無ければ呼び出しごとに新しいキーを付ける
+    assert keys[2] not in (None, "touch-1")
@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from reader import main as reader_main
+from reader.journal import JournaledTap, JournalReplayer, TapJournal
+from reader.state_mirror import ReaderStateMirror
+
+JST = timezone(timedelta(hours=9))
+
+
+def _tap(key: str, minute: int = 0) -> JournaledTap:
+    return JournaledTap(key, "CARD1", "reader-a", datetime(2026, 4, 1, 9, minute, tzinfo=JST), "ENTER", "ATTENDANCE", "ENTER")
+
+
+def _status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://localhost:8000/api/reader/taps")
+    response = httpx.Response(status_code, json={"detail": "error"}, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+class RecordingClient:
+    supports_tap = True
+    base_url = "http://localhost:8000"
+
+    def __init__(self, failures=None, state=None):
+        self.calls = []
+        self.actions = []
+        self.failures = list(failures or [])
+        self.state_mirror = ReaderStateMirror(self)
+        if state is not None:
+            self.state_mirror.apply("reader_state", state)
+
+    def tap(self, card_id, reader_name, detected_at, action="auto", idempotency_key=None, replayed=False):
+        self.calls.append((idempotency_key, detected_at, replayed))
+        self.actions.append(action)
+        if self.failures:
+            raise self.failures.pop(0)
+        return {"outcome": "CONFIRMED", "action": "ENTER", "confirm": {"next_status": "IN_ROOM"}}
+
+
+def test_journal_survives_restart_and_skips_torn_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = TapJournal(path)
+    journal.append(_tap("a", 0))
+    journal.append(_tap("b", 1))
+    journal.acknowledge("a")
+    with path.open("a", encoding="utf-8") as fp:
+        fp.write('{"type": "tap", "idempotency_key": "c", "card')
+
+    reloaded = TapJournal(path)
+    assert reloaded.pending() == [_tap("b", 1)]
+
+    reloaded.acknowledge("b")
+    assert path.read_text(encoding="utf-8") == ""
+    assert TapJournal(path).has_pending() is False
+
+
+def test_replayer_sends_in_order_and_waits_while_server_is_down(tmp_path):
+    journal = TapJournal(tmp_path / "journal.jsonl")
+    for index, key in enumerate(["a", "b", "c"]):
+        journal.append(_tap(key, index))
+    client = RecordingClient(failures=[httpx.ConnectError("down")])
+    replayer = JournalReplayer(journal, client)
+
+    assert replayer.replay_pending() is False
+    assert [tap.idempotency_key for tap in journal.pending()] == ["a", "b", "c"]
+
+    assert replayer.replay_pending() is True
+    assert [call[0] for call in client.calls] == ["a", "a", "b", "c"]
+    assert all(replayed for _, _, replayed in client.calls)
+    assert client.calls[1][1] == datetime(2026, 4, 1, 9, 0, tzinfo=JST)
+    assert journal.has_pending() is False
+
+
+def test_replayer_drops_permanently_rejected_tap(tmp_path, monkeypatch):
+    monkeypatch.setattr(reader_main.logger, "error", lambda *args, **kwargs: None)
+    journal = TapJournal(tmp_path / "journal.jsonl")
+    journal.append(_tap("unknown", 0))
+    journal.append(_tap("next", 1))
+    client = RecordingClient(failures=[_status_error(404)])
+
+    assert JournalReplayer(journal, client).replay_pending() is True
+    assert [call[0] for call in client.calls] == ["unknown", "next"]
+    assert journal.has_pending() is False
+
+
+def test_run_once_journals_tap_when_server_is_unreachable(tmp_path, monkeypatch):
+    monkeypatch.setattr(reader_main.logger, "warning", lambda *args, **kwargs: None)
+    journal = TapJournal(tmp_path / "journal.jsonl")
+    replayer = JournalReplayer(journal, RecordingClient())
+    client = RecordingClient(failures=[_status_error(503)], state={"mode": "ATTENDANCE", "selected_action": "ENTER"})
+    debouncer = reader_main.Debouncer(cooldown_seconds=0)
+
+    reader_main.run_once(client, debouncer, "CARD1", "reader-a", "auto", replayer)
+    pending = journal.pending()
+    assert [tap.idempotency_key for tap in pending] == [client.calls[0][0]]
+
+    # 未送信が残っている間の打刻はサーバーへ直接送らず、ジャーナルの後ろに並べる
+    reader_main.run_once(client, debouncer, "CARD2", "reader-a", "auto", replayer)
+    assert len(client.calls) == 1
+    assert [tap.card_id for tap in journal.pending()] == ["CARD1", "CARD2"]
+
+
+def test_run_tap_journals_last_known_selection_while_disconnected(tmp_path, monkeypatch):
+    monkeypatch.setattr(reader_main.logger, "warning", lambda *args, **kwargs: None)
+    journal = TapJournal(tmp_path / "journal.jsonl")
+    replay_client = RecordingClient()
+    replayer = JournalReplayer(journal, replay_client)
+    client = RecordingClient(failures=[httpx.ConnectError("down")] * 2)
+    detected_at = datetime(2026, 4, 1, 18, 0, tzinfo=JST)
+
+    # 画面状態を一度も受け取っていなければ、入退室かどうか分からないので貯めない
+    with pytest.raises(httpx.ConnectError):
+        reader_main.run_tap(client, "CARD1", "reader-a", "auto", detected_at, replayer)
+    assert journal.pending() == []
+
+    client.state_mirror.apply("reader_state", {"mode": "ATTENDANCE", "selected_action": "LEAVE_FINAL"})
+    client.state_mirror.invalidate()
+    assert client.state_mirror.current() is None
+    assert reader_main.run_tap(client, "CARD1", "reader-a", "auto", detected_at, replayer) is True
+
+    # 切断前に選ばれていた「退出」で確定するよう、具体的な操作を貯めて再送する
+    [tap] = TapJournal(tmp_path / "journal.jsonl").pending()
+    assert (tap.action, tap.mode, tap.selected_action) == ("LEAVE_FINAL", "ATTENDANCE", "LEAVE_FINAL")
+    assert replayer.replay_pending() is True
+    assert replay_client.actions == ["LEAVE_FINAL"]
+
+
+def test_replayer_skips_entries_without_attendance_state(tmp_path, monkeypatch):
+    monkeypatch.setattr("reader.journal.logger.error", lambda *args, **kwargs: None)
+    path = tmp_path / "journal.jsonl"
+    # 画面状態を持たない古い形式の行
+    path.write_text(
+        '{"type": "tap", "idempotency_key": "old", "card_id": "CARD1", "reader_name": "reader-a", '
+        '"detected_at": "2026-04-01T09:00:00+09:00", "action": "auto"}\n',
+        encoding="utf-8",
+    )
+    journal = TapJournal(path)
+    journal.append(_tap("new", 1))
+    client = RecordingClient()
+
+    assert JournalReplayer(journal, client).replay_pending() is True
+    assert [call[0] for call in client.calls] == ["new"]
+    assert journal.has_pending() is False
@@ -10,6 +10,21 @@ def silence_reader_logger(monkeypatch):
     monkeypatch.setattr(reader_main.logger, "error", lambda *args, **kwargs: None)
 
 
+class ClosableClient:
+    instances = []
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.closed = False
+        ClosableClient.instances.append(self)
+
+    def close(self):
+        self.closed = True
+
+    def stream_reader_state(self):
+        return iter(())
+
+
 def make_args(**overrides):
     base = {
         "base_url": "http://localhost:8000",
@@ -22,32 +37,37 @@ def make_args(**overrides):
         "count": 1,
         "loop": False,
         "device_keyword": "SONY FeliCa",
+        "journal_path": "reader-journal.jsonl",
+        "replay_interval": 0.1,
     }
     base.update(overrides)
     return Namespace(**base)
 
 
-def test_main_uses_dummy_mode_when_card_id_is_present(monkeypatch):
-    monkeypatch.setattr(reader_main, "parse_args", lambda: make_args(card_id="CARD1"))
-    monkeypatch.setattr(reader_main, "ReaderApiClient", lambda **kwargs: object())
+def test_main_uses_dummy_mode_when_card_id_is_present(monkeypatch, tmp_path):
+    monkeypatch.setattr(reader_main, "parse_args", lambda: make_args(card_id="CARD1", journal_path=tmp_path / "journal.jsonl"))
+    monkeypatch.setattr(reader_main, "configure_logger", lambda: reader_main.logger)
+    monkeypatch.setattr(reader_main, "ReaderApiClient", ClosableClient)
     monkeypatch.setattr(reader_main, "Debouncer", lambda cooldown_seconds: object())
     calls = []
-    monkeypatch.setattr(reader_main, "run_dummy_mode", lambda args, client, debouncer: calls.append(args.card_id) or 0)
-    monkeypatch.setattr(reader_main, "run_real_mode", lambda args, client, debouncer: 1)
+    monkeypatch.setattr(reader_main, "run_dummy_mode", lambda args, client, debouncer, replayer=None: calls.append(args.card_id) or 0)
+    monkeypatch.setattr(reader_main, "run_real_mode", lambda args, client, debouncer, replayer=None: 1)
 
     result = reader_main.main()
 
     assert result == 0
     assert calls == ["CARD1"]
+    assert ClosableClient.instances[-1].closed is True
 
 
-def test_main_uses_real_mode_when_card_id_is_missing(monkeypatch):
-    monkeypatch.setattr(reader_main, "parse_args", lambda: make_args(card_id=None))
-    monkeypatch.setattr(reader_main, "ReaderApiClient", lambda **kwargs: object())
+def test_main_uses_real_mode_when_card_id_is_missing(monkeypatch, tmp_path):
+    monkeypatch.setattr(reader_main, "parse_args", lambda: make_args(card_id=None, journal_path=tmp_path / "journal.jsonl"))
+    monkeypatch.setattr(reader_main, "configure_logger", lambda: reader_main.logger)
+    monkeypatch.setattr(reader_main, "ReaderApiClient", ClosableClient)
     monkeypatch.setattr(reader_main, "Debouncer", lambda cooldown_seconds: object())
     calls = []
-    monkeypatch.setattr(reader_main, "run_dummy_mode", lambda args, client, debouncer: 1)
-    monkeypatch.setattr(reader_main, "run_real_mode", lambda args, client, debouncer: calls.append(args.device_keyword) or 0)
+    monkeypatch.setattr(reader_main, "run_dummy_mode", lambda args, client, debouncer, replayer=None: 1)
+    monkeypatch.setattr(reader_main, "run_real_mode", lambda args, client, debouncer, replayer=None: calls.append(args.device_keyword) or 0)
 
     result = reader_main.main()
 
@@ -81,7 +101,7 @@ def test_build_card_event_handler_processes_insert(monkeypatch):
     silence_reader_logger(monkeypatch)
     calls = []
 
-    def fake_run_once(client, debouncer, card_id, reader_name, action):
+    def fake_run_once(client, debouncer, card_id, reader_name, action, replayer=None):
         calls.append((card_id, reader_name, action))
 
     monkeypatch.setattr(reader_main, "run_once", fake_run_once)
@@ -93,9 +113,41 @@ def test_build_card_event_handler_processes_insert(monkeypatch):
     assert calls == [("CARD1", "reader-a", "auto")]
 
 
+def test_build_card_event_handler_enqueues_to_pipeline(monkeypatch):
+    silence_reader_logger(monkeypatch)
+    run_once_calls = []
+    monkeypatch.setattr(reader_main, "run_once", lambda *args, **kwargs: run_once_calls.append(args))
+
+    class RecordingPipeline:
+        def __init__(self):
+            self.submitted = []
+
+        def submit(self, card_id, detected_at):
+            self.submitted.append(card_id)
+            return True
+
+    pipeline = RecordingPipeline()
+    handler = reader_main.build_card_event_handler(object(), object(), "reader-a", "auto", pipeline=pipeline)
+
+    handler("insert", "CARD1")
+
+    assert pipeline.submitted == ["CARD1"]
+    assert run_once_calls == []
+
+
+def test_tap_worker_passes_detection_time(monkeypatch):
+    calls = []
+    monkeypatch.setattr(reader_main, "run_once", lambda *args, **kwargs: calls.append(kwargs["detected_at"]))
+    detected_at = reader_main.datetime(2026, 4, 1, 9, 0).astimezone()
+
+    reader_main.build_tap_worker(object(), object(), "reader-a", "auto")("CARD1", detected_at)
+
+    assert calls == [detected_at]
+
+
 def test_build_card_event_handler_swallows_processing_errors(monkeypatch):
     silence_reader_logger(monkeypatch)
-    def fake_run_once(client, debouncer, card_id, reader_name, action):
+    def fake_run_once(client, debouncer, card_id, reader_name, action, replayer=None):
         raise RuntimeError("boom")
 
     monkeypatch.setattr(reader_main, "run_once", fake_run_once)
@@ -128,7 +180,7 @@ def test_summarize_http_error_uses_response_detail():
 def test_build_card_event_handler_swallows_http_errors(monkeypatch):
     silence_reader_logger(monkeypatch)
 
-    def fake_run_once(client, debouncer, card_id, reader_name, action):
+    def fake_run_once(client, debouncer, card_id, reader_name, action, replayer=None):
         request = httpx.Request("POST", "http://localhost:8000/api/reader/touches")
         response = httpx.Response(404, json={"detail": "未登録のカードです"}, request=request)
         raise httpx.HTTPStatusError("not found", request=request, response=response)
@@ -247,3 +299,55 @@ def test_run_once_captures_touch_error_for_invalid_selected_action(monkeypatch):
     assert client.calls[0] == ("prepare", "CARD4", "reader-a")
     assert client.calls[1][0] == "error"
     assert "使えません" in client.calls[1][1]
+
+
+def test_run_once_uses_tap_endpoint_when_available(monkeypatch):
+    silence_reader_logger(monkeypatch)
+
+    class TapClient:
+        supports_tap = True
+        base_url = "http://localhost:8000"
+
+        def __init__(self):
+            self.calls = []
+
+        def tap(self, card_id, reader_name, detected_at, action, idempotency_key=None, replayed=False):
+            self.calls.append(("tap", card_id, action))
+            return {"outcome": "CONFIRMED", "action": "ENTER", "confirm": {"next_status": "IN_ROOM"}}
+
+    client = TapClient()
+    debouncer = reader_main.Debouncer(cooldown_seconds=0)
+
+    reader_main.run_once(client, debouncer, "CARD5", "reader-a", "auto")
+
+    assert client.calls == [("tap", "CARD5", "auto")]
+
+
+def test_run_once_falls_back_when_tap_endpoint_is_missing(monkeypatch):
+    silence_reader_logger(monkeypatch)
+
+    class OldServerClient:
+        supports_tap = True
+        base_url = "http://localhost:8000"
+
+        def __init__(self):
+            self.calls = []
+
+        def tap(self, card_id, reader_name, detected_at, action, idempotency_key=None, replayed=False):
+            self.supports_tap = False
+            raise reader_main.TapEndpointUnavailableError("missing")
+
+        def get_kiosk_mode(self):
+            return {"mode": "STUDENT_REGISTER"}
+
+        def capture_student_card(self, card_id, reader_name, detected_at):
+            self.calls.append(("student", card_id))
+            return {"ok": True}
+
+    client = OldServerClient()
+    debouncer = reader_main.Debouncer(cooldown_seconds=0)
+
+    reader_main.run_once(client, debouncer, "CARD6", "reader-a", "auto")
+
+    assert client.calls == [("student", "CARD6")]
+    assert client.supports_tap is False
@@ -0,0 +1,103 @@
+from datetime import datetime
+from threading import Event, Thread
+import time
+
+from reader.pipeline import TapPipeline
+
+
+def _wait_until_empty(pipeline, release):
+    for _ in range(100):
+        if pipeline.queue_depth() == 0:
+            return
+        release.wait(0.01)
+
+
+def test_pipeline_submit_does_not_wait_for_slow_handler_and_waits_when_full():
+    release = Event()
+    processed = []
+
+    def handler(card_id, detected_at):
+        release.wait(timeout=5)
+        processed.append(card_id)
+
+    pipeline = TapPipeline(handler, workers=1, max_queue_size=2)
+    pipeline.start()
+    try:
+        now = datetime.now().astimezone()
+        assert pipeline.submit("CARD1", now) is True
+        # ワーカーが CARD1 を取り出して止まるのを待ってから積む
+        _wait_until_empty(pipeline, release)
+        assert pipeline.submit("CARD2", now) is True
+        assert pipeline.submit("CARD3", now) is True
+
+        # 満杯なら捨てずに空くまで待つ
+        results = []
+        blocked = Thread(target=lambda: results.append(pipeline.submit("CARD4", now)))
+        blocked.start()
+        blocked.join(timeout=0.1)
+        assert blocked.is_alive()
+        assert pipeline.metrics().queue_depth == 2
+        release.set()
+        blocked.join(timeout=5)
+        assert results == [True]
+    finally:
+        release.set()
+        pipeline.stop()
+
+    metrics = pipeline.metrics()
+    assert processed == ["CARD1", "CARD2", "CARD3", "CARD4"]
+    assert metrics.submitted == 4
+    assert metrics.processed == 4
+    assert metrics.waited == 1
+    assert metrics.dropped == 0
+    assert metrics.max_queue_depth == 2
+    assert metrics.latency_max_ms is not None
+
+
+def test_pipeline_stop_gives_up_on_full_queue_after_timeout():
+    release = Event()
+    pipeline = TapPipeline(lambda card_id, detected_at: release.wait(timeout=5), workers=1, max_queue_size=1)
+    pipeline.start()
+    now = datetime.now().astimezone()
+    try:
+        pipeline.submit("CARD1", now)
+        _wait_until_empty(pipeline, release)
+        pipeline.submit("CARD2", now)
+
+        started = time.monotonic()
+        pipeline.stop(timeout=0.2)
+        assert time.monotonic() - started < 1.0
+        # 停止後は待たずに捨てる
+        assert pipeline.submit("CARD3", now) is False
+        assert pipeline.metrics().dropped == 1
+    finally:
+        release.set()
+
+
+def test_pipeline_keeps_order_per_card_across_workers():
+    processed = []
+    pipeline = TapPipeline(lambda card_id, detected_at: processed.append((card_id, detected_at)), workers=3)
+    pipeline.start()
+    now = datetime.now().astimezone()
+    try:
+        for second in range(5):
+            for card_id in ("CARD1", "CARD2", "CARD3"):
+                pipeline.submit(card_id, now.replace(second=second))
+    finally:
+        pipeline.stop()
+
+    for card_id in ("CARD1", "CARD2", "CARD3"):
+        seconds = [detected_at.second for processed_id, detected_at in processed if processed_id == card_id]
+        assert seconds == [0, 1, 2, 3, 4]
+    assert pipeline.metrics().failed == 0
+
+
+def test_pipeline_counts_handler_failures():
+    def handler(card_id, detected_at):
+        raise RuntimeError("boom")
+
+    pipeline = TapPipeline(handler)
+    pipeline.submit("CARD1", datetime.now().astimezone())
+    pipeline.process_next(pipeline._queues[0], timeout=1)
+
+    assert pipeline.metrics().failed == 1
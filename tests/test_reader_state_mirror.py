@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from reader import main as reader_main
+from reader.client import ReaderApiClient
+from reader.journal import JournalReplayer, TapJournal
+from reader.state_mirror import ReaderStateMirror
+
+JST = timezone(timedelta(hours=9))
+
+
+class StreamSource:
+    def __init__(self, events):
+        self.events = events
+
+    def stream_reader_state(self):
+        yield from self.events
+
+
+def test_mirror_tracks_stream_and_forgets_state_on_disconnect():
+    source = StreamSource([])
+    mirror = ReaderStateMirror(source)
+    seen = []
+
+    def events():
+        yield "reader_state", {"mode": "ATTENDANCE", "selected_action": "ENTER"}
+        seen.append(mirror.current())
+        yield "other", {"mode": "ignored"}
+        yield "reader_state", {"mode": "ADMIN_LOGIN", "selected_action": "ENTER"}
+        seen.append(mirror.current())
+        raise httpx.ReadTimeout("silent")
+
+    source.stream_reader_state = events
+    with pytest.raises(httpx.ReadTimeout):
+        mirror.follow()
+
+    assert [(state.mode, state.selected_action) for state in seen] == [("ATTENDANCE", "ENTER"), ("ADMIN_LOGIN", "ENTER")]
+    # 切断中の値は古いかもしれないので使わせない
+    assert mirror.current() is None
+    # ジャーナルに残す打刻には、切断前に最後に受け取った状態を使う
+    assert mirror.last_known() == seen[-1]
+
+
+def test_client_answers_mode_queries_from_mirror_without_requests(monkeypatch):
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise AssertionError(f"unexpected request {request.url}")
+
+    transport = httpx.MockTransport(handler)
+
+    class PatchedClient(httpx.Client):
+        def __init__(self, *args, **kwargs):
+            kwargs["transport"] = transport
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr("reader.client.httpx.Client", PatchedClient)
+    client = ReaderApiClient(base_url="http://localhost:8000", reader_token="token")
+    client.state_mirror = ReaderStateMirror(client)
+    client.state_mirror.apply("reader_state", {"mode": "STUDENT_REGISTER", "selected_action": "TERM_TOTAL"})
+
+    assert client.get_kiosk_mode() == {"mode": "STUDENT_REGISTER"}
+    assert client.get_touch_panel_action() == {"selected_action": "TERM_TOTAL"}
+
+
+def test_client_parses_reader_stream(monkeypatch):
+    body = (
+        "retry: 1000\n"
+        'event: reader_state\ndata: {"mode": "ATTENDANCE", "selected_action": "ENTER"}\n\n'
+        ": keepalive\n\n"
+        'event: reader_state\ndata: {"mode": "ADMIN_LOGIN", "selected_action": "ENTER"}\n\n'
+    )
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/api/reader/stream"
+        assert request.headers["X-Reader-Token"] == "token"
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    transport = httpx.MockTransport(handler)
+
+    class PatchedClient(httpx.Client):
+        def __init__(self, *args, **kwargs):
+            kwargs["transport"] = transport
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr("reader.client.httpx.Client", PatchedClient)
+    client = ReaderApiClient(base_url="http://localhost:8000", reader_token="token")
+
+    assert list(client.stream_reader_state()) == [
+        ("reader_state", {"mode": "ATTENDANCE", "selected_action": "ENTER"}),
+        ("reader_state", {"mode": "ADMIN_LOGIN", "selected_action": "ENTER"}),
+    ]
+
+
+class FailingTapClient:
+    supports_tap = True
+    base_url = "http://localhost:8000"
+
+    def __init__(self, state_mirror):
+        self.state_mirror = state_mirror
+
+    def tap(self, card_id, reader_name, detected_at, action="auto", idempotency_key=None, replayed=False):
+        raise httpx.ConnectError("down")
+
+
+def test_run_tap_does_not_journal_capture_modes(tmp_path, monkeypatch):
+    monkeypatch.setattr(reader_main.logger, "warning", lambda *args, **kwargs: None)
+    mirror = ReaderStateMirror(StreamSource([]))
+    client = FailingTapClient(mirror)
+    journal = TapJournal(tmp_path / "journal.jsonl")
+    replayer = JournalReplayer(journal, client)
+    detected_at = datetime(2026, 4, 1, 9, 0, tzinfo=JST)
+
+    # 再送すると入退室として処理されてしまうので、ログイン待ちのタッチは貯めずに失敗させる
+    mirror.apply("reader_state", {"mode": "ADMIN_LOGIN", "selected_action": "ENTER"})
+    with pytest.raises(httpx.ConnectError):
+        reader_main.run_tap(client, "CARD1", "reader-a", "auto", detected_at, replayer)
+    assert journal.pending() == []
+
+    mirror.apply("reader_state", {"mode": "ATTENDANCE", "selected_action": "ENTER"})
+    assert reader_main.run_tap(client, "CARD1", "reader-a", "auto", detected_at, replayer) is True
+    assert [tap.card_id for tap in journal.pending()] == ["CARD1"]
@@ -0,0 +1,75 @@
+import asyncio
+
+from app.realtime import (
+    ALERT_RAISED,
+    EVENT_APPENDED,
+    REFRESH,
+    STATUS_CHANGED,
+    AttendanceEventBroker,
+    BrokerEvent,
+    coalesce_events,
+)
+
+
+def test_coalesce_keeps_all_appended_events_and_latest_status():
+    events = [
+        BrokerEvent(EVENT_APPENDED, {"id": 1}),
+        BrokerEvent(STATUS_CHANGED, {"student_id": 1, "current_status": "IN_ROOM"}),
+        BrokerEvent(EVENT_APPENDED, {"id": 2}),
+        BrokerEvent(STATUS_CHANGED, {"student_id": 1, "current_status": "OUT_ON_BREAK"}),
+        BrokerEvent(STATUS_CHANGED, {"student_id": 2, "current_status": "IN_ROOM"}),
+        BrokerEvent(ALERT_RAISED, {"kind": "lock_alert", "alert": {}}),
+    ]
+
+    assert coalesce_events(events) == [
+        BrokerEvent(EVENT_APPENDED, {"id": 1}),
+        BrokerEvent(EVENT_APPENDED, {"id": 2}),
+        BrokerEvent(STATUS_CHANGED, {"student_id": 1, "current_status": "OUT_ON_BREAK"}),
+        BrokerEvent(STATUS_CHANGED, {"student_id": 2, "current_status": "IN_ROOM"}),
+        BrokerEvent(ALERT_RAISED, {"kind": "lock_alert", "alert": {}}),
+    ]
+
+
+def test_coalesce_refresh_supersedes_deltas():
+    events = [BrokerEvent(EVENT_APPENDED, {"id": 1}), BrokerEvent(REFRESH), BrokerEvent(REFRESH)]
+    assert coalesce_events(events) == [BrokerEvent(REFRESH)]
+
+
+def test_sse_format_keeps_refresh_as_plain_message():
+    assert BrokerEvent(REFRESH).to_sse() == "data: refresh\n\n"
+    assert BrokerEvent(STATUS_CHANGED, {"student_id": 1, "name": "青木"}).to_sse() == (
+        'event: status_changed\ndata: {"student_id": 1, "name": "青木"}\n\n'
+    )
+
+
+def test_broker_delivers_burst_as_one_batch():
+    broker = AttendanceEventBroker()
+    broker.COALESCE_WINDOW_SECONDS = 0.01
+
+    async def scenario() -> list[BrokerEvent]:
+        async with broker.subscribe() as subscription:
+            for status in ("IN_ROOM", "OUT_ON_BREAK", "IN_ROOM"):
+                broker.publish(STATUS_CHANGED, {"student_id": 1, "current_status": status})
+            return await asyncio.wait_for(subscription.next_batch(), timeout=1.0)
+
+    batch = asyncio.run(scenario())
+    assert batch == [BrokerEvent(STATUS_CHANGED, {"student_id": 1, "current_status": "IN_ROOM"})]
+
+
+def test_broker_bounds_slow_subscriber_and_falls_back_to_refresh():
+    broker = AttendanceEventBroker()
+    broker.COALESCE_WINDOW_SECONDS = 0.0
+    broker.MAX_PENDING_PER_SUBSCRIBER = 3
+
+    async def scenario() -> tuple[list[BrokerEvent], list[BrokerEvent]]:
+        async with broker.subscribe() as subscription:
+            for event_id in range(10):
+                broker.publish(EVENT_APPENDED, {"id": event_id})
+            first = await asyncio.wait_for(subscription.next_batch(), timeout=1.0)
+            broker.publish(EVENT_APPENDED, {"id": 10})
+            second = await asyncio.wait_for(subscription.next_batch(), timeout=1.0)
+            return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == [BrokerEvent(REFRESH)]
+    assert second == [BrokerEvent(EVENT_APPENDED, {"id": 10})]
@@ -0,0 +1,89 @@
+import re
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.config import get_settings
+from app.request_metrics import RequestMetrics, _current_request, request_metrics_registry
+from app.schemas.student import StudentCreate
+from app.services.student_service import StudentService
+
+settings = get_settings()
+HEADERS = {"X-Reader-Token": "dev-reader-token"}
+
+
+def test_server_timing_counts_sql_run_in_worker_pool(client, db_session):
+    request_metrics_registry.reset()
+    StudentService(db_session).register_student(StudentCreate(student_code="S001", name="Alice", card_id="CARD1"))
+
+    res = client.post(
+        "/api/reader/taps",
+        headers=HEADERS,
+        json={"card_id": "CARD1", "reader_name": "reader-a", "detected_at": "2026-04-01T09:00:00+09:00"},
+    )
+
+    assert res.status_code == 200
+    timing = res.headers["server-timing"]
+    assert timing.startswith("app;dur=")
+    # 打刻は reader 用のスレッドで処理されるが、その SQL とコミットもこの要求に数えられる
+    statements = int(re.search(r'sql;dur=[\d.]+;desc="(\d+) statements"', timing).group(1))
+    commits = int(re.search(r'db-commit;desc="(\d+)"', timing).group(1))
+    assert statements > 0
+    assert commits > 0
+
+    stats = request_metrics_registry.snapshot()["POST /api/reader/taps"]
+    assert stats["count"] == 1
+    assert stats["commits"] == commits
+    assert sum(stats["sql_count"]["buckets"].values()) == 1
+    assert stats["sql_count"]["sum"] == statements
+
+
+def test_request_metrics_group_by_route_template(client, db_session):
+    request_metrics_registry.reset()
+    StudentService(db_session).register_student(StudentCreate(student_code="S001", name="Alice", card_id="CARD1"))
+    for minute in ("00", "05"):
+        touch = client.post(
+            "/api/reader/touches",
+            headers=HEADERS,
+            json={"card_id": "CARD1", "reader_name": "reader-a", "detected_at": f"2026-04-01T09:{minute}:00+09:00"},
+        ).json()
+        action = "ENTER" if minute == "00" else "LEAVE_FINAL"
+        client.post(f"/api/reader/touches/{touch['touch_token']}/confirm", headers=HEADERS, json={"action": action})
+    client.get("/no-such-page")
+
+    snapshot = request_metrics_registry.snapshot()
+
+    assert snapshot["POST /api/reader/touches/{touch_token}/confirm"]["count"] == 2
+    assert snapshot["POST /api/reader/touches"]["count"] == 2
+    assert snapshot["unmatched"]["count"] == 1
+
+
+def test_failed_statement_leaves_nothing_on_connection(db_session):
+    connection = db_session.connection()
+    info_before = dict(connection.info)
+    metrics = RequestMetrics()
+    token = _current_request.set(metrics)
+    try:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.execute(text("SELECT * FROM no_such_table"))
+        connection.execute(text("SELECT 1"))
+    finally:
+        _current_request.reset(token)
+
+    # 失敗した文は数えず、開始時刻も接続に残さない
+    assert metrics.sql_count == 1
+    assert dict(connection.info) == info_before
+
+
+def test_admin_request_metrics_requires_login(client):
+    assert client.get("/api/admin/request-metrics").status_code == 401
+    client.post(
+        "/login",
+        data={"username": settings.admin_username, "password": settings.admin_password, "next": "/admin/today"},
+        follow_redirects=False,
+    )
+    res = client.get("/api/admin/request-metrics")
+    assert res.status_code == 200
+    assert "GET /api/admin/request-metrics" in res.json()
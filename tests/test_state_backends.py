@@ -0,0 +1,123 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.card_index import CardIndex
+from app.db import Base
+from app.domain.enums import AttendanceAction, AttendanceStatus
+from app.domain.pending_touch import PendingTouch
+from app.domain.time_utils import now_jst
+from app.kiosk import KioskMode, KioskState
+from app.pending_touch_store import SqlPendingTouchStore
+from app.repositories.student_repository import StudentRepository
+from app.state_backends import MemoryStateBackend, SqlStateBackend, build_state_backend
+from app.touch_panel import TouchPanelSelection, TouchPanelState
+import app.models  # noqa: F401
+
+
+@pytest.fixture
+def state_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'state.db'}", future=True)
+    Base.metadata.create_all(bind=engine)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+def _pending(token: str, detected_at, ttl_seconds: int = 20) -> PendingTouch:
+    return PendingTouch(
+        touch_token=token,
+        student_id=1,
+        card_id="card",
+        reader_name="reader",
+        detected_at=detected_at,
+        current_status=AttendanceStatus.IN_ROOM,
+        allowed_actions=(AttendanceAction.LEAVE_TEMP, AttendanceAction.LEAVE_FINAL),
+        expires_at=detected_at + timedelta(seconds=ttl_seconds),
+    )
+
+
+def test_build_state_backend_by_name(state_engine):
+    assert isinstance(build_state_backend("memory"), MemoryStateBackend)
+    assert isinstance(build_state_backend("sqlite", state_engine), SqlStateBackend)
+    with pytest.raises(ValueError):
+        build_state_backend("redis")
+
+
+def test_sql_state_backend_round_trip_and_versions(state_engine):
+    backend = SqlStateBackend(state_engine)
+    assert backend.get("k") is None
+    backend.put("k", {"value": "一"})
+    backend.put("k", {"value": "二"})
+    assert backend.get("k") == {"value": "二"}
+    backend.delete("k")
+    assert backend.get("k") is None
+
+    assert backend.get_version("v") == 0
+    assert backend.bump_version("v") == 1
+    assert backend.bump_version("v") == 2
+    assert SqlStateBackend(state_engine).get_version("v") == 2
+
+
+def test_kiosk_and_touch_panel_state_are_shared_between_workers(state_engine):
+    worker_a = SqlStateBackend(state_engine)
+    worker_b = SqlStateBackend(state_engine)
+    now = now_jst()
+
+    KioskState(worker_a).set_mode(KioskMode.STUDENT_REGISTER)
+    KioskState(worker_a).store_student_card_capture("CARD1", "reader", now)
+    TouchPanelState(worker_a).set_selected_action(TouchPanelSelection.TERM_TOTAL)
+    TouchPanelState(worker_a).store_error("エラー", now)
+
+    assert KioskState(worker_b).get_mode() == KioskMode.STUDENT_REGISTER
+    assert KioskState(worker_b).get_latest_student_card_capture(now=now).card_id == "CARD1"
+    assert TouchPanelState(worker_b).get_selected_attendance_action() is None
+    assert TouchPanelState(worker_b).get_latest_error(now=now).message == "エラー"
+
+
+def test_sql_pending_touch_store_confirms_across_workers(state_engine):
+    worker_a = SqlPendingTouchStore(state_engine)
+    worker_b = SqlPendingTouchStore(state_engine)
+    now = now_jst()
+
+    worker_a.put(_pending("token", now))
+    pending = worker_b.get("token", now)
+    assert pending == _pending("token", now)
+    assert worker_b.pop("token") is not None
+    assert worker_a.get("token", now) is None
+
+
+def test_sql_pending_touch_store_bounds_size_and_expires(state_engine):
+    store = SqlPendingTouchStore(state_engine, max_entries=2, expired_grace_seconds=0)
+    now = now_jst()
+    store.put(_pending("long", now, ttl_seconds=60))
+    store.put(_pending("short", now, ttl_seconds=10))
+    store.put(_pending("new", now, ttl_seconds=30))
+
+    assert store.get("short", now) is None
+    assert store.stats().evicted == 1
+
+    assert store.get("new", now + timedelta(seconds=31)) is None
+    assert store.get("long", now + timedelta(seconds=31)) is not None
+    assert store.stats().expired == 1
+    assert store.stats().size == 1
+
+
+def test_card_index_reloads_after_other_worker_updates_student(state_engine):
+    SessionLocal = sessionmaker(bind=state_engine, autoflush=False, autocommit=False, expire_on_commit=False)
+    worker_a = CardIndex(SqlStateBackend(state_engine))
+    worker_b = CardIndex(SqlStateBackend(state_engine))
+    worker_b.VERSION_CHECK_INTERVAL_SECONDS = 0.0
+
+    with SessionLocal() as db:
+        student = StudentRepository(db).create(student_code="S001", name="Alice", card_id="OLD")
+        assert worker_b.lookup(db, "OLD") is not None
+
+        student = StudentRepository(db).update(student, card_id="NEW")
+        worker_a.store(db, student, previous_card_id="OLD")
+
+        assert worker_b.lookup(db, "OLD") is None
+        assert worker_b.lookup(db, "NEW").student_code == "S001"
@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from sqlalchemy import event
+
+from app.domain.enums import AttendanceStatus
+from app.domain.time_utils import from_unix_seconds, now_jst
+from app.repositories.attendance_repository import AttendanceRepository
+from app.repositories.student_repository import StudentRepository
+from app.sweeper import StaleSessionSweeper, stale_session_sweeper
+
+
+def test_sweep_closes_stale_sessions_at_midnight_minus_breaks(db_session):
+    student = StudentRepository(db_session).create("S001", "Alice", "CARD1")
+    repo = AttendanceRepository(db_session)
+    entered_at = now_jst().replace(hour=20, minute=0, second=0, microsecond=0) - timedelta(days=2)
+    repo.upsert_status(student.id, AttendanceStatus.OUT_ON_BREAK.value, None)
+    session = repo.create_session(student.id, entered_at)
+    repo.start_break(session.id, entered_at + timedelta(minutes=30))
+    repo.end_latest_open_break(session.id, entered_at + timedelta(minutes=45))
+    repo.start_break(session.id, entered_at + timedelta(hours=3))
+
+    closed = StaleSessionSweeper().sweep_if_needed(db_session, now_jst())
+
+    assert closed == 1
+    assert repo.get_open_session(student.id) is None
+    assert from_unix_seconds(session.left_at) == entered_at.replace(hour=0) + timedelta(days=1)
+    # 20:00-24:00(240) - 休憩15分 - 23:00以降の未終了休憩60分
+    assert session.total_minutes == 165
+    assert session.status == "CLOSED"
+    assert repo.get_status(student.id).current_status == AttendanceStatus.OUTSIDE.value
+
+
+def test_sweep_skips_request_path_once_day_is_swept(db_session):
+    student = StudentRepository(db_session).create("S001", "Alice", "CARD1")
+    repo = AttendanceRepository(db_session)
+    sweeper = StaleSessionSweeper()
+    today = now_jst()
+    sweeper.sweep_if_needed(db_session, today)
+
+    repo.create_session(student.id, today - timedelta(days=1))
+    statements = []
+    event.listen(db_session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    assert sweeper.sweep_if_needed(db_session, today) == 0
+    assert statements == []
+    assert repo.get_open_session(student.id) is not None
+
+    assert sweeper.sweep_if_needed(db_session, today + timedelta(days=1)) == 1
+    assert repo.get_open_session(student.id) is None
+
+
+def test_replayed_enter_from_swept_day_is_closed(client, db_session):
+    student = StudentRepository(db_session).create("S001", "Alice", "CARD1")
+    repo = AttendanceRepository(db_session)
+    today = now_jst()
+    stale_session_sweeper.sweep_if_needed(db_session, today)
+
+    # 今日のスイープの後に、昨日の入室がジャーナルから再送されてくる
+    entered_at = today.replace(hour=9, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    res = client.post(
+        "/api/reader/taps",
+        headers={"X-Reader-Token": "dev-reader-token", "Idempotency-Key": "late-enter"},
+        json={
+            "card_id": "CARD1",
+            "reader_name": "reader-a",
+            "detected_at": entered_at.isoformat(),
+            "action": "ENTER",
+            "replayed": True,
+        },
+    )
+
+    assert res.status_code == 200
+    assert repo.get_open_session(student.id) is not None
+
+    # 次に今日の時刻で打刻や画面表示があれば、昨日の入室は昨日の24時で締められる
+    assert stale_session_sweeper.sweep_if_needed(db_session, today) == 1
+    assert repo.get_open_session(student.id) is None
+    [session] = repo.list_sessions_overlapping_period(student.id, entered_at, today)
+    assert from_unix_seconds(session.left_at) == entered_at.replace(hour=0) + timedelta(days=1)
+    assert session.status == "CLOSED"
+    assert repo.get_status(student.id).current_status == AttendanceStatus.OUTSIDE.value
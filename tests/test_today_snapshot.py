@@ -0,0 +1,103 @@
+from datetime import date, timedelta
+from threading import Barrier, Thread
+import time
+
+from sqlalchemy import event
+
+from app.domain.enums import AttendanceAction
+from app.domain.time_utils import now_jst
+from app.schemas.admin import CorrectionRequest
+from app.schemas.student import StudentCreate
+from app.services import attendance_service as attendance_service_module
+from app.services.attendance_service import AttendanceService
+from app.services.correction_service import CorrectionService
+from app.services.student_service import StudentService
+from app.today_snapshot import TodaySnapshot, TodaySnapshotCache
+
+
+def _count_queries(db_session, func) -> int:
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    try:
+        func()
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+    return len(statements)
+
+
+def _enter(db_session, card_id: str, at):
+    svc = AttendanceService(db_session)
+    pending = svc.prepare_touch(card_id, "reader", at)
+    return svc.confirm_touch(pending.touch_token, AttendanceAction.ENTER, at)
+
+
+def test_today_attendance_reuses_snapshot_until_write(db_session):
+    student = StudentService(db_session).register_student(StudentCreate(student_code="S001", name="Alice", card_id="CARD1"))
+    svc = AttendanceService(db_session)
+    svc.get_today_attendance()
+
+    assert _count_queries(db_session, svc.get_today_attendance) == 0
+
+    _enter(db_session, "CARD1", now_jst())
+    today = svc.get_today_attendance()
+    assert [row.student_id for row in today.in_room] == [student.id]
+    assert [row.event_type for row in today.events] == ["ENTER"]
+
+
+def test_today_attendance_derives_minutes_at_render_time(db_session, monkeypatch):
+    StudentService(db_session).register_student(StudentCreate(student_code="S001", name="Alice", card_id="CARD1"))
+    now = now_jst().replace(hour=10, minute=0, second=0, microsecond=0)
+    _enter(db_session, "CARD1", now)
+    svc = AttendanceService(db_session)
+
+    monkeypatch.setattr(attendance_service_module, "now_jst", lambda: now + timedelta(minutes=30))
+    assert svc.get_today_attendance().in_room[0].cumulative_minutes == 30
+
+    monkeypatch.setattr(attendance_service_module, "now_jst", lambda: now + timedelta(minutes=45))
+    assert _count_queries(db_session, svc.get_today_attendance) == 0
+    today = svc.get_today_attendance()
+    assert today.in_room[0].cumulative_minutes == 45
+    assert today.in_room[0].business_cumulative_minutes == 45
+
+
+def test_correction_invalidates_today_snapshot(db_session):
+    student = StudentService(db_session).register_student(StudentCreate(student_code="S001", name="Alice", card_id="CARD1"))
+    svc = AttendanceService(db_session)
+    assert svc.get_today_attendance().events == []
+
+    CorrectionService(db_session).add_correction(
+        CorrectionRequest(student_id=student.id, action=AttendanceAction.ENTER, occurred_at=now_jst())
+    )
+
+    assert [row.event_type for row in svc.get_today_attendance().events] == ["ENTER"]
+
+
+def test_snapshot_cache_shares_one_build_between_concurrent_readers(db_session):
+    cache = TodaySnapshotCache()
+    day = date(2026, 4, 1)
+    builds = []
+    results = []
+    barrier = Barrier(4)
+
+    def build() -> TodaySnapshot:
+        builds.append(1)
+        time.sleep(0.05)
+        return TodaySnapshot(day=day, in_room=(), events=(), unknown_card=None, lock_alert=None)
+
+    def read() -> None:
+        barrier.wait()
+        results.append(cache.get(db_session, day, build))
+
+    threads = [Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert all(result is results[0] for result in results)
+
+    cache.invalidate()
+    cache.get(db_session, day, build)
+    assert len(builds) == 2
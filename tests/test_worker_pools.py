@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.exceptions import ServerBusyError
+from app.worker_pools import WorkerPool
+
+
+def test_worker_pool_runs_work_on_dedicated_threads():
+    pool = WorkerPool("db-read", max_workers=2)
+
+    async def scenario() -> str:
+        return await pool.run(lambda: threading.current_thread().name)
+
+    assert asyncio.run(scenario()).startswith("db-read")
+
+
+def test_worker_pool_iterate_closes_generator_on_early_exit():
+    pool = WorkerPool("db-read", max_workers=1)
+    closed_on = []
+    released = []
+
+    def chunks():
+        try:
+            for index in range(10):
+                yield index
+        finally:
+            closed_on.append(threading.current_thread().name)
+
+    async def scenario() -> list[int]:
+        received = []
+        iterator = pool.iterate(chunks(), on_close=lambda: released.append(True))
+        async for chunk in iterator:
+            received.append(chunk)
+            if len(received) == 3:
+                break
+        await iterator.aclose()
+        return received
+
+    assert asyncio.run(scenario()) == [0, 1, 2]
+    assert len(closed_on) == 1
+    assert closed_on[0].startswith("db-read")
+    assert released == [True]
+
+
+def test_admission_queues_then_rejects_when_full():
+    pool = WorkerPool("db-read", max_workers=1, max_active=1, max_queued=1, queue_timeout_seconds=1.0)
+
+    async def scenario() -> list[str]:
+        order = []
+        first = await pool.acquire()
+
+        async def queued() -> None:
+            async with pool.admit():
+                order.append("queued")
+
+        waiter = asyncio.create_task(queued())
+        await asyncio.sleep(0)
+        with pytest.raises(ServerBusyError):
+            await pool.acquire()
+        order.append("rejected")
+        first.release()
+        first.release()
+        await asyncio.wait_for(waiter, timeout=1.0)
+        async with pool.admit():
+            order.append("again")
+        return order
+
+    assert asyncio.run(scenario()) == ["rejected", "queued", "again"]
+
+
+def test_admission_times_out_instead_of_waiting_forever():
+    pool = WorkerPool("db-read", max_workers=1, max_active=1, max_queued=4, queue_timeout_seconds=0.01)
+
+    async def scenario() -> None:
+        await pool.acquire()
+        await pool.acquire()
+
+    with pytest.raises(ServerBusyError):
+        asyncio.run(scenario())